@@ -0,0 +1,342 @@
+"""
+Stream health from ADTS frame headers (AAC), without decoding.
+
+When the station goes silent or its encoder stalls, the receiver keeps
+showing the last song as if nothing happened. AdtsAnalyzer watches the audio
+bytes that are read anyway (the ICY monitor's connection) and parses only the
+7-byte ADTS header of each frame. It keeps frame size, audio duration and
+arrival time in fixed ring buffers. Every EVAL_INTERVAL it computes window
+statistics over the last WINDOW seconds (NumPy-vectorized when NumPy is
+installed) and classifies the stream:
+
+    stalled       no frames at all for STALL_AFTER seconds
+    dead air      nearly all frames are tiny compared to the baseline (VBR
+                  silence), or their sizes stopped varying (CBR silence padding)
+    underrun      audio arrives slower than real time (< UNDERRUN_RATIO)
+    bitrate drop  the window's bitrate fell below BITRATE_DROP_RATIO of the baseline
+    ok
+
+The baseline (bitrate, frame size and its variation) is a slow average over
+healthy windows only. A state has to hold for HOLD evaluations before it is
+reported, and each change calls `on_status(status)`: play_kozt sends it to the
+receiver as a STREAM_STATUS message.
+
+Parsing is one header read per frame (~43 frames/s at 44.1 kHz), and the
+statistics run over at most RING_FRAMES values every two seconds, so the
+analyzer costs well under 1% of a core. A stream without ADTS sync in its first
+MAX_SYNC_SEARCH bytes (MP3, Ogg) is left alone.
+
+    python3 adts_analyzer.py http://live.amperwave.net/direct/caradio-koztfmaac-ibc3
+"""
+import logging
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+RING_FRAMES = 4096          # ~95 s at 44.1 kHz
+WINDOW = 10.0               # seconds of arrivals the statistics look at
+EVAL_INTERVAL = 2.0
+HOLD = 2                    # evaluations a new state must persist before it is reported
+STALL_AFTER = 5.0
+UNDERRUN_RATIO = 0.75       # audio seconds received per wall second
+BITRATE_DROP_RATIO = 0.6
+SILENT_FRAME_RATIO = 0.25   # a frame this much smaller than the baseline frame counts as silence
+DEAD_AIR_FRACTION = 0.9
+DEAD_AIR_CV = 0.02          # frame size variation (std/mean) of padded CBR silence
+BASELINE_ALPHA = 0.1
+MAX_SYNC_SEARCH = 65536
+
+
+def parse_header(data, pos):
+    """(frame length, sample rate, samples) of the ADTS header at data[pos], or None."""
+    if len(data) < pos + 7 or data[pos] != 0xFF or data[pos + 1] & 0xF6 != 0xF0:
+        return None
+    sf_index = (data[pos + 2] >> 2) & 0x0F
+    length = ((data[pos + 3] & 0x03) << 11) | (data[pos + 4] << 3) | (data[pos + 5] >> 5)
+    if sf_index >= len(SAMPLE_RATES) or length < 7:
+        return None
+    return length, SAMPLE_RATES[sf_index], 1024 * ((data[pos + 6] & 0x03) + 1)
+
+
+class _Ring:
+    """Fixed-size float ring; `values()` returns the filled part (oldest first is not needed for window stats)."""
+    def __init__(self, size):
+        self.data = np.zeros(size) if np is not None else [0.0] * size
+        self.size = size
+        self.index = 0
+        self.count = 0
+
+    def extend(self, values):
+        for start in range(0, len(values), self.size):
+            part = values[start:start + self.size]
+            end = self.index + len(part)
+            if end <= self.size:
+                self.data[self.index:end] = part
+            else:
+                split = self.size - self.index
+                self.data[self.index:] = part[:split]
+                self.data[:end - self.size] = part[split:]
+            self.index = end % self.size
+            self.count = min(self.size, self.count + len(part))
+
+    def values(self):
+        return self.data[:self.count]
+
+    def max(self):
+        values = self.values()
+        return float(values.max()) if np is not None else max(values)
+
+
+def _window_stats(sizes, durations, arrivals, since, small_below):
+    """(frames, audio seconds, bytes, fraction of small frames, size std/mean) of the frames that arrived after `since`."""
+    if np is not None:
+        mask = arrivals > since
+        window = sizes[mask]
+        if not window.size:
+            return 0, 0.0, 0.0, 0.0, None
+        mean = window.mean()
+        return (int(window.size), float(durations[mask].sum()), float(window.sum()),
+                float((window < small_below).mean()), float(window.std() / mean) if mean else None)
+    window = [size for size, arrival in zip(sizes, arrivals) if arrival > since]
+    if not window:
+        return 0, 0.0, 0.0, 0.0, None
+    audio = sum(duration for duration, arrival in zip(durations, arrivals) if arrival > since)
+    mean = sum(window) / len(window)
+    std = (sum((size - mean) ** 2 for size in window) / len(window)) ** 0.5
+    return len(window), audio, float(sum(window)), sum(1 for size in window if size < small_below) / len(window), std / mean if mean else None
+
+
+class AdtsAnalyzer:
+    """
+    feed() the stream's audio bytes (any chunking) from the reader thread.
+    Has start()/stop()/thread, so a WorkerSupervisor can adopt it; the
+    evaluation runs on its own thread, which also notices a reader that stopped feeding.
+    """
+    def __init__(self, on_status=None, clock=time):
+        self.on_status = on_status
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.sizes = _Ring(RING_FRAMES)
+        self.durations = _Ring(RING_FRAMES)
+        self.arrivals = _Ring(RING_FRAMES)
+        self.buffer = b""
+        self.searched = 0
+        self.adts = None            # None until the first frame (or MAX_SYNC_SEARCH bytes) decides it
+        self.connected = None
+        self.frames = 0
+        self.resync_bytes = 0
+        self.sample_rate = None
+        self.baseline = None        # {"kbps", "frame_bytes", "cv"}
+        self.state = "starting"
+        self.candidate, self.candidate_count = None, 0
+        self.last = {}
+        self.changes = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # Reader side
+
+    def connected_now(self):
+        """The reader (re)connected: frame alignment restarts and the underrun check waits a full window."""
+        with self.lock:
+            self.buffer = b""
+            self.connected = self.clock.time()
+
+    def feed(self, chunk):
+        if self.adts is False:
+            return
+        now = self.clock.time()
+        data = self.buffer + chunk
+        sizes, durations = [], []
+        pos = 0
+        while pos + 7 <= len(data):
+            header = parse_header(data, pos)
+            if header and (pos + header[0] + 7 > len(data) or parse_header(data, pos + header[0])):
+                length, rate, samples = header
+                if pos + length > len(data):
+                    break
+                sizes.append(length)
+                durations.append(samples / rate)
+                self.sample_rate = rate
+                pos += length
+                continue
+            # Lost sync: skip to the next 0xFF
+            next_pos = data.find(b"\xff", pos + 1)
+            next_pos = len(data) - 6 if next_pos < 0 else min(next_pos, len(data) - 6)
+            skipped = max(1, next_pos - pos)
+            pos += skipped
+            if self.adts:
+                self.resync_bytes += skipped
+            else:
+                self.searched += skipped
+        self.buffer = data[pos:]
+        if sizes:
+            self.adts = True
+            with self.lock:
+                if self.connected is None:
+                    self.connected = now
+                self.sizes.extend(sizes)
+                self.durations.extend(durations)
+                self.arrivals.extend([now] * len(sizes))
+                self.frames += len(sizes)
+        elif self.adts is None and self.searched > MAX_SYNC_SEARCH:
+            self.adts = False
+            self.buffer = b""
+            logging.info("Stream analyzer: no ADTS frames in the stream (not AAC?); analysis disabled")
+            self._clear()
+
+    # Evaluation side
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="stream-analyzer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(2)
+        self._clear()
+
+    def run(self):
+        while not self.stop_event.wait(EVAL_INTERVAL):
+            if self.adts is False:
+                return
+            try:
+                self.evaluate()
+            except Exception as e:
+                logging.debug(f"Stream analyzer: evaluation failed: {e}")
+
+    def evaluate(self):
+        """Computes the window statistics and moves the state. Returns the state."""
+        now = self.clock.time()
+        if self.connected is None:
+            return self.state
+        baseline = self.baseline
+        small_below = baseline["frame_bytes"] * SILENT_FRAME_RATIO if baseline else 0
+        with self.lock:
+            frames, audio, total, small, cv = _window_stats(self.sizes.values(), self.durations.values(),
+                                                            self.arrivals.values(), now - WINDOW, small_below)
+            last_arrival = self.arrivals.max() if self.arrivals.count else self.connected
+        elapsed = min(WINDOW, now - self.connected)
+        kbps = total * 8 / audio / 1000 if audio else 0.0
+        realtime = audio / elapsed if elapsed > 0 else None
+        self.last = {"window_frames": frames, "kbps": round(kbps, 1), "realtime": round(realtime, 2) if realtime is not None else None,
+                     "small_fraction": round(small, 2), "cv": round(cv, 3) if cv is not None else None}
+
+        if now - max(last_arrival, self.connected) >= STALL_AFTER:
+            state = "stalled"
+        elif not frames:
+            state = self.state      # nothing to judge yet (stalled takes over after STALL_AFTER)
+        elif baseline and (small >= DEAD_AIR_FRACTION or
+                           (cv is not None and cv < DEAD_AIR_CV and baseline["cv"] > 4 * DEAD_AIR_CV)):
+            # Before underrun: a few-kbps silent stream arrives in lumps that look slow
+            state = "dead air"
+        elif now - self.connected >= WINDOW and realtime is not None and realtime < UNDERRUN_RATIO:
+            state = "underrun"
+        elif baseline and kbps < baseline["kbps"] * BITRATE_DROP_RATIO and small < 0.5:
+            # (mostly tiny frames is silence setting in, not a lower bitrate)
+            state = "bitrate drop"
+        else:
+            state = "ok"
+
+        if state == "ok" and frames and small < 0.1 and now - self.connected >= WINDOW:
+            current = {"kbps": kbps, "frame_bytes": total / frames, "cv": cv or 0.0}
+            self.baseline = current if baseline is None else {
+                key: value + BASELINE_ALPHA * (current[key] - value) for key, value in baseline.items()}
+        self._move(state)
+        return self.state
+
+    def _move(self, state):
+        if state == self.state:
+            self.candidate, self.candidate_count = None, 0
+            return
+        if state != self.candidate:
+            self.candidate, self.candidate_count = state, 0
+        self.candidate_count += 1
+        if self.candidate_count < HOLD and not (self.state == "starting" and state == "ok"):
+            return
+        previous, self.state = self.state, state
+        self.candidate, self.candidate_count = None, 0
+        self.changes += 1
+        log = logging.info if state == "ok" else logging.warning
+        log(f"Stream analyzer: {previous} -> {state} ({self.last['kbps']} kbps, {self.last['realtime']}x real time)")
+        self._notify(self.status())
+
+    def _clear(self):
+        """Reports "ok" once the analysis ends (stopped, or not ADTS), so the receiver does not keep showing a degraded state."""
+        if self.state in ("ok", "starting"):
+            return
+        self.state = "ok"
+        self.candidate, self.candidate_count = None, 0
+        self._notify({"state": "ok"})
+
+    def _notify(self, status):
+        if self.on_status:
+            try:
+                self.on_status(status)
+            except Exception as e:
+                logging.debug(f"Stream analyzer: status callback failed: {e}")
+
+    def status(self):
+        """The STREAM_STATUS payload."""
+        return {
+            "state": self.state,
+            "bitrateKbps": self.last.get("kbps"),
+            "baselineKbps": round(self.baseline["kbps"], 1) if self.baseline else None,
+            "realtime": self.last.get("realtime"),
+        }
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "adts": self.adts,
+            "numpy": np is not None,
+            "sample_rate": self.sample_rate,
+            "frames": self.frames,
+            "resync_bytes": self.resync_bytes,
+            "baseline_kbps": round(self.baseline["kbps"], 1) if self.baseline else None,
+            "changes": self.changes,
+            **self.last,
+        }
+
+    def report(self):
+        if self.adts is False:
+            return "Stream analyzer: not an ADTS stream"
+        if not self.last:
+            return "Stream analyzer: waiting for audio"
+        baseline = f"baseline {self.baseline['kbps']:.0f}" if self.baseline else "no baseline yet"
+        return (f"Stream analyzer: {self.state}, {self.last['kbps']} kbps ({baseline}),"
+                f" {self.last['realtime']}x real time, {self.resync_bytes} bytes resynced")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import requests
+
+    parser = argparse.ArgumentParser(description="Watch an AAC (ADTS) stream for dead air, underruns and bitrate drops.")
+    parser.add_argument("url", help="Stream URL")
+    parser.add_argument("--debug", action="store_true", help="Print the window statistics of every evaluation")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    analyzer = AdtsAnalyzer(lambda status: print(f"{time.strftime('%H:%M:%S')} STREAM_STATUS {status}"))
+    analyzer.start()
+    try:
+        with requests.get(args.url, headers={'User-Agent': 'Mozilla/5.0 (compatible; IcecastMetadataReader/1.0)'}, stream=True, timeout=10) as r:
+            analyzer.connected_now()
+            last_print = time.time()
+            for chunk in r.iter_content(4096):
+                analyzer.feed(chunk)
+                if args.debug and time.time() - last_print >= EVAL_INTERVAL:
+                    last_print = time.time()
+                    print(f"{analyzer.report()} | CPU {time.process_time():.2f}s")
+    except KeyboardInterrupt:
+        pass
+    analyzer.stop()
+    print(analyzer.stats())
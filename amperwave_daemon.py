@@ -0,0 +1,294 @@
+"""
+Multi-station Amperwave now-playing daemon.
+
+Polls any number of Amperwave station IDs (e.g. "10/4756" for KOZT) on one
+scheduler thread. All stations share one HTTP connection pool. Each station
+keeps its own adaptive interval:
+
+- Right after a track change, the next change is a whole song away, so polling
+  slows down (up to `max_interval`).
+- As the typical song length (EWMA of observed change gaps) approaches,
+  polling speeds up again (down to `min_interval`).
+- Errors back off exponentially.
+
+Normalized `now_playing.Track` records are published to in-process
+subscribers (`subscribe(callback)`). With --socket they also go to local
+clients as JSON lines over a Unix-domain socket. New clients get a snapshot
+of every station first.
+
+Usage:
+    python3 amperwave_daemon.py --station kozt=10/4756 --station 10/1234 --socket /tmp/amperwave.sock
+    socat - UNIX-CONNECT:/tmp/amperwave.sock
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from now_playing import AmperwaveProvider
+
+DEFAULT_MIN_INTERVAL = 10
+DEFAULT_MAX_INTERVAL = 60
+DEFAULT_SONG_GAP = 210        # initial guess for seconds between track changes
+EWMA_ALPHA = 0.3
+
+
+class StationPoller:
+    """Per-station state: provider, last track and adaptive interval."""
+    def __init__(self, name, station, session, min_interval, max_interval):
+        self.name = name
+        self.station = station
+        self.provider = AmperwaveProvider(station, session=session)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.track = None
+        self.changed_at = None
+        self.typical_gap = DEFAULT_SONG_GAP
+        self.errors = 0
+        self.polls = 0
+        self.changes = 0
+        self.interval = min_interval
+
+    def next_interval(self, now):
+        if self.errors:
+            interval = min(self.max_interval * 2, self.min_interval * (2 ** self.errors))
+        elif self.changed_at is None:
+            interval = self.min_interval
+        else:
+            remaining = self.typical_gap - (now - self.changed_at)
+            interval = max(self.min_interval, min(self.max_interval, remaining))
+        # Jitter so stations (and multiple daemons) do not poll in lockstep
+        self.interval = interval * random.uniform(0.9, 1.1)
+        return self.interval
+
+    def poll(self):
+        """Fetches once. Returns the new Track if it changed, else None."""
+        self.polls += 1
+        track = self.provider.fetch()
+        self.errors = 0
+        if track is None:
+            return None
+        if self.track and track.key == self.track.key:
+            return None
+
+        now = time.time()
+        if self.changed_at is not None:
+            gap = now - self.changed_at
+            # Ignore implausible gaps (restarts, outages) when learning song length
+            if 60 <= gap <= 900:
+                self.typical_gap = (1 - EWMA_ALPHA) * self.typical_gap + EWMA_ALPHA * gap
+        self.track = track
+        self.changed_at = now
+        self.changes += 1
+        return track
+
+    def state(self):
+        return {
+            "name": self.name,
+            "station": self.station,
+            "track": asdict(self.track) if self.track else None,
+            "polls": self.polls,
+            "changes": self.changes,
+            "errors": self.errors,
+            "interval_s": round(self.interval, 1),
+            "typical_gap_s": round(self.typical_gap, 1),
+        }
+
+
+class AmperwaveDaemon:
+    """Single scheduler + shared session for many stations."""
+    def __init__(self, stations, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL, workers=4):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.pollers = {}
+        for name, station in stations:
+            self.pollers[name] = StationPoller(name, station, self.session, min_interval, max_interval)
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="amperwave-poll")
+        self.heap = []
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.subscribers = []
+        self.thread = None
+
+    def subscribe(self, callback):
+        """`callback(station_name, track)` is called on every track change."""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def snapshot(self):
+        return {name: poller.state() for name, poller in self.pollers.items()}
+
+    def start(self):
+        now = time.monotonic()
+        with self.cond:
+            for i, name in enumerate(self.pollers):
+                # Stagger the first polls slightly
+                heapq.heappush(self.heap, (now + i * 0.2, name))
+        self.thread = threading.Thread(target=self._schedule, name="amperwave-scheduler", daemon=True)
+        self.thread.start()
+        logging.info(f"Amperwave daemon: polling {len(self.pollers)} station(s): {', '.join(self.pollers)}")
+
+    def stop(self):
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(2)
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def _schedule(self):
+        while not self.stop_event.is_set():
+            with self.cond:
+                if not self.heap:
+                    self.cond.wait(1)
+                    continue
+                due, name = self.heap[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+                heapq.heappop(self.heap)
+            self.executor.submit(self._poll, name)
+
+    def _poll(self, name):
+        poller = self.pollers[name]
+        try:
+            track = poller.poll()
+            if track:
+                logging.info(f"Amperwave daemon: [{name}] {track.artist} - {track.title}")
+                self._publish(name, track)
+        except Exception as e:
+            poller.errors += 1
+            logging.debug(f"Amperwave daemon: [{name}] poll failed ({poller.errors}): {e}")
+
+        delay = poller.next_interval(time.time())
+        logging.debug(f"Amperwave daemon: [{name}] next poll in {delay:.1f}s")
+        with self.cond:
+            heapq.heappush(self.heap, (time.monotonic() + delay, name))
+            self.cond.notify()
+
+    def _publish(self, name, track):
+        for callback in list(self.subscribers):
+            try:
+                callback(name, track)
+            except Exception as e:
+                logging.debug(f"Amperwave daemon: subscriber failed: {e}")
+
+
+class SocketPublisher:
+    """Fans track changes out to local clients as JSON lines over a Unix socket."""
+    def __init__(self, daemon, path):
+        self.daemon = daemon
+        self.path = path
+        self.clients = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(16)
+        self.daemon.subscribe(self.publish)
+        threading.Thread(target=self._accept, name="amperwave-socket", daemon=True).start()
+        logging.info(f"Amperwave daemon: publishing on {self.path}")
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            try:
+                for name, state in self.daemon.snapshot().items():
+                    if state["track"]:
+                        client.sendall(self._line(name, state["track"], snapshot=True))
+            except OSError:
+                client.close()
+                continue
+            with self.lock:
+                self.clients.append(client)
+
+    def _line(self, name, track_dict, snapshot=False):
+        return (json.dumps({"station": name, "snapshot": snapshot, "track": track_dict}) + "\n").encode()
+
+    def publish(self, name, track):
+        line = self._line(name, asdict(track))
+        with self.lock:
+            for client in list(self.clients):
+                try:
+                    client.sendall(line)
+                except OSError:
+                    self.clients.remove(client)
+                    client.close()
+
+    def stop(self):
+        self.server.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def parse_station(spec):
+    """'kozt=10/4756' -> ('kozt', '10/4756'); '10/4756' -> ('10/4756', '10/4756')"""
+    if "=" in spec:
+        name, station = spec.split("=", 1)
+        return name.strip(), station.strip()
+    return spec.strip(), spec.strip()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll many Amperwave stations from one process.")
+    parser.add_argument("--station", action="append", required=True, help="Station as NAME=GROUP/ID or GROUP/ID (repeatable)")
+    parser.add_argument("--socket", default=None, help="Unix socket path to publish JSON lines on")
+    parser.add_argument("--min-interval", type=float, default=DEFAULT_MIN_INTERVAL, help="Fastest per-station poll interval (s)")
+    parser.add_argument("--max-interval", type=float, default=DEFAULT_MAX_INTERVAL, help="Slowest per-station poll interval (s)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests / pooled connections")
+    parser.add_argument("--debug", action="store_true", help="Enable info-level logging")
+    parser.add_argument("--verbose", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+
+    if args.verbose:
+        log_level = logging.DEBUG
+    elif args.debug:
+        log_level = logging.INFO
+    else:
+        log_level = logging.WARNING
+    logging.basicConfig(level=log_level, format='%(message)s')
+
+    daemon = AmperwaveDaemon([parse_station(s) for s in args.station], args.min_interval, args.max_interval, args.workers)
+    daemon.subscribe(lambda name, track: print(f"[{name}] {track.artist} - {track.title}"))
+
+    publisher = None
+    if args.socket:
+        publisher = SocketPublisher(daemon, args.socket)
+        publisher.start()
+
+    daemon.start()
+    try:
+        while True:
+            time.sleep(60)
+            logging.info(f"Amperwave daemon state: {json.dumps(daemon.snapshot())}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        if publisher:
+            publisher.stop()
@@ -0,0 +1,397 @@
+"""
+Embedded LAN artwork proxy and resizer.
+
+Receivers used to download full-size third-party art (Amperwave `largeimage`,
+iTunes `600x600bb`) straight from the internet, then decode it twice: once for
+the album art tile and once for the blurred full-screen background.
+
+This module runs a small HTTP server on the sender's LAN address. Each source
+image is fetched once, resized/recompressed for the target device's screen
+class and cached on disk. Every receiver on the network is then served the
+local copy.
+
+Pillow is optional. Without it the original bytes are cached and served as-is
+(still one upstream fetch per image, still served from the LAN).
+
+Usage (standalone):
+    python3 art_proxy.py --port 8765
+"""
+import argparse
+import contextlib
+import hashlib
+import http.server
+import io
+import logging
+import os
+import socket
+import threading
+import time
+from urllib.parse import quote
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kozt_art")
+DEFAULT_MAX_CACHE_MB = 200
+
+# Pixel edge for the album art tile and the (blurred) background, per screen class.
+# The receiver draws the tile at 30vw and blurs the background by 20px, so the
+# background never needs more than a thumbnail.
+SCREEN_CLASSES = {
+    "hub": {"art": 400, "bg": 64},        # Nest Hub (1024x600)
+    "hub_max": {"art": 520, "bg": 64},    # Nest Hub Max (1280x800)
+    "tablet": {"art": 800, "bg": 96},     # Pixel Tablet (2560x1600)
+    "tv": {"art": 600, "bg": 96},         # Chromecast / Google TV 1080p
+    "tv_4k": {"art": 1000, "bg": 128},    # Chromecast Ultra / Google TV 4K
+}
+DEFAULT_SCREEN_CLASS = "tv"
+
+# Ordered (substring, screen class) rules matched against cast_info.model_name
+MODEL_RULES = [
+    ("hub max", "hub_max"),
+    ("nest hub", "hub"),
+    ("home hub", "hub"),
+    ("tablet", "tablet"),
+    ("ultra", "tv_4k"),
+    ("google tv", "tv_4k"),
+    ("chromecast", "tv"),
+]
+
+JPEG_QUALITY = {"art": 82, "bg": 60}
+
+
+def screen_class_for(cast_info):
+    """
+    Maps a pychromecast CastInfo to a screen class key in SCREEN_CLASSES.
+    Returns None for audio-only devices and groups (nothing to display).
+    """
+    if cast_info is None:
+        return DEFAULT_SCREEN_CLASS
+    if cast_info.cast_type in ("audio", "group"):
+        return None
+
+    model = (cast_info.model_name or "").lower()
+    for needle, screen_class in MODEL_RULES:
+        if needle in model:
+            return screen_class
+    return DEFAULT_SCREEN_CLASS
+
+
+def lan_address_for(host):
+    """
+    Returns the local IP address of the interface that routes to `host`.
+    No packet is sent; connecting a UDP socket only selects a route.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect((host, 8009))
+        return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+    finally:
+        s.close()
+
+
+class ArtProxy:
+    """
+    Fetch-once, resize-per-screen-class image cache served over HTTP.
+    """
+    def __init__(self, port=DEFAULT_PORT, cache_dir=DEFAULT_CACHE_DIR, max_cache_mb=DEFAULT_MAX_CACHE_MB):
+        self.port = port
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = int(max_cache_mb * 1024 * 1024)
+        self.sources = {}   # key -> original URL
+        self.locks = {}     # cache filename -> [Lock, users] while a fetch/resize of it runs
+        self.warming = set()  # (key, screen class, variant) being warmed in the background
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        self.server = None
+        self.stats = {"hits": 0, "misses": 0, "upstream_fetches": 0, "upstream_errors": 0, "bytes_served": 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def start(self):
+        """Starts the HTTP server in a daemon thread."""
+        proxy = self
+
+        class Handler(ArtRequestHandler):
+            pass
+        Handler.proxy = proxy
+
+        self.server = http.server.ThreadingHTTPServer(("0.0.0.0", self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever, name="art-proxy", daemon=True)
+        thread.start()
+        logging.info(f"Art Proxy: Serving on port {self.port} (cache: {self.cache_dir}, Pillow: {'yes' if Image else 'no'})")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def register(self, source_url):
+        """Registers a source URL and returns its cache key."""
+        key = hashlib.sha1(source_url.encode("utf-8")).hexdigest()[:20]
+        with self.lock:
+            if key not in self.sources:
+                self.sources[key] = source_url
+                # Persist the mapping so cached files stay servable after a restart
+                try:
+                    with open(os.path.join(self.cache_dir, f"{key}.src"), "w") as f:
+                        f.write(source_url)
+                except OSError as e:
+                    logging.debug(f"Art Proxy: Could not persist source for {key}: {e}")
+        return key
+
+    def url_for(self, source_url, screen_class, device_host, variant="art", warm=True):
+        """
+        Returns the LAN URL a receiver at `device_host` should load for `source_url`.
+        Falls back to the original URL when there is no screen to size for.
+        """
+        if not source_url or not screen_class or not source_url.lower().startswith("http"):
+            return source_url
+        host = lan_address_for(device_host) if device_host else "127.0.0.1"
+        return f"http://{host}:{self.port}{self.path_for(source_url, screen_class, variant, warm)}"
+
+    def path_for(self, source_url, screen_class, variant="art", warm=True):
+        """Returns the server-relative path (/art/...) for `source_url`."""
+        key = self.register(source_url)
+        if warm:
+            # Fetch and resize before the receiver asks, so its first request is a cache hit
+            job = (key, screen_class, variant)
+            with self.lock:
+                start = job not in self.warming
+                self.warming.add(job)
+            if start:
+                threading.Thread(target=self._warm, args=job, daemon=True).start()
+        return f"/art/{key}/{quote(screen_class)}-{variant}.jpg"
+
+    def _warm(self, key, screen_class, variant):
+        try:
+            self.get(key, screen_class, variant)
+        finally:
+            with self.lock:
+                self.warming.discard((key, screen_class, variant))
+
+    def source_for(self, key):
+        with self.lock:
+            source = self.sources.get(key)
+        if source:
+            return source
+        try:
+            with open(os.path.join(self.cache_dir, f"{key}.src")) as f:
+                source = f.read().strip()
+        except OSError:
+            return None
+        with self.lock:
+            self.sources[key] = source
+        return source
+
+    @contextlib.contextmanager
+    def _file_lock(self, name):
+        """Serializes work on one cache file; the lock is dropped once nobody holds or waits for it."""
+        with self.lock:
+            entry = self.locks.setdefault(name, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.locks[name]
+
+    def _fetch_original(self, key):
+        """Returns (bytes, content_type) for the original image, fetching it at most once."""
+        path = os.path.join(self.cache_dir, f"{key}.orig")
+        with self._file_lock(path):
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return f.read(), None
+
+            source = self.source_for(key)
+            if not source:
+                return None, None
+
+            self.stats["upstream_fetches"] += 1
+            try:
+                response = self.session.get(source, timeout=10)
+                response.raise_for_status()
+            except Exception as e:
+                self.stats["upstream_errors"] += 1
+                logging.debug(f"Art Proxy: Upstream fetch failed for {source}: {e}")
+                return None, None
+
+            self._write_atomic(path, response.content)
+            return response.content, response.headers.get("Content-Type")
+
+    def get(self, key, screen_class, variant):
+        """
+        Returns (path, content_type) of the sized image, creating it if needed.
+        Returns (None, None) if the source could not be fetched.
+        """
+        if screen_class not in SCREEN_CLASSES or variant not in ("art", "bg"):
+            return None, None
+
+        path = os.path.join(self.cache_dir, f"{key}-{screen_class}-{variant}.jpg")
+        if os.path.exists(path):
+            self.stats["hits"] += 1
+            return path, "image/jpeg"
+
+        with self._file_lock(path):
+            if os.path.exists(path):
+                self.stats["hits"] += 1
+                return path, "image/jpeg"
+            self.stats["misses"] += 1
+
+            data, content_type = self._fetch_original(key)
+            if data is None:
+                return None, None
+
+            result = path, "image/jpeg"
+            if Image is None:
+                # No Pillow: serve the original bytes from the LAN cache
+                result = os.path.join(self.cache_dir, f"{key}.orig"), content_type or "image/jpeg"
+            else:
+                try:
+                    self._write_atomic(path, self._resize(data, SCREEN_CLASSES[screen_class][variant], JPEG_QUALITY[variant]))
+                except Exception as e:
+                    logging.debug(f"Art Proxy: Resize failed for {key}: {e}")
+                    result = os.path.join(self.cache_dir, f"{key}.orig"), content_type or "image/jpeg"
+
+        # A new original counts toward the budget too, with or without Pillow
+        self._prune()
+        return result
+
+    def _resize(self, data, edge, quality):
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert("RGB")
+            img.thumbnail((edge, edge), Image.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+            return out.getvalue()
+
+    def _write_atomic(self, path, data):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _prune(self):
+        """
+        Evicts least-recently-used files once the cache exceeds its size budget,
+        and the .src sidecars of keys that have no image left.
+        """
+        try:
+            entries = []
+            sidecars = set()
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".src"):
+                    sidecars.add(name[:-4])
+                    continue
+                st = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((st.st_atime, st.st_size, name))
+                total += st.st_size
+            if total <= self.max_cache_bytes:
+                return
+            entries.sort()
+            evicted = 0
+            for _, size, name in entries:
+                if total <= self.max_cache_bytes * 0.8:
+                    break
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+                evicted += 1
+            # Keys are the first 20 hex digits of every cached file name (<key>.orig, <key>-<class>-<variant>.jpg)
+            kept = {name[:20] for _, _, name in entries[evicted:]}
+            with self.lock:
+                # Keys still being warmed or fetched need their source
+                kept |= {key for key, _, _ in self.warming} | {os.path.basename(name)[:20] for name in self.locks}
+                for key in sidecars - kept:
+                    self.sources.pop(key, None)
+            for key in sidecars - kept:
+                os.remove(os.path.join(self.cache_dir, f"{key}.src"))
+        except OSError as e:
+            logging.debug(f"Art Proxy: Cache prune failed: {e}")
+
+
+class ArtRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves GET /art/<key>/<screen_class>-<variant>.jpg"""
+    proxy = None
+
+    def do_GET(self):
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        name = parts[2].rsplit(".", 1)[0] if len(parts) == 3 else ""
+        if len(parts) != 3 or parts[0] != "art" or "-" not in name:
+            self.send_error(404)
+            return
+
+        key = parts[1]
+        if not key or any(c not in "0123456789abcdef" for c in key):
+            self.send_error(404)
+            return
+        screen_class, variant = name.rsplit("-", 1)
+        path, content_type = self.proxy.get(key, screen_class, variant)
+
+        if not path:
+            # Upstream is down: let the receiver try the original URL itself
+            source = self.proxy.source_for(key)
+            if source:
+                self.send_response(302)
+                self.send_header("Location", source)
+                self.end_headers()
+            else:
+                self.send_error(404)
+            return
+
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            # Evicted by _prune() since the lookup: build it again once
+            path, content_type = self.proxy.get(key, screen_class, variant)
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except (TypeError, FileNotFoundError):
+                self.send_error(404)
+                return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "public, max-age=86400")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+        self.proxy.stats["bytes_served"] += len(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Art Proxy: {self.address_string()} {format % args}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the LAN artwork proxy on its own.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="HTTP port to listen on")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory for cached images")
+    parser.add_argument("--max-cache-mb", type=float, default=DEFAULT_MAX_CACHE_MB, help="Cache size budget in MB")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='%(message)s')
+
+    proxy = ArtProxy(args.port, args.cache_dir, args.max_cache_mb)
+    proxy.start()
+    try:
+        while True:
+            time.sleep(60)
+            logging.info(f"Art Proxy stats: {proxy.stats}")
+    except KeyboardInterrupt:
+        proxy.stop()
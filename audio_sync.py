@@ -0,0 +1,215 @@
+"""
+Audio-aligned metadata delivery.
+
+The Chromecast buffers a live stream, so the listener hears a song change
+several seconds after the live edge, which is where the sender learns about
+it (the ICY title in its own stream connection, or the Amperwave API).
+Sending the update on arrival makes the screen flip early.
+
+PlaybackOffset expresses everything as a receiver position, i.e. seconds
+played since play_media() (the media status `current_time` of a live
+stream):
+
+    live edge = (monitor connect time - play time) + monitor audio bytes / byte rate
+    lag       = live edge - receiver position
+
+Both connections get the same connect burst from the server, so it cancels
+out. Without an ICY monitor connection (Amperwave path) the live edge is
+taken as wall time since play. The lag then still covers startup buffering
+and stalls, but not the server's burst. `extra` (--sync-offset) adds a fixed
+correction either way.
+
+AlignedSender holds each update until the receiver position reaches the
+position at which its title becomes audible. It re-reads the position while
+waiting, so a rebuffering stall pushes the update back instead of letting it
+flip early. It keeps two numbers per update, both against the estimated
+audible position (the receiver cannot report what it actually showed when):
+the hold error (receiver position at send time minus target, within
+TOLERANCE unless MAX_HOLD ran out) and the offset the update would have had
+if sent on arrival.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+DEFAULT_BITRATE_KBPS = 128
+TOLERANCE = 0.25       # send when the receiver is within this many seconds of the target
+RECHECK = 1.0          # re-read the receiver position at least this often while holding an update
+MAX_HOLD = 60          # never hold an update longer than this (bad estimate, stalled receiver)
+SAMPLE_INTERVAL = 15   # seconds between lag samples / media status refreshes
+
+
+def parse_bitrate(value):
+    """icy-br header ('128', '128,128' on some servers) -> kbps, or None."""
+    try:
+        return int(str(value).split(",")[0]) or None
+    except (TypeError, ValueError):
+        return None
+
+
+def _median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2] if ordered else None
+
+
+class PlaybackOffset:
+    """Estimates how far the receiver's playback lags the live edge the sender reads metadata from."""
+    def __init__(self, media_controller, extra=0.0, clock=time):
+        self.mc = media_controller
+        self.extra = extra
+        self.clock = clock
+        self.play_started = None
+        self.monitor_started = None
+        self.monitor_bytes = 0
+        self.byte_rate = None
+        self.samples = deque(maxlen=9)
+
+    def playback_started(self):
+        self.play_started = self.clock.time()
+        self.samples.clear()
+
+    def monitor_connected(self, bitrate_kbps=None):
+        """The ICY monitor (re)connected; its byte count restarts from here."""
+        self.monitor_started = self.clock.time()
+        self.monitor_bytes = 0
+        self.byte_rate = (bitrate_kbps or DEFAULT_BITRATE_KBPS) * 1000 / 8
+
+    def add_monitor_bytes(self, count):
+        """Audio bytes read by the ICY monitor (not metadata blocks)."""
+        self.monitor_bytes += count
+
+    def receiver_position(self):
+        status = self.mc.status if self.mc else None
+        if not status or status.player_state not in ("PLAYING", "BUFFERING", "PAUSED"):
+            return None
+        return status.adjusted_current_time
+
+    def live_position(self):
+        """The live edge right now, as a receiver position."""
+        if self.play_started is None:
+            return None
+        if self.monitor_started is not None and self.monitor_started >= self.play_started:
+            return (self.monitor_started - self.play_started) + self.monitor_bytes / self.byte_rate + self.extra
+        return self.clock.time() - self.play_started + self.extra
+
+    def lag(self):
+        live, position = self.live_position(), self.receiver_position()
+        if live is None or position is None:
+            return None
+        return live - position
+
+    def sample(self):
+        """Records a lag sample (and asks the receiver for fresh media status). Returns the smoothed lag."""
+        lag = self.lag()
+        if lag is not None:
+            self.samples.append(lag)
+        try:
+            self.mc.update_status()
+        except Exception as e:
+            logging.debug(f"Audio sync: media status request failed: {e}")
+        return self.current()
+
+    def current(self):
+        return _median(self.samples)
+
+
+class AlignedSender:
+    """
+    Runs each submitted send() when the receiver reaches the position where its
+    title is audible. Has start()/stop()/thread, so a WorkerSupervisor can adopt it.
+    """
+    def __init__(self, offset, tolerance=TOLERANCE, max_hold=MAX_HOLD):
+        self.offset = offset
+        self.clock = offset.clock
+        self.tolerance = tolerance
+        self.max_hold = max_hold
+        self.pending = deque()          # (target position, submitted at, label, send, offset if sent at once)
+        self.cond = threading.Condition()
+        self.stopping = False
+        self.thread = None
+        self.hold_errors = deque(maxlen=100)
+        self.arrival_offsets = deque(maxlen=100)
+        self.next_sample = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="audio-sync", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.pending.clear()
+            self.cond.notify()
+        if self.thread:
+            self.thread.join(2)
+
+    def submit(self, send, label, position=None, aired_ago=0.0):
+        """
+        Queues `send()` for when the receiver reaches `position`. Without one, the
+        target is the live edge `aired_ago` seconds ago (for polled sources: half
+        the poll interval is the unbiased guess). Without a position estimate it runs right away.
+        """
+        live = self.offset.live_position()
+        target = position if position is not None else (live - aired_ago if live is not None else None)
+        now_position = self.offset.receiver_position()
+        if target is None or now_position is None:
+            self._send(send, label)
+            return
+        with self.cond:
+            self.pending.append((target, self.clock.time(), label, send, now_position - target))
+            self.cond.notify()
+        logging.debug(f"Audio sync: holding '{label}' for {max(0.0, target - now_position):.1f}s")
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopping:
+                    self.cond.wait(SAMPLE_INTERVAL)
+                    self._maybe_sample()
+                if self.stopping:
+                    return
+                target, submitted, label, send, unaligned = self.pending[0]
+                position = self.offset.receiver_position()
+                remaining = target - position if position is not None else 0
+                if remaining > self.tolerance and self.clock.time() - submitted < self.max_hold:
+                    self.cond.wait(min(remaining, RECHECK))
+                    continue
+                self.pending.popleft()
+            if position is not None:
+                self.hold_errors.append(position - target)
+                self.arrival_offsets.append(unaligned)
+                logging.info(f"Audio sync: '{label}' sent, hold error {position - target:+.1f}s (on arrival: {unaligned:+.1f}s from the estimated audible position)")
+            self._send(send, label)
+            self._maybe_sample()
+
+    def _maybe_sample(self):
+        now = self.clock.time()
+        if now >= self.next_sample:
+            self.next_sample = now + SAMPLE_INTERVAL
+            self.offset.sample()
+
+    def _send(self, send, label):
+        try:
+            send()
+        except Exception as e:
+            logging.debug(f"Audio sync: send of '{label}' failed: {e}")
+
+    def stats(self):
+        lag = self.offset.current()
+        return {
+            "lag_s": round(lag, 2) if lag is not None else None,
+            "extra_s": self.offset.extra,
+            "pending": len(self.pending),
+            "updates": len(self.hold_errors),
+            "hold_error_max_abs_s": round(max(abs(e) for e in self.hold_errors), 2) if self.hold_errors else None,
+            "arrival_offset_p50_s": round(_median(self.arrival_offsets), 2) if self.arrival_offsets else None,
+        }
+
+    def report(self):
+        s = self.stats()
+        if s["lag_s"] is None:
+            return "Audio sync: no playback position yet"
+        held = (f"on arrival p50 {s['arrival_offset_p50_s']:+.1f}s, max hold error |{s['hold_error_max_abs_s']:.1f}|s"
+                if s["updates"] else "no updates yet")
+        return f"Audio sync: receiver {s['lag_s']:.1f}s behind live, {held} over {s['updates']} updates"
@@ -0,0 +1,162 @@
+"""
+Event-driven waits for a receiver app launch.
+
+`start_app()` returns once the device reports the app as running, but the
+receiver page may still be loading. Its custom namespace is not announced
+yet, and its message listener is not attached yet. Waiting a fixed number of
+seconds is too long on a fast Chromecast and too short on a docked Pixel
+Tablet. Instead, `wait_until_ready()` waits for each of these in turn:
+
+1. app running        - RECEIVER_STATUS shows `app_id`
+2. namespace ready    - our namespace is in the app's announced namespaces
+3. first PONG         - the receiver page answered a PING
+
+All three share one deadline. Each stage's latency is recorded per device
+in LATENCY_FILE, and `latency_summary()` reports it.
+
+    watcher = LaunchWatcher(cast, app_id, NAMESPACE)
+    cast.start_app(app_id)
+    stages = wait_until_ready(watcher, controller, cast.name)
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+DEFAULT_DEADLINE = 30.0
+PING_INTERVAL = 1.0
+RETRY_INTERVAL = 0.2
+LATENCY_FILE = os.path.expanduser("~/.cache/kozt_launch_latency.json")
+LATENCY_HISTORY = 50
+STAGES = ("app running", "namespace ready", "first pong")
+# How long the post-playback app check waits for the RECEIVER_STATUS that follows play_media
+STATUS_SETTLE = 1.0
+
+
+class LaunchWatcher:
+    """
+    Cast status listener. `app_running` and `namespace_ready` are set while
+    the device reports our app (and namespace), and cleared when it stops.
+    `status_changed` is set by every status update; clear it with
+    `expect_status()` to wait for the next one.
+    """
+    def __init__(self, cast, app_id, namespace):
+        self.app_id = app_id
+        self.namespace = namespace
+        self.app_running = threading.Event()
+        self.namespace_ready = threading.Event()
+        self.status_changed = threading.Event()
+        cast.register_status_listener(self)
+        self.new_cast_status(cast.status)
+
+    def new_cast_status(self, status):
+        if status is None:
+            return
+        if status.app_id == self.app_id:
+            self.app_running.set()
+        else:
+            self.app_running.clear()
+        if status.app_id == self.app_id and self.namespace in (status.namespaces or []):
+            self.namespace_ready.set()
+        else:
+            self.namespace_ready.clear()
+        self.status_changed.set()
+
+    def expect_status(self):
+        """Forgets the status seen so far, e.g. before play_media."""
+        self.status_changed.clear()
+
+    def wait_for_status(self, timeout=STATUS_SETTLE):
+        """
+        Waits for a status update after `expect_status()`. The device only
+        reports one if the running app changed (e.g. a fallback to the Default
+        Media Receiver), so a timeout means the app is unchanged.
+        """
+        return self.status_changed.wait(timeout)
+
+
+def wait_until_ready(watcher, controller, device_name, deadline=DEFAULT_DEADLINE, clock=time, record=True):
+    """
+    Waits for app running -> namespace ready -> first PONG, all within `deadline` seconds.
+    Returns {stage: seconds since the call}. A stage that timed out is missing,
+    and so is every stage after it.
+    """
+    start = clock.time()
+    remaining = lambda: max(0.0, start + deadline - clock.time())
+    stages = {}
+
+    for stage, event in (("app running", watcher.app_running), ("namespace ready", watcher.namespace_ready)):
+        if not event.wait(remaining()):
+            logging.warning(f"Launch: '{device_name}' no {stage} after {deadline:.0f}s")
+            return _finish(device_name, stages, record)
+        stages[stage] = clock.time() - start
+
+    # The page may announce the namespace before its listener is attached: PING until it answers
+    while remaining() > 0:
+        sent_at = clock.time()
+        if controller.send_keepalive(timeout=min(PING_INTERVAL, remaining())):
+            stages["first pong"] = clock.time() - start
+            break
+        # A send that fails outright returns at once: pace the retries
+        clock.sleep(min(max(0.0, RETRY_INTERVAL - (clock.time() - sent_at)), remaining()))
+    else:
+        logging.warning(f"Launch: '{device_name}' did not answer PING within {deadline:.0f}s")
+
+    return _finish(device_name, stages, record)
+
+
+def _finish(device_name, stages, record):
+    logging.info(f"Launch: '{device_name}' " + ", ".join(f"{stage} {stages[stage]:.2f}s" if stage in stages else f"{stage} -"
+                                                         for stage in STAGES))
+    if record:
+        try:
+            record_latency(device_name, stages)
+        except (OSError, ValueError) as e:
+            logging.debug(f"Launch: could not record latency: {e}")
+    return stages
+
+
+def load_latencies(path=LATENCY_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def record_latency(device_name, stages, path=LATENCY_FILE):
+    """Appends one launch to the device's history (last LATENCY_HISTORY launches are kept)."""
+    history = load_latencies(path)
+    launches = history.setdefault(device_name, [])
+    launches.append({"at": round(time.time()), **{stage: round(seconds, 3) for stage, seconds in stages.items()}})
+    del launches[:-LATENCY_HISTORY]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def latency_summary(device_name, path=LATENCY_FILE):
+    """One line per stage with the median and max over the recorded launches, plus the timeout count."""
+    launches = load_latencies(path).get(device_name, [])
+    if not launches:
+        return f"{device_name}: no launches recorded"
+    lines = [f"{device_name}: {len(launches)} launches"]
+    for stage in STAGES:
+        values = sorted(launch[stage] for launch in launches if stage in launch)
+        missed = len(launches) - len(values)
+        if values:
+            lines.append(f"  {stage:<16} median {values[len(values) // 2]:6.2f}s  max {values[-1]:6.2f}s"
+                         f"{f'  ({missed} timed out)' if missed else ''}")
+        else:
+            lines.append(f"  {stage:<16} never reached")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    history = load_latencies()
+    for name in sys.argv[1:] or sorted(history):
+        print(latency_summary(name))
@@ -0,0 +1,163 @@
+"""
+Long-lived device registry: one CastBrowser on one shared Zeroconf instance.
+
+play_radio() used to call get_listed_chromecasts() on every attempt, and
+discover_all_chromecasts() after that when the device did not answer at
+once. Each call started a fresh browser (never stopped) and waited for mDNS
+answers that the previous attempt had already had. So every reconnect paid
+5-10 s of discovery.
+
+The registry keeps browsing for the life of the process and maintains a
+table of devices by friendly name. Browser callbacks become events:
+
+    added     a device appeared
+    updated   its mDNS record changed (same address)
+    moved     its host or port changed (DHCP renewal, network switch)
+    removed   it went away (goodbye packet or TTL expiry)
+
+`lookup(name, timeout)` returns a known device at once, and waits only for
+a device that is not (or no longer) in the table. Subscribers get every
+event, and the last HISTORY events are kept for `snapshot()`.
+
+    registry = CastRegistry().start()
+    cast = registry.get_chromecast("Kitchen Hub", timeout=10)
+
+    python3 cast_registry.py            # watch devices come and go
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+import pychromecast
+import zeroconf
+from pychromecast.discovery import AbstractCastListener, CastBrowser
+
+HISTORY = 50
+
+
+def _address(info):
+    return f"{info.host}:{info.port}"
+
+
+class CastRegistry(AbstractCastListener):
+    """Live table of Cast devices, fed by a CastBrowser that runs until stop()."""
+    def __init__(self, zconf=None, known_hosts=None):
+        self.zconf = zconf
+        self.known_hosts = known_hosts
+        self.browser = None
+        self.devices = {}        # friendly name -> CastInfo
+        self.names = {}          # uuid -> friendly name (a rename keeps the uuid)
+        self.cond = threading.Condition()
+        self.subscribers = []
+        self.history = deque(maxlen=HISTORY)
+        self.started = None
+
+    def start(self):
+        self.zconf = self.zconf or zeroconf.Zeroconf()
+        self.browser = CastBrowser(self, self.zconf, self.known_hosts)
+        self.browser.start_discovery()
+        self.started = time.time()
+        return self
+
+    def stop(self):
+        """Stops browsing and closes the Zeroconf instance (CastBrowser.stop_discovery closes it)."""
+        if self.browser:
+            self.browser.stop_discovery()
+            self.browser = None
+
+    def subscribe(self, callback):
+        """`callback(event, name, cast_info)` for every added/updated/moved/removed event (on the browser's thread)."""
+        self.subscribers.append(callback)
+
+    # AbstractCastListener
+
+    def add_cast(self, uuid, service):
+        self._changed(uuid)
+
+    def update_cast(self, uuid, service):
+        self._changed(uuid)
+
+    def remove_cast(self, uuid, service, cast_info):
+        with self.cond:
+            name = self.names.pop(uuid, cast_info.friendly_name)
+            self.devices.pop(name, None)
+        self._emit("removed", name, cast_info)
+
+    def _changed(self, uuid):
+        info = self.browser.devices.get(uuid) if self.browser else None
+        if info is None or not info.friendly_name:
+            return
+        with self.cond:
+            old_name = self.names.get(uuid)
+            if old_name and old_name != info.friendly_name:
+                self.devices.pop(old_name, None)
+            previous = self.devices.get(info.friendly_name)
+            self.names[uuid] = info.friendly_name
+            self.devices[info.friendly_name] = info
+            self.cond.notify_all()
+        if previous is None:
+            event = "added"
+        elif (previous.host, previous.port) != (info.host, info.port):
+            event = "moved"
+        else:
+            event = "updated"
+        self._emit(event, info.friendly_name, info)
+
+    def _emit(self, event, name, info):
+        self.history.append((time.time(), event, name, _address(info) if info else None))
+        log = logging.info if event in ("moved", "removed") else logging.debug
+        log(f"Registry: {name} {event} ({_address(info) if info else '?'})")
+        for callback in list(self.subscribers):
+            try:
+                callback(event, name, info)
+            except Exception as e:
+                logging.debug(f"Registry: subscriber failed on {event} {name}: {e}")
+
+    # Lookups
+
+    def lookup(self, name, timeout=0):
+        """The device's CastInfo, waiting up to `timeout` seconds for it to appear. None if it does not."""
+        with self.cond:
+            self.cond.wait_for(lambda: name in self.devices, timeout)
+            return self.devices.get(name)
+
+    def get_chromecast(self, name, timeout=0):
+        """A Chromecast object for `name` (not yet connected), or None if the device is not known within `timeout`."""
+        info = self.lookup(name, timeout)
+        if info is None:
+            return None
+        return pychromecast.get_chromecast_from_cast_info(info, self.zconf)
+
+    def known(self):
+        with self.cond:
+            return sorted(self.devices)
+
+    def snapshot(self):
+        with self.cond:
+            devices = {name: {"address": _address(info), "model": info.model_name, "uuid": str(info.uuid)}
+                       for name, info in self.devices.items()}
+        return {
+            "devices": devices,
+            "uptime_s": round(time.time() - self.started) if self.started else None,
+            "events": [{"at": round(at), "event": event, "name": name, "address": address}
+                       for at, event, name, address in self.history],
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Watch Cast devices appear, move and disappear.")
+    parser.add_argument("--known-host", action="append", default=None, help="Also poll this host directly (mDNS-less networks)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    registry = CastRegistry(known_hosts=args.known_host)
+    registry.subscribe(lambda event, name, info: print(f"{time.strftime('%H:%M:%S')} {event:<8} {name} ({_address(info) if info else '?'})"))
+    registry.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        registry.stop()
@@ -0,0 +1,180 @@
+"""
+Unix-domain JSON-RPC control socket for a running sender.
+
+A client sends one JSON-RPC 2.0 request per line and gets one response per
+line back. The connection can stay open for more requests.
+
+    -> {"jsonrpc": "2.0", "id": 1, "method": "switch_station", "params": {"url": "http://..."}}
+    <- {"jsonrpc": "2.0", "id": 1, "result": {"stream_url": "http://...", "seconds": 0.84}}
+
+The methods are whatever the owner registers (see play_kozt.SessionControl).
+Params may be given by name (object) or by position (array). Errors use the
+standard codes, plus -32000 for a method that refused the request.
+
+Client:
+    python3 control.py "Kitchen Hub" state
+    python3 control.py "Kitchen Hub" switch_station url=http://stream.example/aac title="Other Station"
+    python3 control.py /run/user/1000/kozt-kitchen-hub.sock pause_metadata paused=true
+"""
+import json
+import logging
+import os
+import re
+import socket
+import threading
+
+DEFAULT_DIRECTORY = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+MAX_LINE = 64 * 1024
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+REFUSED = -32000
+
+
+class ControlError(Exception):
+    """Raised by a control method to refuse a request; the message goes back to the client."""
+    def __init__(self, message, code=REFUSED):
+        super().__init__(message)
+        self.code = code
+
+
+def socket_path_for(device_name, directory=DEFAULT_DIRECTORY):
+    """Default socket path for a device: <runtime dir>/kozt-<device-slug>.sock."""
+    slug = re.sub(r"[^a-z0-9]+", "-", device_name.lower()).strip("-") or "device"
+    return os.path.join(directory, f"kozt-{slug}.sock")
+
+
+class ControlServer:
+    """Serves `methods` ({name: callable}) on a Unix socket, one thread per client."""
+    def __init__(self, path, methods):
+        self.path = path
+        self.methods = methods
+        self.sock = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        if os.path.exists(self.path):
+            # Left behind by a process that did not exit cleanly, unless someone still answers on it
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise OSError(f"control socket {self.path} is in use by another process")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.path)
+            finally:
+                probe.close()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.sock.listen(4)
+        threading.Thread(target=self._serve, name="control", daemon=True).start()
+        logging.info(f"Control: listening on {self.path}")
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.sock:
+            self.sock.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def _serve(self):
+        while not self.stop_event.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._client, args=(conn,), name="control-client", daemon=True).start()
+
+    def _client(self, conn):
+        with conn, conn.makefile("rb") as reader:
+            for line in reader:
+                if len(line) > MAX_LINE:
+                    response = self._error(None, INVALID_REQUEST, "request too large")
+                elif not line.strip():
+                    continue
+                else:
+                    response = self.dispatch(line)
+                try:
+                    conn.sendall(json.dumps(response).encode() + b"\n")
+                except OSError:
+                    return
+
+    def dispatch(self, line):
+        """Handles one request line and returns the response object."""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return self._error(None, PARSE_ERROR, f"parse error: {e}")
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return self._error(None, INVALID_REQUEST, "expected an object with a 'method'")
+
+        request_id = request.get("id")
+        method = self.methods.get(request["method"])
+        if method is None:
+            return self._error(request_id, METHOD_NOT_FOUND, f"unknown method '{request['method']}' (have: {', '.join(sorted(self.methods))})")
+        params = request.get("params") or {}
+        logging.info(f"Control: {request['method']} {params}")
+        try:
+            result = method(**params) if isinstance(params, dict) else method(*params)
+        except TypeError as e:
+            return self._error(request_id, INVALID_PARAMS, str(e))
+        except ControlError as e:
+            return self._error(request_id, e.code, str(e))
+        except Exception as e:
+            logging.warning(f"Control: {request['method']} failed: {e}")
+            return self._error(request_id, INTERNAL_ERROR, str(e))
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def _error(self, request_id, code, message):
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def call(path, method, timeout=30, **params):
+    """Calls `method` on the control socket at `path`. Raises ControlError if the sender returns an error."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params}).encode() + b"\n")
+        with sock.makefile("rb") as reader:
+            response = json.loads(reader.readline())
+    if "error" in response:
+        raise ControlError(response["error"]["message"], response["error"]["code"])
+    return response["result"]
+
+
+def parse_param(text):
+    """key=value from the command line; values are read as JSON when they parse (true, 3, [..]) and as strings otherwise."""
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise ValueError(f"expected key=value, got '{text}'")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Send a command to a running sender's control socket.")
+    parser.add_argument("target", help="Device name (uses the default socket path) or a socket path")
+    parser.add_argument("method", help="e.g. state, stats, switch_station, set_stream, pause_metadata, resume_metadata")
+    parser.add_argument("params", nargs="*", help="key=value parameters")
+    args = parser.parse_args()
+
+    path = args.target if os.sep in args.target or args.target.endswith(".sock") else socket_path_for(args.target)
+    try:
+        result = call(path, args.method, **dict(parse_param(p) for p in args.params))
+    except (OSError, ValueError) as e:
+        print(f"Error: {path}: {e}", file=sys.stderr)
+        sys.exit(2)
+    except ControlError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result, indent=2))
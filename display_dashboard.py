@@ -8,7 +8,8 @@ from pychromecast.controllers import BaseController
 import threading
 import struct
 import json
-from urllib.parse import quote
+from cast_events import LaunchWatcher, wait_until_ready
+from now_playing import AmperwaveProvider, fetch_album_art, DEFAULT_AMPERWAVE_STATION
 
 # Silent MP3 URL (hosted on GitHub to ensure accessibility)
 # Using a reliable source for 10 minutes of silence
@@ -24,6 +25,9 @@ DEFAULT_SUBTITLE = "Metadata Display Only"
 
 NAMESPACE = 'urn:x-cast:com.example.radio'
 
+# Amperwave now-playing source (--station picks the station)
+KOZT_PROVIDER = AmperwaveProvider()
+
 class RadioController(BaseController):
     """
     Controller to send custom messages to the receiver.
@@ -74,7 +78,7 @@ class RadioController(BaseController):
             logging.debug(f"  Image: {image_url}")
         self.send_message(msg)
 
-    def send_keepalive(self):
+    def send_keepalive(self, timeout=3.0):
         """
         Sends a PING and waits for a PONG.
         Returns True if PONG received within timeout, False otherwise.
@@ -83,8 +87,8 @@ class RadioController(BaseController):
             self.pong_received.clear()
             self.send_message({"type": "PING"})
             
-            # Wait for PONG (3 seconds timeout)
-            if self.pong_received.wait(timeout=3.0):
+            # Wait for PONG (3 seconds timeout by default)
+            if self.pong_received.wait(timeout=timeout):
                 return True
             else:
                 logging.debug("Keepalive: PING sent but no PONG received (Timeout).")
@@ -138,33 +142,6 @@ def resolve_playlist(url):
     
     return url
 
-def fetch_album_art(artist, title):
-    """
-    Fetches album art URL using the iTunes Search API.
-    Returns None if not found or on error.
-    """
-    if not artist or not title:
-        return None
-        
-    search_term = f"{artist} {title}"
-    url = f"https://itunes.apple.com/search?term={quote(search_term)}&media=music&limit=1"
-    
-    try:
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data['resultCount'] > 0:
-                # Get the largest available image (artworkUrl100 is usually 100x100)
-                # We can try to hack the URL to get a higher res version (e.g. 600x600)
-                artwork_url = data['results'][0].get('artworkUrl100')
-                if artwork_url:
-                    # Replace '100x100bb' with '600x600bb' for higher quality
-                    return artwork_url.replace('100x100bb', '600x600bb')
-    except Exception as e:
-        print(f"Error fetching album art: {e}")
-    
-    return None
-
 def metadata_monitor(stream_url, controller, stop_event):
     """
     Connects to the stream in a separate thread, reads interleaved metadata,
@@ -251,32 +228,13 @@ def metadata_monitor(stream_url, controller, stop_event):
 
 def scrape_kozt_now_playing():
     """
-    Fetches KOZT now playing data from the Amperwave JSON API.
+    Fetches now playing data for the --station from the Amperwave JSON API.
     Returns: title, artist, image_url, album, time
     """
     try:
-        # Discovered API endpoint
-        url = "https://api-nowplaying.amperwave.net/api/v1/prtplus/nowplaying/10/4756/nowplaying.json"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if "performances" in data and isinstance(data["performances"], list) and len(data["performances"]) > 0:
-            current_track = data["performances"][0]
-            
-            song_title = current_track.get("title", "Unknown Song").strip()
-            artist_name = current_track.get("artist", "Unknown Artist").strip()
-            album_name = current_track.get("album", "").strip()
-            track_time = current_track.get("time", "").strip()
-            
-            # Prefer large image, fall back to medium, then small
-            image_url = current_track.get("largeimage") or \
-                        current_track.get("mediumimage") or \
-                        current_track.get("smallimage")
-            
-            return song_title, artist_name, image_url, album_name, track_time
-            
+        track = KOZT_PROVIDER.fetch()
+        if track:
+            return track.as_tuple()
         return None, None, None, None, None
 
     except Exception as e:
@@ -319,11 +277,14 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
     }
 
     # Launch Default Media Receiver and play
+    watcher = None
     if app_id:
         print(f"Launching Custom App ID: {app_id}")
         try:
+            watcher = LaunchWatcher(cast, app_id, NAMESPACE)
             cast.start_app(app_id) # Custom Receiver
-            time.sleep(5) # Wait longer for app to load
+            # Wait for the receiver page (app running, namespace announced, first PONG) instead of a fixed sleep
+            wait_until_ready(watcher, radio_controller, cast.name)
         except pychromecast.error.RequestFailed:
             print(f"Error: Failed to launch App ID {app_id}.")
             print("Possible causes:")
@@ -338,12 +299,15 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
         # But explicitly setting it helps if we want to switch apps
         # cast.start_app("CC1AD845") # Default Media Receiver ID
 
+    if watcher:
+        watcher.expect_status()
     mc.play_media(stream_url, stream_type, stream_type="BUFFERED", title=title, thumb=image_url, metadata=metadata)
     mc.block_until_active()
     print("Playback started!")
     
-    # Verify the correct app is running AFTER playback starts
-    time.sleep(1) # Allow status to update
+    # Verify the correct app is running AFTER playback starts: wait for the status that a fallback to the Default Media Receiver would send
+    if watcher:
+        watcher.wait_for_status()
     if app_id and cast.status:
          logging.debug(f"Debug: Active App ID is {cast.status.app_id}")
          if cast.status.app_id != app_id:
@@ -517,8 +481,11 @@ if __name__ == "__main__":
     parser.add_argument("device_name", help="The friendly name of the Chromecast (e.g., 'Living Room TV')")
     parser.add_argument("--app_id", default=None, help="Custom Receiver App ID (Register at cast.google.com/publish)")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--station", default=DEFAULT_AMPERWAVE_STATION, help="Amperwave station path for metadata (e.g. 10/4756)")
     
     args = parser.parse_args()
+
+    KOZT_PROVIDER = AmperwaveProvider(args.station)
     
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='%(message)s')
     
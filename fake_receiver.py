@@ -0,0 +1,482 @@
+"""
+Local stand-in for Cast devices, for load and fan-out tests without hardware.
+
+Each FakeReceiver listens on its own loopback port and speaks enough CastV2
+for pychromecast and play_kozt.py:
+
+- TLS, with 4-byte length-prefixed CastMessage protobufs
+- connection      CONNECT / CLOSE
+- heartbeat       PING -> PONG
+- receiver        GET_STATUS, LAUNCH (or LAUNCH_ERROR), STOP, SET_VOLUME -> RECEIVER_STATUS
+- media           LOAD, GET_STATUS, PLAY/PAUSE/STOP -> MEDIA_STATUS (currentTime advances)
+- custom radio    PING -> PONG; track updates, CONFIG, ICECAST_STATUS and STREAM_STATUS are counted
+
+A launched app first announces only the media namespace. The radio namespace
+follows after the "page load" delay, and PINGs are answered from then on, the
+way the real receiver page behaves (see cast_events.py).
+
+Fault injection (Faults):
+    latency      delay before every reply (uniform range, seconds)
+    page_load    launch -> radio namespace announced and answering
+    drop         probability that a radio PONG or heartbeat PONG is not sent
+    launch_fail  probability that LAUNCH answers LAUNCH_ERROR
+    disconnect_clients() / send_disconnect() / switch_app()   on demand
+
+Ports other than 8009 make pychromecast skip its HTTP device-info lookup, so
+no other service is needed. Connect with `play_kozt.py NAME --host 127.0.0.1:PORT`.
+
+    python3 fake_receiver.py --count 200 --latency 0.01 0.05 --drop 0.01 --config-out /tmp/fake-devices.json
+    python3 kozt_multi.py /tmp/fake-devices.json
+"""
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import socket
+import ssl
+import struct
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter
+
+from pychromecast.generated.cast_channel_pb2 import CastMessage
+
+NS_CONNECTION = "urn:x-cast:com.google.cast.tp.connection"
+NS_HEARTBEAT = "urn:x-cast:com.google.cast.tp.heartbeat"
+NS_RECEIVER = "urn:x-cast:com.google.cast.receiver"
+NS_MEDIA = "urn:x-cast:com.google.cast.media"
+RADIO_NAMESPACE = "urn:x-cast:com.example.radio"
+PLATFORM_ID = "receiver-0"
+
+DEFAULT_BASE_PORT = 18009
+CERT_DIR = os.path.expanduser("~/.cache/kozt_fake_receiver")
+MAX_MESSAGE = 64 * 1024
+
+
+def ensure_certificate(directory=CERT_DIR):
+    """Self-signed certificate for the TLS listener (made once with the openssl CLI). Returns (cert, key) paths."""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    if os.path.exists(cert) and os.path.exists(key):
+        return cert, key
+    os.makedirs(directory, exist_ok=True)
+    try:
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "3650",
+                        "-subj", "/CN=fake-cast-receiver", "-keyout", key, "-out", cert],
+                       check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise RuntimeError(f"could not create a certificate with openssl ({e}); pass --cert/--key instead") from e
+    return cert, key
+
+
+def server_context(cert=None, key=None):
+    if not cert:
+        cert, key = ensure_certificate()
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class _Scheduler:
+    """One thread for every delayed reply and timed transition, however many receivers run."""
+    def __init__(self):
+        self.queue = []
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def at(self, delay, action):
+        with self.cond:
+            heapq.heappush(self.queue, (time.monotonic() + delay, next(self.seq), action))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="fake-receiver-scheduler", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue or self.queue[0][0] > time.monotonic():
+                    self.cond.wait(max(0.0, self.queue[0][0] - time.monotonic()) if self.queue else None)
+                _, _, action = heapq.heappop(self.queue)
+            try:
+                action()
+            except Exception as e:
+                logging.debug(f"Fake receiver: scheduled action failed: {e}")
+
+
+scheduler = _Scheduler()
+
+
+class Faults:
+    """Latency and failure injection for a receiver (can be changed while it runs)."""
+    def __init__(self, latency=(0.0, 0.0), page_load=(0.5, 2.0), drop=0.0, launch_fail=0.0, seed=None):
+        self.latency = latency
+        self.page_load = page_load
+        self.drop = drop
+        self.launch_fail = launch_fail
+        self.rng = random.Random(seed)
+
+    def delay(self):
+        return self.rng.uniform(*self.latency)
+
+    def page_load_time(self):
+        return self.rng.uniform(*self.page_load)
+
+    def dropped(self):
+        return self.rng.random() < self.drop
+
+    def launch_fails(self):
+        return self.rng.random() < self.launch_fail
+
+
+class _Client:
+    """One sender connection."""
+    def __init__(self, receiver, sock, address):
+        self.receiver = receiver
+        self.sock = sock
+        self.address = address
+        self.lock = threading.Lock()
+        self.open = True
+
+    def send(self, source, destination, namespace, data):
+        message = CastMessage()
+        message.protocol_version = CastMessage.CASTV2_1_0
+        message.source_id = source
+        message.destination_id = destination
+        message.namespace = namespace
+        message.payload_type = CastMessage.STRING
+        message.payload_utf8 = json.dumps(data)
+        payload = message.SerializeToString()
+        with self.lock:
+            if not self.open:
+                return
+            try:
+                self.sock.sendall(struct.pack(">I", len(payload)) + payload)
+            except OSError:
+                self.close()
+
+    def close(self):
+        self.open = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def _read(self, count):
+        chunks = []
+        while count:
+            chunk = self.sock.recv(count)
+            if not chunk:
+                raise ConnectionError("closed by sender")
+            chunks.append(chunk)
+            count -= len(chunk)
+        return b"".join(chunks)
+
+    def serve(self):
+        try:
+            while self.open:
+                length = struct.unpack(">I", self._read(4))[0]
+                if length > MAX_MESSAGE:
+                    raise ConnectionError(f"message of {length} bytes")
+                message = CastMessage()
+                message.ParseFromString(self._read(length))
+                try:
+                    data = json.loads(message.payload_utf8) if message.payload_utf8 else {}
+                except ValueError:
+                    data = {}
+                self.receiver.handle(self, message, data)
+        except (OSError, ConnectionError, ssl.SSLError) as e:
+            logging.debug(f"Fake receiver {self.receiver.name}: client {self.address} gone: {e}")
+        finally:
+            self.close()
+            self.receiver.client_closed(self)
+
+
+class FakeReceiver:
+    """One fake Cast device on `host:port` (port 0: pick a free one)."""
+    def __init__(self, name, port=0, host="127.0.0.1", faults=None, context=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.faults = faults or Faults()
+        self.context = context or server_context()
+        self.uuid = str(uuid.uuid4())
+        self.lock = threading.Lock()
+        self.clients = set()
+        self.app = None          # running app: {"appId", "sessionId", "transportId", "namespaces", ...}
+        self.media = None        # media session: {"mediaSessionId", "contentId", "started", "playerState"}
+        self.volume = {"level": 0.5, "muted": False}
+        self.media_sessions = itertools.count(1)
+        self.stats = Counter()
+        self.last_update = None
+        self.stream_status = None
+        self.listener = None
+        self.stopping = False
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def start(self):
+        self.listener = socket.create_server((self.host, self.port), backlog=64)
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self._accept, name=f"fake-receiver-{self.port}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopping = True
+        if self.listener:
+            self.listener.close()
+        self.disconnect_clients()
+
+    def _accept(self):
+        while not self.stopping:
+            try:
+                sock, address = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._client, args=(sock, address), name=f"fake-receiver-{self.port}-client", daemon=True).start()
+
+    def _client(self, sock, address):
+        try:
+            sock = self.context.wrap_socket(sock, server_side=True)
+        except (OSError, ssl.SSLError) as e:
+            logging.debug(f"Fake receiver {self.name}: TLS handshake with {address} failed: {e}")
+            sock.close()
+            return
+        client = _Client(self, sock, address)
+        with self.lock:
+            self.clients.add(client)
+        self.stats["connections"] += 1
+        client.serve()
+
+    def client_closed(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    # Replies
+
+    def _reply(self, client, message, namespace, data):
+        """Answers `message` after the injected latency."""
+        source, destination = message.destination_id, message.source_id
+        delay = self.faults.delay()
+        if delay:
+            scheduler.at(delay, lambda: client.send(source, destination, namespace, data))
+        else:
+            client.send(source, destination, namespace, data)
+
+    def _broadcast(self, source, namespace, data):
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.send(source, "*", namespace, data)
+
+    def receiver_status(self, request_id=0):
+        status = {"volume": {**self.volume, "controlType": "attenuation", "stepInterval": 0.05}}
+        if self.app:
+            status["applications"] = [{key: value for key, value in self.app.items() if key != "ready"}]
+        return {"type": "RECEIVER_STATUS", "requestId": request_id, "status": status}
+
+    def media_status(self, request_id=0):
+        if not self.media:
+            return {"type": "MEDIA_STATUS", "requestId": request_id, "status": []}
+        media = self.media
+        playing = media["playerState"] == "PLAYING"
+        current = media["position"] + (time.monotonic() - media["since"] if playing else 0.0)
+        return {"type": "MEDIA_STATUS", "requestId": request_id, "status": [{
+            "mediaSessionId": media["mediaSessionId"], "playbackRate": 1, "playerState": media["playerState"],
+            "currentTime": round(current, 3), "supportedMediaCommands": 15, "volume": self.volume,
+            "media": {"contentId": media["contentId"], "contentType": media["contentType"], "streamType": media["streamType"]},
+        }]}
+
+    # Dispatch
+
+    def handle(self, client, message, data):
+        namespace, kind = message.namespace, data.get("type")
+        request_id = data.get("requestId", 0)
+        self.stats[f"{namespace.rsplit('.', 1)[-1]} {kind or 'update'}"] += 1
+
+        if namespace == NS_HEARTBEAT:
+            if kind == "PING" and not self.faults.dropped():
+                self._reply(client, message, NS_HEARTBEAT, {"type": "PONG"})
+        elif namespace == NS_RECEIVER:
+            if kind == "LAUNCH":
+                self._launch(client, message, data.get("appId"), request_id)
+            elif kind == "STOP":
+                self._stop_app()
+                self._reply(client, message, NS_RECEIVER, self.receiver_status(request_id))
+            elif kind == "SET_VOLUME":
+                self.volume.update({k: v for k, v in data.get("volume", {}).items() if k in ("level", "muted")})
+                self._reply(client, message, NS_RECEIVER, self.receiver_status(request_id))
+            elif kind == "GET_STATUS":
+                self._reply(client, message, NS_RECEIVER, self.receiver_status(request_id))
+        elif namespace == NS_MEDIA and self.app and message.destination_id == self.app["transportId"]:
+            self._media(client, message, data, kind, request_id)
+        elif namespace == RADIO_NAMESPACE and self.app and self.app.get("ready"):
+            if kind == "PING":
+                if not self.faults.dropped():
+                    self._reply(client, message, RADIO_NAMESPACE, {"type": "PONG"})
+            elif kind is None:
+                self.last_update = {"title": data.get("title"), "artist": data.get("artist"), "at": time.time()}
+            elif kind == "STREAM_STATUS":
+                self.stream_status = data.get("state")
+
+    def _launch(self, client, message, app_id, request_id):
+        if self.faults.launch_fails():
+            self._reply(client, message, NS_RECEIVER, {"type": "LAUNCH_ERROR", "requestId": request_id, "reason": "NOT_FOUND"})
+            return
+        self._stop_app()
+        session_id = str(uuid.uuid4())
+        self.app = {"appId": app_id, "displayName": "Fake Receiver App", "sessionId": session_id,
+                    "transportId": session_id, "namespaces": [{"name": NS_MEDIA}], "statusText": "Loading",
+                    "isIdleScreen": False, "ready": False}
+        self.stats["launches"] += 1
+        self._reply(client, message, NS_RECEIVER, self.receiver_status(request_id))
+        self._broadcast(PLATFORM_ID, NS_RECEIVER, self.receiver_status())
+        scheduler.at(self.faults.page_load_time(), lambda: self._page_loaded(session_id))
+
+    def _page_loaded(self, session_id):
+        """The receiver page is up: announce the radio namespace and start answering PINGs."""
+        if not self.app or self.app["sessionId"] != session_id:
+            return
+        self.app["namespaces"] = [{"name": NS_MEDIA}, {"name": RADIO_NAMESPACE}]
+        self.app["statusText"] = "Ready"
+        self.app["ready"] = True
+        self._broadcast(PLATFORM_ID, NS_RECEIVER, self.receiver_status())
+
+    def _stop_app(self):
+        self.app = None
+        self.media = None
+
+    def _media(self, client, message, data, kind, request_id):
+        if kind == "LOAD":
+            media = data.get("media", {})
+            self.media = {"mediaSessionId": next(self.media_sessions), "contentId": media.get("contentId"),
+                          "contentType": media.get("contentType"), "streamType": media.get("streamType", "LIVE"),
+                          "playerState": "PLAYING", "position": 0.0, "since": time.monotonic()}
+            self.stats["loads"] += 1
+        elif self.media and kind in ("PLAY", "PAUSE", "STOP"):
+            if self.media["playerState"] == "PLAYING":
+                self.media["position"] += time.monotonic() - self.media["since"]
+            self.media["since"] = time.monotonic()
+            self.media["playerState"] = {"PLAY": "PLAYING", "PAUSE": "PAUSED", "STOP": "IDLE"}[kind]
+            if kind == "STOP":
+                self._reply(client, message, NS_MEDIA, self.media_status(request_id))
+                self.media = None
+                return
+        self._reply(client, message, NS_MEDIA, self.media_status(request_id))
+
+    # Fault injection on demand
+
+    def disconnect_clients(self):
+        """Drops every sender connection (a Wi-Fi drop or device reboot, as the sender sees it)."""
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.close()
+        self.stats["forced disconnects"] += len(clients)
+        return len(clients)
+
+    def send_disconnect(self):
+        """The receiver page sends DISCONNECT (e.g. the user closed it)."""
+        if self.app and self.app.get("ready"):
+            self._broadcast(self.app["transportId"], RADIO_NAMESPACE, {"type": "DISCONNECT"})
+
+    def switch_app(self, app_id="CC1AD845"):
+        """Someone casts another app over ours."""
+        self._stop_app()
+        session_id = str(uuid.uuid4())
+        self.app = {"appId": app_id, "displayName": "Other App", "sessionId": session_id, "transportId": session_id,
+                    "namespaces": [{"name": NS_MEDIA}], "statusText": "", "isIdleScreen": False, "ready": False}
+        self._broadcast(PLATFORM_ID, NS_RECEIVER, self.receiver_status())
+
+    def snapshot(self):
+        return {"name": self.name, "address": self.address, "clients": len(self.clients),
+                "app_id": self.app["appId"] if self.app else None, "now_playing": self.last_update,
+                "stream_status": self.stream_status, "counters": dict(self.stats)}
+
+
+class ReceiverFarm:
+    """Many FakeReceivers in one process, sharing one TLS context and scheduler."""
+    def __init__(self, count, base_port=DEFAULT_BASE_PORT, host="127.0.0.1", faults=None, prefix="Fake Receiver", context=None):
+        context = context or server_context()
+        width = len(str(count))
+        self.receivers = [FakeReceiver(f"{prefix} {i + 1:0{width}d}", base_port + i if base_port else 0, host,
+                                       faults or Faults(), context) for i in range(count)]
+
+    def start(self):
+        for receiver in self.receivers:
+            receiver.start()
+        return self
+
+    def stop(self):
+        for receiver in self.receivers:
+            receiver.stop()
+
+    def storm(self, fraction=1.0, rng=random):
+        """Drops the connections of `fraction` of the receivers at once (a reconnect storm). Returns how many connections."""
+        victims = rng.sample(self.receivers, round(len(self.receivers) * fraction))
+        return sum(receiver.disconnect_clients() for receiver in victims)
+
+    def config(self, station=None):
+        """A kozt_config devices file pointing kozt_multi.py at every receiver."""
+        devices = {r.name: {"host": r.address, **({"station": station} if station else {})} for r in self.receivers}
+        return {"devices": devices}
+
+    def totals(self):
+        totals = Counter()
+        for receiver in self.receivers:
+            totals.update(receiver.stats)
+        connected = sum(1 for r in self.receivers if r.clients)
+        return connected, totals
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run fake Cast receivers on loopback for load and fan-out tests.")
+    parser.add_argument("--count", type=int, default=1, help="Number of receivers")
+    parser.add_argument("--base-port", type=int, default=DEFAULT_BASE_PORT, help="First port (0: any free ports)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=("MIN", "MAX"), help="Reply latency range (s)")
+    parser.add_argument("--page-load", type=float, nargs=2, default=(0.5, 2.0), metavar=("MIN", "MAX"), help="Launch -> receiver page ready (s)")
+    parser.add_argument("--drop", type=float, default=0.0, help="Probability of dropping a PONG")
+    parser.add_argument("--launch-fail", type=float, default=0.0, help="Probability of LAUNCH_ERROR")
+    parser.add_argument("--storm-every", type=float, default=None, help="Disconnect --storm-fraction of the receivers every N seconds")
+    parser.add_argument("--storm-fraction", type=float, default=0.5, help="Share of receivers dropped per storm")
+    parser.add_argument("--cert", default=None, help="TLS certificate (default: self-signed, made with openssl)")
+    parser.add_argument("--key", default=None, help="TLS key for --cert")
+    parser.add_argument("--config-out", default=None, help="Write a kozt_multi.py devices file for the receivers")
+    parser.add_argument("--station", default=None, help="Station name for the --config-out devices")
+    parser.add_argument("--stats-interval", type=float, default=10, help="Seconds between stats lines")
+    parser.add_argument("--debug", action="store_true", help="Enable debug output")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='%(message)s')
+
+    faults = Faults(tuple(args.latency), tuple(args.page_load), args.drop, args.launch_fail)
+    farm = ReceiverFarm(args.count, args.base_port, args.host, faults, context=server_context(args.cert, args.key)).start()
+    for receiver in farm.receivers[:5]:
+        print(f"{receiver.name}: {receiver.address}")
+    if args.count > 5:
+        print(f"... {args.count} receivers on {farm.receivers[0].address} - {farm.receivers[-1].address}")
+    if args.config_out:
+        with open(args.config_out, "w") as f:
+            json.dump(farm.config(args.station), f, indent=2)
+        print(f"Devices written to {args.config_out}")
+
+    next_storm = time.monotonic() + args.storm_every if args.storm_every else None
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            connected, totals = farm.totals()
+            print(f"{connected}/{args.count} connected; " + ", ".join(f"{k} {v}" for k, v in sorted(totals.items())))
+            if next_storm and time.monotonic() >= next_storm:
+                print(f"Storm: dropped {farm.storm(args.storm_fraction)} sender connections")
+                next_storm = time.monotonic() + args.storm_every
+    except KeyboardInterrupt:
+        farm.stop()
@@ -0,0 +1,326 @@
+"""
+Record and replay of the sender's upstream feeds.
+
+Recording (`play_kozt.py --record FILE`) captures what a live session saw:
+
+- Amperwave now-playing responses
+- iTunes search responses
+- raw ICY metadata blocks from the metadata monitor's stream connection
+
+The file is gzip'd JSON lines. The first line is a header, then one event per line:
+
+    {"format": "kozt-feed", "version": 1, "started": 1700000000.0}
+    {"t": 12.031, "k": "amperwave", "u": "https://...", "s": 200, "ms": 143, "b": "{...}"}
+    {"t": 27.410, "k": "amperwave", "u": "https://...", "s": 200, "ms": 98, "same": 1}
+    {"t": 30.002, "k": "icy", "u": "http://...", "b": "StreamTitle='Artist - Title';"}
+    {"t": 41.700, "k": "amperwave", "u": "https://...", "ms": 5001, "e": "Read timed out"}
+
+`t` is seconds since the recording started. A body identical to the previous
+one for the same URL is written as `"same": 1`, so a day of polling stays
+small. Unchanged ICY blocks are not written at all: they repeat about once a
+second and carry no latency. Failed requests keep their error (`e`), so
+outages replay as outages.
+
+Replay (`play_kozt.py --replay FILE --replay-speed 10`) serves the feed back.
+The sender's own poll timing is left alone:
+
+- FeedReplay.get() answers an Amperwave request with the response that was
+  current at the same point of the recording, after the recorded latency.
+  iTunes requests are matched by URL.
+- IcyReplayServer serves a local ICY stream (silence) whose metadata blocks
+  follow the recorded titles.
+
+At `speed` N, one second of replay covers N seconds of the recording.
+simulate_sender.py --replay FILE runs a recording in virtual time instead.
+
+    python3 feed_replay.py info kozt-monday.jsonl.gz
+    python3 feed_replay.py serve-icy kozt-monday.jsonl.gz --speed 10 --port 8765
+"""
+import gzip
+import json
+import logging
+import threading
+import time
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+FORMAT = "kozt-feed"
+VERSION = 1
+FLUSH_INTERVAL = 5.0     # seconds between flushes of the gzip stream (a killed sender loses at most this much)
+ICY_METAINT = 8192
+ICY_BYTE_RATE = 16000    # 128 kbps of filler
+SKIP_REPEATS = ("icy",)  # kinds whose unchanged bodies are dropped instead of written as "same"
+
+
+def classify(url):
+    """Feed kind of a request URL, or None for requests that are not recorded."""
+    if "amperwave.net" in url and "nowplaying" in url:
+        return "amperwave"
+    if "itunes.apple.com" in url:
+        return "itunes"
+    return None
+
+
+class FeedRecorder:
+    """Appends timestamped feed events to a gzip'd JSON-lines file (thread-safe)."""
+    def __init__(self, path, clock=time):
+        self.path = path
+        self.clock = clock
+        self.started = clock.time()
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.last_body = {}
+        self.last_flush = self.started
+        self.events = 0
+        self._write({"format": FORMAT, "version": VERSION, "started": self.started})
+
+    def _write(self, event):
+        self.file.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+    def record(self, kind, url, body=None, status=None, ms=None, error=None):
+        event = {"t": round(self.clock.time() - self.started, 3), "k": kind, "u": url}
+        if status is not None:
+            event["s"] = status
+        if ms is not None:
+            event["ms"] = round(ms)
+        if error is not None:
+            event["e"] = str(error)
+        with self.lock:
+            if self.file is None:
+                return
+            if body is not None:
+                if self.last_body.get(url) == body:
+                    if kind in SKIP_REPEATS:
+                        return
+                    event["same"] = 1
+                else:
+                    event["b"] = self.last_body[url] = body
+            self._write(event)
+            self.events += 1
+            if event["t"] + self.started - self.last_flush >= FLUSH_INTERVAL:
+                self.file.flush()
+                self.last_flush = self.clock.time()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        logging.info(f"Feed recorder: {self.events} events written to {self.path}")
+
+
+class RecordingHTTP:
+    """Wraps requests (or a Session): Amperwave and iTunes GETs are recorded, everything else passes through."""
+    def __init__(self, recorder, http=requests):
+        self.recorder = recorder
+        self.http = http
+
+    def get(self, url, timeout=None, **kwargs):
+        kind = classify(url)
+        if kind is None:
+            return self.http.get(url, timeout=timeout, **kwargs)
+        started = time.monotonic()
+        try:
+            response = self.http.get(url, timeout=timeout, **kwargs)
+        except Exception as e:
+            self.recorder.record(kind, url, ms=(time.monotonic() - started) * 1000, error=e)
+            raise
+        self.recorder.record(kind, url, response.text, response.status_code, (time.monotonic() - started) * 1000)
+        return response
+
+
+def load_feed(path):
+    """Reads a recording: returns (header, events). A file cut off by a killed sender is read up to the cut."""
+    header, events, last_body = None, [], {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if header is None:
+                    if event.get("format") != FORMAT:
+                        raise ValueError(f"{path}: not a {FORMAT} recording")
+                    header = event
+                    continue
+                if "b" in event:
+                    last_body[event["u"]] = event["b"]
+                elif event.get("same"):
+                    event["b"] = last_body.get(event["u"])
+                events.append(event)
+        except (EOFError, ValueError) as e:
+            if header is None:
+                raise
+            logging.warning(f"Feed replay: {path} is truncated ({e}); using the {len(events)} events before the cut")
+    return header, events
+
+
+class ReplayResponse:
+    """The parts of requests.Response the sender uses."""
+    def __init__(self, url, status_code, text):
+        self.url = url
+        self.status_code = status_code
+        self.text = text or ""
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} (replayed) for url: {self.url}", response=self)
+
+
+class FeedReplay:
+    """
+    Serves a recording back at `speed`. Use it in place of requests for the
+    Amperwave and iTunes requests. position() is the current point in the recording.
+    """
+    def __init__(self, path, speed=1.0, clock=time, latency=True):
+        self.path = path
+        self.header, self.events = load_feed(path)
+        self.speed = speed
+        self.clock = clock
+        self.latency = latency
+        self.started = clock.time()
+        self.duration = self.events[-1]["t"] if self.events else 0.0
+        self.by_kind = {}
+        self.index = {}   # (kind, url or None) -> (times, events)
+        for event in self.events:
+            self.by_kind.setdefault(event["k"], []).append(event)
+            for key in ((event["k"], None), (event["k"], event["u"])):
+                times, events = self.index.setdefault(key, ([], []))
+                times.append(event["t"])
+                events.append(event)
+        self.itunes = {event["u"]: event for event in self.by_kind.get("itunes", [])}
+        self.served = 0
+
+    def position(self):
+        return (self.clock.time() - self.started) * self.speed
+
+    def finished(self):
+        return self.position() > self.duration
+
+    def at(self, kind, position=None, url=None):
+        """The last `kind` event at or before `position` (default: now), else the first one."""
+        position = self.position() if position is None else position
+        times, events = self.index.get((kind, url), ([], []))
+        if not events:
+            return None
+        return events[max(0, bisect_right(times, position) - 1)]
+
+    def changes(self, kind):
+        """(t, body) for each event whose body differs from the one before (e.g. every track change)."""
+        result, last = [], None
+        for event in self.by_kind.get(kind, []):
+            body = event.get("b")
+            if body is not None and body != last:
+                result.append((event["t"], body))
+                last = body
+        return result
+
+    def get(self, url, timeout=None, **kwargs):
+        kind = classify(url)
+        if kind == "itunes":
+            event = self.itunes.get(url)
+            if event is None:
+                return ReplayResponse(url, 200, '{"resultCount": 0, "results": []}')
+        elif kind == "amperwave":
+            # The recorded station if the URL differs (e.g. replaying another station's day)
+            event = self.at(kind, url=url) or self.at(kind)
+        else:
+            raise ValueError(f"Feed replay: no recorded feed for {url}")
+        if event is None:
+            raise ConnectionError(f"Feed replay: {self.path} has no {kind} responses")
+        self.served += 1
+        if self.latency and event.get("ms"):
+            self.clock.sleep(min(event["ms"] / 1000.0, timeout or 30) / self.speed)
+        if "e" in event:
+            raise requests.ConnectionError(f"{event['e']} (replayed)")
+        return ReplayResponse(url, event.get("s", 200), event.get("b"))
+
+    def summary(self):
+        lines = [f"{self.path}: {self.duration / 3600:.2f}h recorded"
+                 f" from {time.strftime('%Y-%m-%d %H:%M', time.localtime(self.header['started']))}"]
+        for kind, events in sorted(self.by_kind.items()):
+            errors = sum(1 for e in events if "e" in e or e.get("s", 200) >= 400)
+            latencies = sorted(e["ms"] for e in events if "ms" in e)
+            latency = f", latency p50 {latencies[len(latencies) // 2]}ms max {latencies[-1]}ms" if latencies else ""
+            lines.append(f"  {kind:<10} {len(events):6d} events, {len(self.changes(kind)):5d} changes, {errors} errors{latency}")
+        return "\n".join(lines)
+
+
+class IcyReplayServer:
+    """Local ICY stream of silence whose metadata follows the recorded ICY titles (at the replay's speed)."""
+    def __init__(self, replay, port=0, host="127.0.0.1"):
+        self.replay = replay
+        replay_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                replay_server._serve(self)
+
+            def log_message(self, format, *args):
+                logging.debug(f"ICY replay: {format % args}")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/stream"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="icy-replay", daemon=True).start()
+        logging.info(f"ICY replay: serving {self.replay.path} on {self.url}")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _serve(self, handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "audio/mpeg")
+        handler.send_header("icy-metaint", str(ICY_METAINT))
+        handler.send_header("icy-br", str(ICY_BYTE_RATE * 8 // 1000))
+        handler.end_headers()
+        filler = bytes(ICY_METAINT)
+        pace = ICY_METAINT / ICY_BYTE_RATE
+        last = None
+        try:
+            while not self.replay.finished():
+                handler.wfile.write(filler)
+                event = self.replay.at("icy")
+                meta = event["b"].encode("utf-8") if event and event.get("b") and event["b"] != last else b""
+                last = event["b"] if meta else last
+                blocks = (len(meta) + 15) // 16
+                handler.wfile.write(bytes([blocks]) + meta.ljust(blocks * 16, b"\0"))
+                handler.wfile.flush()
+                time.sleep(pace)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or serve a recorded feed (play_kozt.py --record).")
+    parser.add_argument("command", choices=["info", "serve-icy"])
+    parser.add_argument("file")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed (serve-icy)")
+    parser.add_argument("--port", type=int, default=8765, help="Port for serve-icy")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    replay = FeedReplay(args.file, args.speed)
+    if args.command == "info":
+        print(replay.summary())
+    else:
+        server = IcyReplayServer(replay, args.port).start()
+        print(f"Serving {args.file} at {args.speed:g}x on {server.url}")
+        try:
+            while not replay.finished():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        server.stop()
@@ -0,0 +1,167 @@
+"""
+Hedged requests for tail latency.
+
+If the first request has not answered by a deadline derived from recent p95
+latency, a second identical request is fired and whichever answers first is
+used. A budget caps hedges to a fraction of all requests so a slow upstream
+never sees more than (1 + budget) x the normal load.
+
+The primary request is always left to finish in the background. That gives
+the "without hedging" latency for every call, so `report()` can compare
+p50/p99 with and without hedging from the same traffic.
+
+Usage (benchmark against the Amperwave now-playing API):
+    python3 hedging.py --count 100 --interval 1
+"""
+import argparse
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_BUDGET = 0.1          # at most 10% extra requests
+DEFAULT_PERCENTILE = 95
+MIN_SAMPLES = 20              # use the default deadline until we have this many samples
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class HedgedRequester:
+    """
+    Wraps a blocking call (e.g. a requests.get) with a p95-derived hedge.
+    """
+    def __init__(self, name, budget=DEFAULT_BUDGET, pct=DEFAULT_PERCENTILE, default_deadline=1.0,
+                 min_deadline=0.2, max_deadline=3.0, window=200):
+        self.name = name
+        self.budget = budget
+        self.pct = pct
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix=f"hedge-{name}")
+        self.lock = threading.Lock()
+
+        self.unhedged = deque(maxlen=window)   # primary request latency ("without hedging")
+        self.hedged = deque(maxlen=window)     # latency the caller actually waited ("with hedging")
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def deadline(self):
+        """Seconds to wait for the primary before hedging."""
+        with self.lock:
+            samples = list(self.unhedged)
+        if len(samples) < MIN_SAMPLES:
+            return self.default_deadline
+        return max(self.min_deadline, min(self.max_deadline, percentile(samples, self.pct)))
+
+    def _budget_allows(self):
+        # One hedge of slack so the very first slow request can still be hedged
+        return self.hedges < self.budget * self.requests + 1
+
+    def call(self, fn):
+        """Runs `fn()` with hedging and returns its result (or raises its exception)."""
+        start = time.monotonic()
+        with self.lock:
+            self.requests += 1
+
+        primary = self.executor.submit(fn)
+        primary.add_done_callback(lambda f: self._record(self.unhedged, time.monotonic() - start))
+
+        deadline = self.deadline()
+        done, _ = wait([primary], timeout=deadline)
+        if done:
+            self._record(self.hedged, time.monotonic() - start)
+            return primary.result()
+
+        with self.lock:
+            allowed = self.budget > 0 and self._budget_allows()
+            if allowed:
+                self.hedges += 1
+            else:
+                self.budget_denied += 1
+
+        if not allowed:
+            try:
+                return primary.result()
+            finally:
+                self._record(self.hedged, time.monotonic() - start)
+
+        logging.debug(f"Hedge {self.name}: primary slower than {deadline:.2f}s, sending hedge request")
+        hedge = self.executor.submit(fn)
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            with self.lock:
+                                self.hedge_wins += 1
+                        return future.result()
+            # Both failed: surface the primary's error
+            return primary.result()
+        finally:
+            self._record(self.hedged, time.monotonic() - start)
+
+    def _record(self, series, latency):
+        with self.lock:
+            series.append(latency)
+
+    def stats(self):
+        with self.lock:
+            unhedged = list(self.unhedged)
+            hedged = list(self.hedged)
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "budget_denied": self.budget_denied,
+                "p50_without": percentile(unhedged, 50),
+                "p99_without": percentile(unhedged, 99),
+                "p50_with": percentile(hedged, 50),
+                "p99_with": percentile(hedged, 99),
+            }
+
+    def report(self):
+        """One-line summary for heartbeat logs."""
+        s = self.stats()
+        fmt = lambda v: f"{v * 1000:.0f}ms" if v is not None else "n/a"
+        return (f"Hedge {self.name}: {s['requests']} requests, {s['hedges']} hedged ({s['hedge_wins']} won, "
+                f"{s['budget_denied']} over budget), deadline {self.deadline() * 1000:.0f}ms | "
+                f"p50 {fmt(s['p50_without'])} -> {fmt(s['p50_with'])}, p99 {fmt(s['p99_without'])} -> {fmt(s['p99_with'])}")
+
+
+if __name__ == "__main__":
+    import requests
+    from now_playing import AMPERWAVE_NOWPLAYING_URL, DEFAULT_AMPERWAVE_STATION
+
+    parser = argparse.ArgumentParser(description="Benchmark hedged requests against the Amperwave now-playing API.")
+    parser.add_argument("--station", default=DEFAULT_AMPERWAVE_STATION, help="Amperwave station path (e.g. 10/4756)")
+    parser.add_argument("--count", type=int, default=100, help="Number of requests")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between requests")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="Max fraction of extra (hedge) requests")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='%(message)s')
+
+    url = AMPERWAVE_NOWPLAYING_URL.format(station=args.station)
+    hedger = HedgedRequester("amperwave", budget=args.budget)
+    for i in range(args.count):
+        try:
+            hedger.call(lambda: requests.get(url, timeout=5).raise_for_status())
+        except Exception as e:
+            logging.info(f"Request {i + 1} failed: {e}")
+        time.sleep(args.interval)
+    time.sleep(5)  # let outstanding primaries finish so the "without" series is complete
+    print(hedger.report())
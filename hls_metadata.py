@@ -0,0 +1,342 @@
+"""
+Now-playing from HLS timed metadata (ID3).
+
+HLS stations have no ICY interleaved metadata: the "stream" is a playlist of
+short segments, and the track title rides along as ID3 tags inside them.
+HlsProvider follows the live playlist and reads just those tags.
+
+- Master playlists: the lowest-BANDWIDTH variant is followed (same metadata,
+  smallest segments).
+- The media playlist is reloaded every target duration (half of it when
+  unchanged, as the HLS spec asks), with If-None-Match / If-Modified-Since so
+  an unchanged playlist costs a 304.
+- Only segments that are new since the last reload are read; on the first
+  load (or after falling behind) only the newest MAX_NEW_SEGMENTS.
+- Packed audio segments (.aac/.mp3) start with their ID3 tags: one ranged
+  request for the first PROBE_BYTES is enough, and the transfer stops there.
+- MPEG-TS segments carry ID3 in a PES stream (PMT stream_type 0x15): the
+  segment is read packet by packet until the first complete ID3 payload.
+
+TIT2/TPE1/TALB become a Track. A TIT2 of "Artist - Title" without TPE1 is
+split like an ICY StreamTitle. fMP4 segments (emsg boxes) are not handled.
+
+    python3 hls_metadata.py https://example.com/live/master.m3u8
+"""
+import logging
+import re
+import struct
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from now_playing import NowPlayingProvider, split_stream_title
+
+PROBE_BYTES = 4096
+MAX_NEW_SEGMENTS = 3
+TS_PACKET = 188
+MAX_TS_BYTES = 2 * 1024 * 1024   # give up on a TS segment without metadata after this much
+HLS_CONTENT_TYPES = ("application/vnd.apple.mpegurl", "application/x-mpegurl", "audio/mpegurl", "audio/x-mpegurl")
+HEADERS = {'User-Agent': 'Mozilla/5.0 (compatible; IcecastMetadataReader/1.0)'}
+
+
+def is_hls(url, content_type=None):
+    """True for an .m3u8 URL or an HLS playlist content type."""
+    if content_type and content_type.split(";")[0].strip().lower() in HLS_CONTENT_TYPES:
+        return True
+    return urlparse(url).path.lower().endswith(".m3u8")
+
+
+def _attributes(text):
+    """'BANDWIDTH=64000,CODECS="mp4a.40.2"' -> {'BANDWIDTH': '64000', 'CODECS': 'mp4a.40.2'}"""
+    return {key: value.strip('"') for key, value in re.findall(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)', text)}
+
+
+def parse_master(text, base_url):
+    """Variant URLs with their bandwidth, lowest first ([] for a media playlist)."""
+    variants, bandwidth = [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            bandwidth = int(_attributes(line.split(":", 1)[1]).get("BANDWIDTH", 0) or 0)
+        elif line and not line.startswith("#") and bandwidth is not None:
+            variants.append((bandwidth, urljoin(base_url, line)))
+            bandwidth = None
+    return sorted(variants)
+
+
+def parse_media(text, base_url):
+    """Returns (media sequence of the first segment, target duration, [segment URLs], ended)."""
+    sequence, target, segments, ended = 0, 6.0, [], False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            sequence = int(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-TARGETDURATION:"):
+            target = float(line.split(":", 1)[1])
+        elif line.startswith("#EXT-X-ENDLIST"):
+            ended = True
+        elif line and not line.startswith("#"):
+            segments.append(urljoin(base_url, line))
+    return sequence, target, segments, ended
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _text(payload):
+    if not payload:
+        return ""
+    encoding = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}.get(payload[0], "latin-1")
+    return payload[1:].decode(encoding, errors="ignore").strip("\0").strip()
+
+
+def parse_id3(data):
+    """
+    Text frames of every ID3v2 tag at the start of `data` ({'TIT2': ..., 'TPE1': ...}).
+    A tag cut off by the probe still yields the frames that fit.
+    """
+    frames = {}
+    offset = 0
+    while data[offset:offset + 3] == b"ID3" and len(data) >= offset + 10:
+        version, flags = data[offset + 3], data[offset + 5]
+        size = _syncsafe(data[offset + 6:offset + 10])
+        end = min(len(data), offset + 10 + size)
+        position = offset + 10
+        if flags & 0x40 and position + 4 <= end:   # extended header
+            position += _syncsafe(data[position:position + 4]) if version == 4 else 4 + struct.unpack(">I", data[position:position + 4])[0]
+        while position + 10 <= end:
+            frame_id = data[position:position + 4]
+            if not frame_id.strip(b"\0"):
+                break   # padding
+            raw_size = data[position + 4:position + 8]
+            frame_size = _syncsafe(raw_size) if version == 4 else struct.unpack(">I", raw_size)[0]
+            payload = data[position + 10:min(end, position + 10 + frame_size)]
+            name = frame_id.decode("latin-1", errors="ignore")
+            if name.startswith("T") and name != "TXXX":
+                frames[name] = _text(payload)
+            elif name == "TXXX":
+                description, _, value = _text(payload).partition("\0")
+                frames[f"TXXX:{description}"] = value.strip("\0")
+            position += 10 + frame_size
+        offset += 10 + size
+    return frames
+
+
+class TsId3Reader:
+    """Feeds MPEG-TS bytes; `result` becomes the first complete ID3 payload of the metadata stream."""
+    def __init__(self):
+        self.buffer = b""
+        self.pmt_pids = set()
+        self.id3_pid = None
+        self.pes = None
+        self.result = None
+
+    def feed(self, data):
+        self.buffer += data
+        while len(self.buffer) >= TS_PACKET and self.result is None:
+            packet, self.buffer = self.buffer[:TS_PACKET], self.buffer[TS_PACKET:]
+            if packet[0] == 0x47:
+                self._packet(packet)
+        return self.result is not None
+
+    def finish(self):
+        """End of segment: a PES still being collected is complete now."""
+        if self.result is None and self.pes:
+            self.result = self._pes_payload(self.pes)
+        return self.result
+
+    def _packet(self, packet):
+        pid = ((packet[1] & 0x1F) << 8) | packet[2]
+        start = bool(packet[1] & 0x40)
+        adaptation = (packet[3] >> 4) & 3
+        offset = 4
+        if adaptation in (2, 3):
+            offset += 1 + packet[4]
+        if adaptation == 2 or offset >= TS_PACKET:
+            return
+        payload = packet[offset:]
+        if pid == 0 and start:
+            section = payload[1 + payload[0]:]
+            length = ((section[1] & 0x0F) << 8) | section[2]
+            entries = section[8:3 + length - 4]
+            for i in range(0, len(entries) - 3, 4):
+                if (entries[i] << 8 | entries[i + 1]) != 0:
+                    self.pmt_pids.add(((entries[i + 2] & 0x1F) << 8) | entries[i + 3])
+        elif pid in self.pmt_pids and start:
+            section = payload[1 + payload[0]:]
+            length = ((section[1] & 0x0F) << 8) | section[2]
+            position = 12 + (((section[10] & 0x0F) << 8) | section[11])
+            while position + 5 <= 3 + length - 4:
+                stream_type = section[position]
+                es_pid = ((section[position + 1] & 0x1F) << 8) | section[position + 2]
+                if stream_type == 0x15:
+                    self.id3_pid = es_pid
+                position += 5 + (((section[position + 3] & 0x0F) << 8) | section[position + 4])
+        elif pid == self.id3_pid and self.id3_pid is not None:
+            if start:
+                if self.pes:
+                    self.result = self._pes_payload(self.pes)
+                    return
+                self.pes = payload
+            elif self.pes is not None:
+                self.pes += payload
+            if self.pes and self._complete(self._pes_payload(self.pes)):
+                self.result = self._pes_payload(self.pes)
+
+    def _complete(self, payload):
+        """The PES holds a whole ID3 tag (its header gives the size), so the rest of the segment can be skipped."""
+        return bool(payload) and payload[:3] == b"ID3" and len(payload) >= 10 and len(payload) >= 10 + _syncsafe(payload[6:10])
+
+    def _pes_payload(self, pes):
+        if pes[:3] != b"\x00\x00\x01" or len(pes) < 9:
+            return None
+        return pes[9 + pes[8]:]
+
+
+class HlsProvider(NowPlayingProvider):
+    """
+    HLS timed metadata (ID3 in segments). Push-like: a change is seen on the
+    first playlist reload after the segment that carries it.
+    """
+    name = "hls"
+    confidence = 0.9
+
+    def __init__(self, playlist_url, session=None, on_bytes=None):
+        self.playlist_url = playlist_url
+        self.http = session or requests
+        self.on_bytes = on_bytes          # e.g. Worker.add_bytes
+        self.media_url = None
+        self.validators = {}              # conditional GET headers for the media playlist
+        self.next_sequence = None
+        self.target = 6.0
+        self.bytes_received = 0
+        self.last_raw = None
+
+    def _count(self, count):
+        self.bytes_received += count
+        if self.on_bytes:
+            self.on_bytes(count)
+
+    def _get_text(self, url, headers=None):
+        response = self.http.get(url, headers={**HEADERS, **(headers or {})}, timeout=10)
+        self._count(len(response.content or b""))
+        return response
+
+    def _resolve_media_url(self):
+        response = self._get_text(self.playlist_url)
+        response.raise_for_status()
+        variants = parse_master(response.text, response.url or self.playlist_url)
+        if variants:
+            bandwidth, self.media_url = variants[0]
+            logging.debug(f"Provider {self.name}: following the {bandwidth // 1000} kbps variant of {len(variants)}")
+        else:
+            self.media_url = self.playlist_url
+
+    def new_segments(self):
+        """Reloads the media playlist. Returns the URLs of segments not seen before (None if unchanged)."""
+        if self.media_url is None:
+            self._resolve_media_url()
+        response = self._get_text(self.media_url, self.validators)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        self.validators = {header: response.headers[source] for header, source in
+                           (("If-None-Match", "ETag"), ("If-Modified-Since", "Last-Modified")) if response.headers.get(source)}
+        sequence, self.target, segments, _ = parse_media(response.text, response.url or self.media_url)
+        end = sequence + len(segments)
+        first = max(sequence, end - MAX_NEW_SEGMENTS) if self.next_sequence is None else max(self.next_sequence, sequence)
+        if self.next_sequence is not None and self.next_sequence < sequence:
+            logging.debug(f"Provider {self.name}: fell behind by {sequence - self.next_sequence} segments")
+            first = max(first, end - MAX_NEW_SEGMENTS)
+        self.next_sequence = end
+        return segments[first - sequence:]
+
+    def segment_metadata(self, url):
+        """ID3 text frames of one segment, reading as little of it as possible."""
+        with self.http.get(url, headers={**HEADERS, "Range": f"bytes=0-{PROBE_BYTES - 1}"}, stream=True, timeout=10) as r:
+            r.raise_for_status()
+            head = r.raw.read(PROBE_BYTES)
+            self._count(len(head))
+            if head[:3] == b"ID3":
+                return parse_id3(head)
+            if not head or head[0] != 0x47:
+                return {}
+            # MPEG-TS: the metadata PES can be anywhere, so the segment is read until it shows up
+            reader = TsId3Reader()
+            if reader.feed(head) or len(head) < PROBE_BYTES:
+                payload = reader.finish()
+                return parse_id3(payload) if payload else {}
+            if r.status_code != 206:
+                return self._ts_metadata(r, reader, len(head))
+        # The server honours ranges: carry on after the probe
+        with self.http.get(url, headers={**HEADERS, "Range": f"bytes={len(head)}-"}, stream=True, timeout=10) as r:
+            r.raise_for_status()
+            return self._ts_metadata(r, reader, len(head))
+
+    def _ts_metadata(self, response, reader, read):
+        while read < MAX_TS_BYTES:
+            chunk = response.raw.read(16 * TS_PACKET)
+            if not chunk:
+                break
+            read += len(chunk)
+            self._count(len(chunk))
+            if reader.feed(chunk):
+                break
+        payload = reader.finish()
+        return parse_id3(payload) if payload else {}
+
+    def _track_from(self, frames):
+        title, artist = frames.get("TIT2", ""), frames.get("TPE1", "")
+        if not title:
+            return None
+        if not artist:
+            artist, title = split_stream_title(title)
+        return self._track(title=title, artist=artist, album=frames.get("TALB", ""))
+
+    def fetch(self):
+        """One-shot: the metadata of the newest segment."""
+        segments = self.new_segments() or []
+        for url in reversed(segments):
+            track = self._track_from(self.segment_metadata(url))
+            if track:
+                return track
+        return None
+
+    def run(self, emit, stop_event):
+        while not stop_event.is_set():
+            delay = self.target / 2
+            try:
+                segments = self.new_segments()
+                # Unchanged playlist (a 304, or a 200 without new segments): reload after half the target
+                if segments:
+                    delay = self.target
+                    for url in segments:
+                        track = self._track_from(self.segment_metadata(url))
+                        raw = (track.artist, track.title) if track else None
+                        if track and raw != self.last_raw:
+                            self.last_raw = raw
+                            emit(track)
+            except Exception as e:
+                if not stop_event.is_set():
+                    logging.debug(f"Provider {self.name}: reload failed: {e}")
+                    delay = max(self.target, 5)
+            stop_event.wait(delay)
+
+
+if __name__ == "__main__":
+    import argparse
+    import threading
+
+    parser = argparse.ArgumentParser(description="Print the track changes of an HLS stream's timed metadata.")
+    parser.add_argument("url", help="Master or media playlist (.m3u8)")
+    parser.add_argument("--debug", action="store_true", help="Enable debug output")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING, format='%(message)s')
+    provider = HlsProvider(args.url)
+    stop_event = threading.Event()
+    try:
+        provider.run(lambda track: print(f"{track.artist} - {track.title}  ({provider.bytes_received / 1024:.0f} KiB so far)"), stop_event)
+    except KeyboardInterrupt:
+        stop_event.set()
@@ -4,6 +4,95 @@ import sys
 import json
 from urllib.parse import urlparse
 import struct
+import threading
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+ICECAST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; IcecastMetadataReader/1.0)',
+    'Icy-MetaData': '1' # Request interleaved metadata
+}
+
+def status_url_for(stream_url):
+    """Returns the Icecast /status-json.xsl URL for a stream URL."""
+    parsed_url = urlparse(stream_url)
+    return f"{parsed_url.scheme}://{parsed_url.netloc}/status-json.xsl"
+
+def find_active_source(status_data, mountpoint=None):
+    """
+    Picks the source for `mountpoint` out of a status-json.xsl document
+    (falls back to the first source). Returns None if there are no sources.
+    """
+    sources = status_data.get('icestats', {}).get('source')
+    if not sources:
+        return None
+    if not isinstance(sources, list):
+        sources = [sources]
+
+    active = None
+    if mountpoint:
+        active = next((s for s in sources if s.get('listenurl', '').endswith(mountpoint)), None)
+    return active or sources[0]
+
+def fetch_icecast_status(stream_url, session=None, timeout=5):
+    """
+    Fetches /status-json.xsl for a stream and returns the active source dict
+    (title, listeners, server_name, ...) or None. Raises on HTTP/JSON errors.
+    """
+    http = session or requests
+    response = http.get(status_url_for(stream_url), headers={'User-Agent': ICECAST_HEADERS['User-Agent']}, timeout=timeout)
+    response.raise_for_status()
+    return find_active_source(response.json(), urlparse(stream_url).path)
+
+class IcecastStatusPoller:
+    """
+    Polls /status-json.xsl in a background thread and calls `on_change(source)`
+    whenever the active source's title changes. Servers without the endpoint
+    are retried at `idle_interval` instead of every `interval` seconds.
+    """
+    def __init__(self, stream_url, on_change, interval=10, idle_interval=300):
+        self.stream_url = stream_url
+        self.on_change = on_change
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.stop_event = threading.Event()
+        self.session = requests.Session()
+        self.bytes_received = 0
+        self.session.hooks["response"].append(self._count_bytes)
+        self.last_title = None
+        self.thread = None
+
+    def _count_bytes(self, response, *args, **kwargs):
+        self.bytes_received += len(response.content)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="icecast-status", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(2)
+        self.session.close()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            delay = self.interval
+            try:
+                source = fetch_icecast_status(self.stream_url, self.session)
+                title = source.get('title') if source else None
+                if title and title != self.last_title:
+                    self.last_title = title
+                    logging.debug(f"Icecast status: {title}")
+                    self.on_change(source)
+            except (requests.exceptions.HTTPError, ValueError) as e:
+                # No (JSON) status endpoint on this server: check back rarely
+                logging.debug(f"Icecast status unavailable ({e}); retrying in {self.idle_interval}s")
+                delay = self.idle_interval
+            except Exception as e:
+                logging.debug(f"Icecast status poll failed: {e}")
+            self.stop_event.wait(delay)
 
 def get_icecast_info(stream_url, parse_interleaved=True):
     """
@@ -21,10 +110,7 @@ def get_icecast_info(stream_url, parse_interleaved=True):
     
     # --- 1. Check HTTP Headers & Read Stream for Interleaved Metadata ---
     print("\nAttempting to retrieve Icecast headers and interleaved metadata...")
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (compatible; IcecastMetadataReader/1.0)',
-        'Icy-MetaData': '1' # Request interleaved metadata
-    }
+    headers = ICECAST_HEADERS
     
     try:
         with requests.get(stream_url, headers=headers, stream=True, timeout=10) as r:
@@ -102,7 +188,7 @@ def get_icecast_info(stream_url, parse_interleaved=True):
 
     # --- 2. Check for /status-json.xsl endpoint ---
     print(f"\nAttempting to retrieve /status-json.xsl from: {base_url}/status-json.xsl")
-    status_json_url = f"{base_url}/status-json.xsl"
+    status_json_url = status_url_for(stream_url)
     try:
         response = requests.get(status_json_url, headers=headers, timeout=5)
         if response.status_code == 200:
@@ -134,10 +220,260 @@ def get_icecast_info(stream_url, parse_interleaved=True):
     print("\n--- Inspection Complete ---")
     return results
 
+def read_metadata_block(raw, metaint, deadline):
+    """
+    Skips `metaint` bytes of audio and reads the metadata block that follows.
+    Returns (metadata_str, audio_bytes_read). Raises TimeoutError past `deadline`
+    (time.monotonic()) so a stream that dribbles bytes cannot hold a worker.
+    """
+    remaining = metaint
+    while remaining > 0:
+        if time.monotonic() > deadline:
+            raise TimeoutError("metadata deadline exceeded")
+        chunk = raw.read(min(remaining, 16384))
+        if not chunk:
+            raise EOFError("stream ended before first metadata interval")
+        remaining -= len(chunk)
+
+    length_byte = raw.read(1)
+    if not length_byte:
+        raise EOFError("stream ended at metadata length byte")
+    length = struct.unpack('B', length_byte)[0] * 16
+    metadata_str = raw.read(length).decode('utf-8', errors='ignore') if length else ""
+    return metadata_str, metaint
+
+def inspect_station(stream_url, connect_timeout=5, read_timeout=10, meta_timeout=15, status_timeout=5):
+    """
+    Quiet, structured version of get_icecast_info() for batch use. Every phase
+    (headers, first metadata block, status-json) has its own timeout and error
+    field, so one slow phase never hides the results of the others.
+    """
+    result = {"url": stream_url, "headers": {}, "metaint": None, "stream_title": None, "status_json": None,
+              "timing": {}, "errors": {}}
+    start = time.monotonic()
+
+    # Phase 1 + 2: headers, then one interleaved metadata block
+    try:
+        with requests.get(stream_url, headers=ICECAST_HEADERS, stream=True, timeout=(connect_timeout, read_timeout)) as r:
+            result["timing"]["headers_s"] = round(time.monotonic() - start, 3)
+            result["http_status"] = r.status_code
+            r.raise_for_status()
+            result["content_type"] = r.headers.get('content-type')
+            result["headers"] = {k: v for k, v in r.headers.items() if k.lower().startswith('icy-')}
+            if 'icy-metaint' in r.headers:
+                result["metaint"] = int(r.headers['icy-metaint'])
+
+            if result["metaint"]:
+                meta_start = time.monotonic()
+                try:
+                    metadata_str, _ = read_metadata_block(r.raw, result["metaint"], meta_start + meta_timeout)
+                    result["metadata_raw"] = metadata_str.rstrip("\x00")
+                    if "StreamTitle=" in metadata_str:
+                        result["stream_title"] = metadata_str.split("StreamTitle=")[1].split(';')[0].strip("'")
+                except Exception as e:
+                    result["errors"]["metadata"] = f"{type(e).__name__}: {e}"
+                result["timing"]["metadata_s"] = round(time.monotonic() - meta_start, 3)
+    except Exception as e:
+        result["errors"]["stream"] = f"{type(e).__name__}: {e}"
+
+    # Phase 3: status-json.xsl
+    status_start = time.monotonic()
+    try:
+        response = requests.get(status_url_for(stream_url), headers={'User-Agent': ICECAST_HEADERS['User-Agent']}, timeout=(connect_timeout, status_timeout))
+        response.raise_for_status()
+        status_data = response.json()
+        active = find_active_source(status_data, urlparse(stream_url).path)
+        result["status_json"] = active if active is not None else status_data
+    except Exception as e:
+        result["errors"]["status_json"] = f"{type(e).__name__}: {e}"
+    result["timing"]["status_s"] = round(time.monotonic() - status_start, 3)
+
+    result["timing"]["total_s"] = round(time.monotonic() - start, 3)
+    return result
+
+def read_url_list(path):
+    """Reads stream URLs (one per line, '#' comments allowed) from a file or '-' for stdin."""
+    handle = sys.stdin if path == "-" else open(path)
+    try:
+        return [line.strip() for line in handle if line.strip() and not line.strip().startswith("#")]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def run_batch(urls, out=sys.stdout, workers=16, **timeouts):
+    """
+    Inspects `urls` concurrently (at most `workers` at a time) and writes one
+    JSON line per station as soon as it finishes. Returns the number inspected.
+    """
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="icecast-batch") as executor:
+        futures = {executor.submit(inspect_station, url, **timeouts): url for url in urls}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"url": futures[future], "errors": {"inspect": f"{type(e).__name__}: {e}"}}
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            count += 1
+            logging.info(f"Batch: {count}/{len(urls)} {futures[future]}")
+    return count
+
+def _percentile(values, pct):
+    """Nearest-rank percentile (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))]
+
+def watch_stream(stream_url, duration, on_change=None, connect_timeout=5, read_timeout=10):
+    """
+    Streams `stream_url` for `duration` seconds and profiles it. Audio is read
+    into one preallocated buffer with readinto() and discarded, so the only
+    per-interval work is the length byte and (rarely) a metadata string.
+    Calls `on_change(event)` for every StreamTitle change. Returns a summary dict.
+    """
+    start = time.monotonic()
+    summary = {"url": stream_url, "duration_s": duration, "changes": [], "errors": None}
+    buf = bytearray(65536)
+    view = memoryview(buf)
+    audio_bytes = 0
+    meta_bytes = 0
+    blocks = 0
+    first_byte_at = None
+    last_title = None
+
+    try:
+        with requests.get(stream_url, headers=ICECAST_HEADERS, stream=True, timeout=(connect_timeout, read_timeout)) as r:
+            summary["headers_s"] = round(time.monotonic() - start, 3)
+            r.raise_for_status()
+            raw = r.raw
+            metaint = int(r.headers.get('icy-metaint', 0)) or None
+            bitrate = r.headers.get('icy-br', '').split(',')[0].strip()
+            summary["metaint"] = metaint
+            summary["icy_br_kbps"] = int(bitrate) if bitrate.isdigit() else None
+            deadline = start + duration
+
+            while time.monotonic() < deadline:
+                # Audio: metaint bytes (or plain chunks if the stream has no metadata)
+                remaining = metaint or len(buf)
+                while remaining > 0:
+                    n = raw.readinto(view[:min(remaining, len(buf))])
+                    if not n:
+                        raise EOFError("stream ended")
+                    if first_byte_at is None:
+                        first_byte_at = time.monotonic()
+                    remaining -= n
+                    audio_bytes += n
+                if not metaint:
+                    continue
+
+                length_byte = raw.read(1)
+                if not length_byte:
+                    raise EOFError("stream ended at metadata length byte")
+                blocks += 1
+                length = length_byte[0] * 16
+                if not length:
+                    continue
+                meta_bytes += length
+                metadata_str = raw.read(length).decode('utf-8', errors='ignore')
+                if "StreamTitle=" not in metadata_str:
+                    continue
+                title = metadata_str.split("StreamTitle=")[1].split(';')[0].strip("'")
+                if title == last_title:
+                    continue
+                last_title = title
+                event = {
+                    "title": title,
+                    "wall_s": round(time.monotonic() - start, 3),
+                    # Where in the audio the change sits (needs icy-br); wall_s - audio_s < 0 means the server burst ahead
+                    "audio_s": round(audio_bytes * 8 / (summary["icy_br_kbps"] * 1000), 3) if summary["icy_br_kbps"] else None,
+                }
+                summary["changes"].append(event)
+                if on_change:
+                    on_change(event)
+    except Exception as e:
+        summary["errors"] = f"{type(e).__name__}: {e}"
+
+    elapsed = time.monotonic() - start
+    streaming = elapsed - (first_byte_at - start) if first_byte_at else 0
+    summary["ttfb_s"] = round(first_byte_at - start, 3) if first_byte_at else None
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["audio_bytes"] = audio_bytes
+    summary["metadata_bytes"] = meta_bytes
+    summary["metadata_blocks"] = blocks
+    summary["bytes_read"] = audio_bytes + meta_bytes + blocks
+    summary["throughput_kbps"] = round(audio_bytes * 8 / streaming / 1000, 1) if streaming > 0 else None
+    if summary.get("icy_br_kbps") and first_byte_at:
+        # Audio received beyond real time: the server's initial burst, i.e. how far metadata runs ahead of what a player is hearing
+        summary["buffered_ahead_s"] = round(audio_bytes * 8 / (summary["icy_br_kbps"] * 1000) - streaming, 2)
+
+    # changes[0] is the title already playing at connect: the time to the next change is only part of a song
+    complete = summary["changes"][1:]
+    intervals = [b["wall_s"] - a["wall_s"] for a, b in zip(complete, complete[1:])]
+    summary["update_interval_s"] = {
+        "count": len(intervals),
+        "p50": _percentile(intervals, 50),
+        "p90": _percentile(intervals, 90),
+        "max": max(intervals) if intervals else None,
+    }
+    return summary
+
+def print_watch_summary(summary):
+    fmt = lambda v, unit="": f"{v}{unit}" if v is not None else "n/a"
+    intervals = summary["update_interval_s"]
+    print(f"\n--- Watch summary: {summary['url']} ---")
+    print(f"  Elapsed:            {summary['elapsed_s']}s")
+    print(f"  Headers / TTFB:     {fmt(summary.get('headers_s'), 's')} / {fmt(summary['ttfb_s'], 's')}")
+    print(f"  Icy-MetaInt:        {fmt(summary.get('metaint'), ' bytes')}")
+    print(f"  Throughput:         {fmt(summary['throughput_kbps'], ' kbps')} (icy-br {fmt(summary.get('icy_br_kbps'), ' kbps')})")
+    print(f"  Buffered ahead:     {fmt(summary.get('buffered_ahead_s'), 's')}")
+    print(f"  Title changes:      {len(summary['changes'])}")
+    print(f"  Update interval:    p50 {fmt(intervals['p50'] and round(intervals['p50'], 1), 's')}, "
+          f"p90 {fmt(intervals['p90'] and round(intervals['p90'], 1), 's')}, max {fmt(intervals['max'] and round(intervals['max'], 1), 's')}")
+    print(f"  Bytes read:         {summary['bytes_read']} ({summary['audio_bytes']} audio, {summary['metadata_bytes']} metadata, {summary['metadata_blocks']} length bytes)")
+    if summary["errors"]:
+        print(f"  Stopped early:      {summary['errors']}")
+
+def parse_duration(text):
+    """'90' / '90s' / '15m' / '2h' -> seconds"""
+    units = {"s": 1, "m": 60, "h": 3600}
+    text = text.strip().lower()
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Inspect an internet radio stream for Icecast metadata.")
-    parser.add_argument("stream_url", help="The URL of the internet radio stream.")
+    parser.add_argument("stream_url", nargs="?", help="The URL of the internet radio stream.")
+    parser.add_argument("--batch", metavar="FILE", help="Inspect every URL in FILE ('-' for stdin) and print one JSON line per station")
+    parser.add_argument("--workers", type=int, default=16, help="Stations inspected in parallel in batch mode")
+    parser.add_argument("--connect-timeout", type=float, default=5, help="Connect timeout per request (s)")
+    parser.add_argument("--read-timeout", type=float, default=10, help="Stream header/read timeout (s)")
+    parser.add_argument("--meta-timeout", type=float, default=15, help="Deadline for the first metadata block (s)")
+    parser.add_argument("--status-timeout", type=float, default=5, help="status-json.xsl read timeout (s)")
+    parser.add_argument("--watch", metavar="DURATION", help="Stream for DURATION (e.g. 300, 15m, 2h), log every title change and print a profile")
+    parser.add_argument("--json", action="store_true", help="With --watch: print the summary as JSON")
+    parser.add_argument("--debug", action="store_true", help="Log batch progress to stderr")
     
     args = parser.parse_args()
     
-    get_icecast_info(args.stream_url)
+    if args.batch:
+        logging.basicConfig(level=logging.INFO if args.debug else logging.WARNING, format='%(message)s')
+        urls = read_url_list(args.batch)
+        start = time.monotonic()
+        run_batch(urls, workers=args.workers, connect_timeout=args.connect_timeout, read_timeout=args.read_timeout,
+                  meta_timeout=args.meta_timeout, status_timeout=args.status_timeout)
+        logging.info(f"Batch: inspected {len(urls)} station(s) in {time.monotonic() - start:.1f}s")
+    elif args.stream_url and args.watch:
+        on_change = None if args.json else lambda e: print(f"[{e['wall_s']:>9.1f}s] {e['title']}")
+        summary = watch_stream(args.stream_url, parse_duration(args.watch), on_change,
+                               connect_timeout=args.connect_timeout, read_timeout=args.read_timeout)
+        if args.json:
+            print(json.dumps(summary))
+        else:
+            print_watch_summary(summary)
+    elif args.stream_url:
+        get_icecast_info(args.stream_url)
+    else:
+        parser.error("a stream_url or --batch FILE is required")
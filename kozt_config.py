@@ -0,0 +1,175 @@
+"""
+Hot-reloadable JSON configuration for devices and stations.
+
+    {
+      "stations": {
+        "kozt": {"url": "http://live.amperwave.net/playlist/caradio-koztfmaac-ibc3.m3u",
+                 "amperwave": "10/4756", "title": "KOZT - The Coast", "image": "https://..."}
+      },
+      "devices": {
+        "Kitchen Hub": {"station": "kozt"},
+        "Den TV": {"station": "kozt", "app_id": "6509B35C", "no_stream": true}
+      },
+      "polling": {"kozt_interval": [10, 25]},
+      "hedge_budget": 0.1,
+      "art_cache_mb": 200
+    }
+
+`ConfigWatcher` watches the file's directory with inotify (ctypes, Linux).
+Editors usually save by writing a temp file and renaming it over the
+original, so watching the directory catches that. On other platforms it
+falls back to polling the mtime. A file that fails to parse is logged and
+ignored, and the previous config stays in force.
+
+Two kinds of settings:
+- Session settings (a device's station URL, app ID, title, image, no_stream,
+  and an optional host[:port] that skips discovery) define a cast session.
+  kozt_multi.py restarts only the sessions whose settings changed.
+- Tunables (polling, hedge_budget, art_cache_mb) are applied in place by
+  every running sender (`play_kozt.py --config`).
+"""
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import struct
+import threading
+
+SESSION_KEYS = ("url", "amperwave", "title", "image", "app_id", "no_stream", "host")
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_EVENT_HEADER = struct.Struct("iIII")
+
+
+def load_config(path):
+    """Reads and minimally validates a config file. Raises ValueError on bad content."""
+    with open(path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("config must be a JSON object")
+    stations = config.setdefault("stations", {})
+    devices = config.setdefault("devices", {})
+    for name, device in devices.items():
+        station = device.get("station")
+        if station and station not in stations:
+            raise ValueError(f"device '{name}' uses unknown station '{station}'")
+    return config
+
+
+def session_settings(config, device_name):
+    """The settings that define one device's cast session (station settings merged with device overrides)."""
+    device = config.get("devices", {}).get(device_name)
+    if device is None:
+        return None
+    merged = dict(config.get("stations", {}).get(device.get("station"), {}))
+    merged.update({k: v for k, v in device.items() if k != "station"})
+    return {k: merged[k] for k in SESSION_KEYS if k in merged}
+
+
+def diff_devices(old, new):
+    """Returns (added, removed, changed) device names between two configs."""
+    old_names = set((old or {}).get("devices", {}))
+    new_names = set(new.get("devices", {}))
+    changed = {name for name in old_names & new_names if session_settings(old, name) != session_settings(new, name)}
+    return new_names - old_names, old_names - new_names, changed
+
+
+class ConfigWatcher:
+    """Calls `on_change(config)` after every successful reload of `path`."""
+    def __init__(self, path, on_change, poll_interval=2.0):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.config = load_config(self.path)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="config-watch", daemon=True)
+        self.thread.start()
+        return self.config
+
+    def stop(self):
+        self.stop_event.set()
+
+    def reload(self):
+        try:
+            config = load_config(self.path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Config: ignoring bad {self.path}: {e}")
+            return
+        if config == self.config:
+            return
+        self.config = config
+        logging.info(f"Config: reloaded {self.path}")
+        try:
+            self.on_change(config)
+        except Exception as e:
+            logging.warning(f"Config: applying change failed: {e}")
+
+    def _run(self):
+        fd = self._inotify()
+        if fd is None:
+            logging.debug("Config: inotify unavailable, polling mtime")
+            self._poll()
+            return
+        try:
+            self._watch(fd)
+        finally:
+            os.close(fd)
+
+    def _inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+            if fd < 0:
+                return None
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+            if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def _watch(self, fd):
+        name = os.path.basename(self.path).encode()
+        while not self.stop_event.is_set():
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if not ready:
+                continue
+            touched = False
+            # Editors emit bursts (create/modify/close/rename): drain them, then reload once
+            while True:
+                try:
+                    data = os.read(fd, 4096)
+                except BlockingIOError:
+                    break
+                offset = 0
+                while offset < len(data):
+                    _, _, _, length = IN_EVENT_HEADER.unpack_from(data, offset)
+                    offset += IN_EVENT_HEADER.size
+                    if data[offset:offset + length].rstrip(b"\0") == name:
+                        touched = True
+                    offset += length
+                if self.stop_event.wait(0.2):
+                    return
+            if touched:
+                self.reload()
+
+    def _poll(self):
+        last = None
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue
+            if last is not None and mtime != last:
+                self.reload()
+            last = mtime
@@ -12,7 +12,9 @@ import struct
 import signal
 import atexit
 import os
-from urllib.parse import quote
+import profiler
+from shutdown import Shutdown, DEFAULT_DEADLINE as DEFAULT_SHUTDOWN_DEADLINE
+from now_playing import AmperwaveProvider, DEFAULT_AMPERWAVE_STATION, fetch_album_art
 
 # Default Stream (KOZT) 
 DEFAULT_STREAM_URL = "http://live.amperwave.net/playlist/caradio-koztfmaac-ibc3.m3u"
@@ -23,6 +25,9 @@ DEFAULT_TITLE = "KOZT - The Coast"
 # Silent Audio for "No-Stream" Mode
 SILENT_STREAM_URL = "https://github.com/anars/blank-audio/blob/master/10-minutes-of-silence.mp3?raw=true"
 
+# Amperwave now-playing source for KOZT
+KOZT_PROVIDER = AmperwaveProvider()
+
 # Global state for signal handling
 current_cast = None
 current_browser = None
@@ -30,6 +35,9 @@ current_mc = None
 current_zconf = None
 cleanup_in_progress = False
 
+# Overall teardown budget on SIGINT/SIGTERM (--shutdown-timeout); keep below systemd's TimeoutStopSec
+shutdown_deadline = DEFAULT_SHUTDOWN_DEADLINE
+
 def safe_write(msg):
     """Signal-safe write to stdout."""
     try:
@@ -37,6 +45,18 @@ def safe_write(msg):
     except:
         pass
 
+def build_shutdown_plan(log=safe_write):
+    """Teardown for the current session: cast and discovery chains run in parallel (see shutdown.py)."""
+    plan = Shutdown(shutdown_deadline, log=log)
+    plan.chain("cast",
+               ("stop media", lambda t: current_mc.stop(timeout=t)) if current_mc else None,
+               ("quit app", lambda t: current_cast.quit_app(timeout=t)) if current_cast else None,
+               ("disconnect", lambda t: current_cast.disconnect(timeout=t)) if current_cast else None)
+    plan.chain("discovery",
+               ("stop discovery", lambda t: current_browser.stop_discovery()) if current_browser else None,
+               ("close zeroconf", lambda t: current_zconf.close()) if current_zconf else None)
+    return plan
+
 def graceful_exit(signum, frame):
     """Handle kill signals (SIGINT/SIGTERM) robustly."""
     global cleanup_in_progress
@@ -50,31 +70,7 @@ def graceful_exit(signum, frame):
     safe_write("\nSignal received. Stopping playback...")
 
     try:
-        # Stop media playback first
-        if current_mc:
-            safe_write("Stopping media controller...")
-            current_mc.stop()
-            time.sleep(0.5)
-
-        # Quit the app
-        if current_cast:
-            safe_write("Quitting Cast app...")
-            try:
-                current_cast.quit_app()
-                time.sleep(1)  # Wait for quit command to be sent
-            except Exception as e:
-                safe_write(f"Error quitting app: {e}")
-
-        # Stop discovery
-        if current_browser:
-            safe_write("Stopping discovery...")
-            current_browser.stop_discovery()
-
-        # Close zeroconf
-        if current_zconf:
-            safe_write("Closing zeroconf...")
-            current_zconf.close()
-
+        build_shutdown_plan().run()
     except Exception as e:
         safe_write(f"Error during cleanup: {e}")
 
@@ -91,14 +87,7 @@ def cleanup_atexit():
     cleanup_in_progress = True
 
     try:
-        if current_mc:
-            current_mc.stop()
-        if current_cast:
-            current_cast.quit_app()
-        if current_browser:
-            current_browser.stop_discovery()
-        if current_zconf:
-            current_zconf.close()
+        build_shutdown_plan(log=logging.debug).run()
     except:
         pass
 
@@ -166,53 +155,14 @@ def resolve_playlist(url):
     
     return url
 
-def fetch_album_art(artist, title):
-    """
-    Fetches album art URL using the iTunes Search API.
-    """
-    if not artist or not title:
-        return None
-        
-    search_term = f"{artist} {title}"
-    url = f"https://itunes.apple.com/search?term={quote(search_term)}&media=music&limit=1"
-    
-    try:
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data['resultCount'] > 0:
-                artwork_url = data['results'][0].get('artworkUrl100')
-                if artwork_url:
-                    return artwork_url.replace('100x100bb', '600x600bb')
-    except Exception as e:
-        print(f"Error fetching album art: {e}")
-    
-    return None
-
 def scrape_kozt_now_playing():
     """
     Fetches KOZT now playing data from the Amperwave JSON API.
     """
     try:
-        url = "https://api-nowplaying.amperwave.net/api/v1/prtplus/nowplaying/10/4756/nowplaying.json"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if "performances" in data and isinstance(data["performances"], list) and len(data["performances"]) > 0:
-            current_track = data["performances"][0]
-            
-            song_title = current_track.get("title", "Unknown Song").strip()
-            artist_name = current_track.get("artist", "Unknown Artist").strip()
-            album_name = current_track.get("album", "").strip()
-            
-            image_url = current_track.get("largeimage") or \
-                        current_track.get("mediumimage") or \
-                        current_track.get("smallimage")
-            
-            return song_title, artist_name, image_url, album_name
-            
+        track = KOZT_PROVIDER.fetch()
+        if track:
+            return track.title, track.artist, track.image_url, track.album
         return None, None, None, None
 
     except Exception as e:
@@ -332,8 +282,17 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play KOZT Radio on Default Chromecast Receiver.")
     parser.add_argument("device_name", help="The friendly name of the Chromecast")
     parser.add_argument("-ns", "--no-stream", action="store_true", help="Display song information on your screen without playing any sound.")
+    parser.add_argument("--station", default=DEFAULT_AMPERWAVE_STATION, help="Amperwave station path for metadata (e.g. 10/4756)")
+    parser.add_argument("--profile-dir", default=profiler.DEFAULT_DIRECTORY, help="Where SIGUSR1 profiling sessions write their reports")
+    parser.add_argument("--shutdown-timeout", type=float, default=DEFAULT_SHUTDOWN_DEADLINE, help="Overall deadline (s) for teardown on exit")
     
     args = parser.parse_args()
+
+    KOZT_PROVIDER = AmperwaveProvider(args.station)
+    shutdown_deadline = args.shutdown_timeout
+
+    # kill -USR1 <pid> starts/stops a sampling profile (no cost while off)
+    profiler.install(directory=args.profile_dir)
     
     # Determine stream URL
     if args.no_stream:
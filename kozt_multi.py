@@ -0,0 +1,162 @@
+"""
+Runs one play_kozt.py session per device from a hot-reloaded config file.
+
+Each device in the config's "devices" gets its own play_kozt.py child
+process (`play_kozt.py DEVICE --config FILE`). When the file changes:
+
+- new devices are started,
+- removed devices are stopped (SIGTERM, so they run the bounded shutdown),
+- devices whose session settings changed (station URL, app ID, title,
+  image, no_stream) are restarted,
+- every other session keeps running. Tunables such as polling intervals
+  and the hedge budget are picked up live by the children themselves.
+
+Children that exit on their own are restarted, with a back-off.
+
+With --art-proxy every child runs its own proxy, so each one gets its own
+port: --art-port is the first, and the others count up from it.
+
+Usage:
+    python3 kozt_multi.py devices.json --debug
+"""
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from art_proxy import DEFAULT_PORT as DEFAULT_ART_PORT
+from kozt_config import ConfigWatcher, diff_devices
+
+PLAY_KOZT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "play_kozt.py")
+STOP_TIMEOUT = 10
+MAX_BACKOFF = 300
+
+
+class Session:
+    """One play_kozt.py child process."""
+    def __init__(self, device, config_path, extra_args, art_port=None):
+        self.device = device
+        self.art_port = art_port
+        self.command = [sys.executable, PLAY_KOZT, device, "--config", config_path] + extra_args
+        if art_port is not None:
+            self.command += ["--art-port", str(art_port)]
+        self.process = None
+        self.failures = 0
+        self.next_start = 0
+
+    def start(self):
+        logging.info(f"Multi: starting '{self.device}'")
+        self.process = subprocess.Popen(self.command)
+        self.started_at = time.monotonic()
+
+    def stop(self):
+        if not self.process or self.process.poll() is not None:
+            return
+        logging.info(f"Multi: stopping '{self.device}'")
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            logging.warning(f"Multi: '{self.device}' did not stop in {STOP_TIMEOUT}s, killing")
+            self.process.kill()
+            self.process.wait()
+
+    def check(self):
+        """Restarts the child if it exited, backing off while it keeps failing."""
+        if self.process and self.process.poll() is None:
+            if time.monotonic() - self.started_at > 60:
+                self.failures = 0
+            return
+        now = time.monotonic()
+        if self.process is not None and not self.next_start:
+            self.failures += 1
+            delay = min(MAX_BACKOFF, 5 * 2 ** (self.failures - 1))
+            logging.warning(f"Multi: '{self.device}' exited ({self.process.returncode}); restarting in {delay}s")
+            self.next_start = now + delay
+        if now >= self.next_start:
+            self.next_start = 0
+            self.start()
+
+
+class Supervisor:
+    def __init__(self, config_path, extra_args, art_port=None):
+        self.config_path = os.path.abspath(config_path)
+        self.extra_args = extra_args
+        self.art_port = art_port
+        self.sessions = {}
+        self.config = None
+        self.lock = threading.Lock()
+        self.watcher = ConfigWatcher(self.config_path, self.apply)
+
+    def next_art_port(self):
+        """Lowest art proxy port not held by a running session, or None without --art-proxy."""
+        if self.art_port is None:
+            return None
+        taken = {s.art_port for s in self.sessions.values()}
+        port = self.art_port
+        while port in taken:
+            port += 1
+        return port
+
+    def apply(self, config):
+        with self.lock:
+            added, removed, changed = diff_devices(self.config, config)
+            self.config = config
+            if added or removed or changed:
+                logging.info(f"Multi: added {sorted(added)}, removed {sorted(removed)}, restarting {sorted(changed)}")
+            # Stop/restart affected sessions in parallel so one slow device does not delay the rest
+            stopping = [self.sessions.pop(name) for name in removed | changed]
+            threads = [threading.Thread(target=s.stop) for s in stopping]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            for name in sorted(added | changed):
+                self.sessions[name] = Session(name, self.config_path, self.extra_args, self.next_art_port())
+                self.sessions[name].start()
+
+    def run(self):
+        self.apply(self.watcher.start())
+        try:
+            while True:
+                time.sleep(2)
+                with self.lock:
+                    for session in self.sessions.values():
+                        session.check()
+        finally:
+            self.watcher.stop()
+            threads = [threading.Thread(target=s.stop) for s in self.sessions.values()]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one play_kozt.py session per configured device, hot-reloading the config.")
+    parser.add_argument("config", help="JSON config file (see kozt_config.py)")
+    parser.add_argument("--debug", action="store_true", help="Enable info-level logging (also passed to the sessions)")
+    parser.add_argument("--verbose", action="store_true", help="Enable debug logging (also passed to the sessions)")
+    parser.add_argument("--art-port", type=int, default=DEFAULT_ART_PORT, help="First art proxy port; each session gets the next free one")
+    args, extra = parser.parse_known_args()
+
+    if args.verbose:
+        log_level = logging.DEBUG
+        extra.append("--verbose")
+    elif args.debug:
+        log_level = logging.INFO
+        extra.append("--debug")
+    else:
+        log_level = logging.WARNING
+    logging.basicConfig(level=log_level, format='%(message)s')
+
+    # SIGTERM from systemd: stop children through the finally block
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        Supervisor(args.config, extra, args.art_port if "--art-proxy" in extra else None).run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,156 @@
+"""
+Memory watchdog for week-long sender sessions.
+
+Samples RSS and the thread count every `interval` seconds. Each time RSS
+grows by `growth_mb` since the last snapshot, it takes a tracemalloc
+snapshot, diffs it against the previous one, and logs the top growth
+sites together with which kinds of thread are multiplying (e.g. leftover
+metadata_monitor threads after play_radio() retries).
+
+If `budget_mb` or `max_threads` is exceeded and `restart` is set, the
+process runs `on_restart` (normally the shutdown plan) and re-executes
+itself with the same arguments. That is a clean restart, with no
+supervisor needed.
+
+tracemalloc slows allocations down, so it only runs while the watchdog is
+enabled (--memwatch).
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+
+DEFAULT_INTERVAL = 300
+DEFAULT_GROWTH_MB = 20
+TRACE_FRAMES = 5
+TOP_N = 10
+
+
+def rss_bytes():
+    """Current resident set size (Linux /proc; falls back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def thread_kinds():
+    """Live threads grouped by name with numbers stripped ('Thread-12 (metadata_monitor)' -> 'Thread-N (metadata_monitor)')."""
+    return Counter(re.sub(r"\d+", "N", t.name) for t in threading.enumerate())
+
+
+def restart_process():
+    """Replaces this process with a fresh copy of itself (same interpreter/executable and arguments)."""
+    if getattr(sys, "frozen", False):
+        # PyInstaller build: the executable is the program
+        args = [sys.executable] + sys.argv[1:]
+    else:
+        args = [sys.executable] + sys.argv
+    logging.warning(f"Memory watchdog: restarting: {' '.join(args)}")
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execv(sys.executable, args)
+
+
+class MemoryWatchdog:
+    """RSS/thread sampler with tracemalloc growth reports and an optional restart budget."""
+    def __init__(self, interval=DEFAULT_INTERVAL, growth_mb=DEFAULT_GROWTH_MB, budget_mb=None, max_threads=None,
+                 restart=False, on_restart=None):
+        self.interval = interval
+        self.growth = growth_mb * 1024 * 1024
+        self.budget = budget_mb * 1024 * 1024 if budget_mb else None
+        self.max_threads = max_threads
+        self.restart = restart
+        self.on_restart = on_restart
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.start_rss = None
+        self.snapshot_rss = None
+        self.snapshot = None
+        self.snapshot_threads = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        self.start_rss = self.snapshot_rss = rss_bytes()
+        self.snapshot = self._take_snapshot()
+        self.snapshot_threads = thread_kinds()
+        self.thread = threading.Thread(target=self._run, name="memwatch", daemon=True)
+        self.thread.start()
+        limits = []
+        if self.budget:
+            limits.append(f"budget {self.budget / 2**20:.0f} MB")
+        if self.max_threads:
+            limits.append(f"max {self.max_threads} threads")
+        logging.info(f"Memory watchdog: RSS {self.start_rss / 2**20:.1f} MB, {threading.active_count()} threads"
+                     f"{' (' + ', '.join(limits) + (', restart' if self.restart else '') + ')' if limits else ''}")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _take_snapshot(self):
+        # Our own bookkeeping would otherwise show up as a growth site
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logging.debug(f"Memory watchdog: check failed: {e}")
+
+    def check(self):
+        rss = rss_bytes()
+        threads = threading.active_count()
+        traced, _ = tracemalloc.get_traced_memory()
+        logging.info(f"Memory watchdog: RSS {rss / 2**20:.1f} MB ({(rss - self.start_rss) / 2**20:+.1f} since start), "
+                     f"{threads} threads, {traced / 2**20:.1f} MB traced")
+
+        if rss - self.snapshot_rss >= self.growth:
+            self.report_growth(rss)
+
+        over_budget = self.budget and rss > self.budget
+        too_many_threads = self.max_threads and threads > self.max_threads
+        if over_budget or too_many_threads:
+            reason = f"RSS {rss / 2**20:.0f} MB > {self.budget / 2**20:.0f} MB" if over_budget else f"{threads} threads > {self.max_threads}"
+            logging.warning(f"Memory watchdog: over budget ({reason})")
+            if self.restart:
+                self.report_growth(rss)
+                if self.on_restart:
+                    try:
+                        self.on_restart()
+                    except Exception as e:
+                        logging.warning(f"Memory watchdog: cleanup before restart failed: {e}")
+                restart_process()
+
+    def report_growth(self, rss):
+        """Logs the top allocation growth sites and thread kinds since the previous snapshot."""
+        snapshot = self._take_snapshot()
+        logging.warning(f"Memory watchdog: RSS grew {(rss - self.snapshot_rss) / 2**20:.1f} MB since last snapshot; top growth sites:")
+        for stat in snapshot.compare_to(self.snapshot, "traceback")[:TOP_N]:
+            if stat.size_diff <= 0:
+                break
+            frame = stat.traceback[-1]
+            origin = stat.traceback[0] if len(stat.traceback) > 1 else None  # oldest captured frame: usually our code
+            logging.warning(f"  {stat.size_diff / 1024:+9.1f} KiB {stat.count_diff:+7d} blocks  {frame.filename}:{frame.lineno}"
+                            f"{f'  <- {origin.filename}:{origin.lineno}' if origin else ''}")
+
+        kinds = thread_kinds()
+        grown = {name: count - self.snapshot_threads.get(name, 0) for name, count in kinds.items()
+                 if count > self.snapshot_threads.get(name, 0)}
+        if grown:
+            logging.warning(f"Memory watchdog: new threads since last snapshot: {grown}")
+
+        self.snapshot = snapshot
+        self.snapshot_rss = rss
+        self.snapshot_threads = kinds
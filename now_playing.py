@@ -0,0 +1,392 @@
+"""
+Pluggable now-playing providers.
+
+Every metadata source returns the same `Track` record instead of its own tuple
+shape. `ProviderRace` runs several providers at once (Amperwave JSON, Icecast
+status-json, ICY interleaved metadata) and takes the first confident change.
+It records which provider won each change and by how many seconds. A source
+that is down simply never wins, so the others take over.
+"""
+import logging
+import random
+import re
+import struct
+import threading
+import time
+from dataclasses import dataclass, replace
+from urllib.parse import quote
+
+import requests
+
+from icecast_metadata_reader import ICECAST_HEADERS as ICY_HEADERS, fetch_icecast_status
+from rate_limit import guard_for
+
+AMPERWAVE_NOWPLAYING_URL = "https://api-nowplaying.amperwave.net/api/v1/prtplus/nowplaying/{station}/nowplaying.json"
+DEFAULT_AMPERWAVE_STATION = "10/4756"  # KOZT
+
+# Shared by every sender in the process: one rate limit and circuit breaker for iTunes (see rate_limit.py)
+ITUNES_GUARD = guard_for("itunes.apple.com", rate=0.5, burst=3)
+
+
+def fetch_album_art(artist, title, session=None):
+    """
+    Album art URL (600x600) from the iTunes Search API, rate limited by ITUNES_GUARD.
+    `session` replaces `requests` (e.g. play_kozt's --record/--replay feed).
+    Returns None if not found, on error, or while iTunes is throttling us.
+    """
+    if not artist or not title:
+        return None
+    if not ITUNES_GUARD.allow():
+        logging.debug(f"Album art lookup skipped (iTunes {ITUNES_GUARD.state}, {ITUNES_GUARD.stats})")
+        return None
+
+    url = f"https://itunes.apple.com/search?term={quote(f'{artist} {title}')}&media=music&limit=1"
+    try:
+        response = (session or requests).get(url, timeout=5)
+        results = response.json()['results'] if response.status_code == 200 else []
+    except Exception as e:
+        ITUNES_GUARD.record(error=e)
+        logging.warning(f"Error fetching album art: {e}")
+        return None
+    # One outcome per request: only after the body parsed
+    ITUNES_GUARD.record(response)
+
+    if results:
+        # artworkUrl100 is 100x100; the URL pattern serves larger sizes too
+        artwork_url = results[0].get('artworkUrl100')
+        if artwork_url:
+            return artwork_url.replace('100x100bb', '600x600bb')
+    return None
+
+
+@dataclass(frozen=True)
+class Track:
+    """One now-playing observation, whatever the source."""
+    title: str
+    artist: str = ""
+    album: str = ""
+    time: str = ""
+    image_url: str = None
+    source: str = ""
+    confidence: float = 1.0
+    observed_at: float = 0.0
+
+    @property
+    def key(self):
+        """Normalized identity used to compare tracks across providers."""
+        return (normalize(self.artist), normalize(self.title))
+
+    def as_tuple(self):
+        """Legacy (title, artist, image_url, album, time) shape used by play_kozt.py."""
+        return self.title, self.artist, self.image_url, self.album, self.time
+
+
+def normalize(text):
+    """Lowercase, drop '(feat. ...)'-style suffixes and punctuation."""
+    text = re.sub(r"[\(\[].*?[\)\]]", "", (text or "").lower())
+    return re.sub(r"[^0-9a-z]+", "", text)
+
+
+def split_stream_title(raw_title):
+    """Splits an ICY/Icecast 'Artist - Title' string. Returns (artist, title)."""
+    if " - " in raw_title:
+        artist, title = raw_title.split(" - ", 1)
+        return artist.strip(), title.strip()
+    return "", raw_title.strip()
+
+
+class NowPlayingProvider:
+    """
+    Base provider. Subclasses implement `fetch()` (one poll) and optionally
+    override `run()` when the source is push-based (ICY).
+    """
+    name = "base"
+    confidence = 1.0
+    interval = (10, 25)
+
+    def fetch(self):
+        """Returns the current Track, or None if unavailable."""
+        raise NotImplementedError
+
+    def next_delay(self):
+        low, high = self.interval
+        return random.randint(low, high) if low != high else low
+
+    def run(self, emit, stop_event):
+        """Polls `fetch()` until `stop_event` is set, passing each Track to `emit`."""
+        while not stop_event.is_set():
+            try:
+                track = self.fetch()
+                if track:
+                    emit(track)
+            except Exception as e:
+                logging.debug(f"Provider {self.name}: fetch failed: {e}")
+            stop_event.wait(self.next_delay())
+
+    def _track(self, **fields):
+        return Track(source=self.name, confidence=self.confidence, observed_at=time.time(), **fields)
+
+
+class AmperwaveProvider(NowPlayingProvider):
+    """Amperwave now-playing JSON (the KOZT source)."""
+    name = "amperwave"
+    confidence = 1.0
+
+    def __init__(self, station=DEFAULT_AMPERWAVE_STATION, interval=(10, 25), session=None, hedger=None):
+        self.station = station
+        self.url = AMPERWAVE_NOWPLAYING_URL.format(station=station)
+        self.interval = interval
+        self.http = session or requests
+        self.hedger = hedger  # optional hedging.HedgedRequester for tail latency
+
+    def fetch(self):
+        get = lambda: self.http.get(self.url, timeout=5)
+        response = self.hedger.call(get) if self.hedger else get()
+        response.raise_for_status()
+        return self.parse(response.json())
+
+    def parse(self, data):
+        if "performances" in data and isinstance(data["performances"], list) and len(data["performances"]) > 0:
+            current_track = data["performances"][0]
+            return self._track(
+                title=current_track.get("title", "Unknown Song").strip(),
+                artist=current_track.get("artist", "Unknown Artist").strip(),
+                album=current_track.get("album", "").strip(),
+                time=current_track.get("time", "").strip(),
+                # Prefer large image, fall back to medium, then small
+                image_url=current_track.get("largeimage") or
+                          current_track.get("mediumimage") or
+                          current_track.get("smallimage"),
+            )
+        return None
+
+
+class IcecastStatusProvider(NowPlayingProvider):
+    """
+    Icecast /status-json.xsl. The title can lag or belong to another mount,
+    so on its own it is not trusted to flip the screen.
+    """
+    name = "icecast"
+    confidence = 0.6
+
+    def __init__(self, stream_url, interval=(10, 10), session=None):
+        self.stream_url = stream_url
+        self.interval = interval
+        self.http = session
+
+    def fetch(self):
+        active = fetch_icecast_status(self.stream_url, self.http)
+        if not active or not active.get('title'):
+            return None
+        artist, title = split_stream_title(active['title'])
+        return self._track(title=title, artist=artist)
+
+
+class IcyProvider(NowPlayingProvider):
+    """
+    ICY interleaved metadata read from the stream itself. Push-based: a change
+    is seen as soon as the server writes the next metadata block.
+    """
+    name = "icy"
+    confidence = 0.9
+
+    def __init__(self, stream_url, reconnect_delay=5):
+        self.stream_url = stream_url
+        self.reconnect_delay = reconnect_delay
+
+    def fetch(self):
+        """One-shot: connects and returns the first StreamTitle seen."""
+        stop_event = threading.Event()
+        found = []
+
+        def first(track):
+            found.append(track)
+            stop_event.set()
+
+        self._read(first, stop_event, max_blocks=4)
+        return found[0] if found else None
+
+    def run(self, emit, stop_event):
+        while not stop_event.is_set():
+            try:
+                if not self._read(emit, stop_event):
+                    return  # No icy-metaint: nothing this provider can do
+            except Exception as e:
+                if not stop_event.is_set():
+                    logging.debug(f"Provider {self.name}: connection lost: {e}")
+                    stop_event.wait(self.reconnect_delay)
+
+    def _read(self, emit, stop_event, max_blocks=None):
+        """Reads metadata blocks until stopped. Returns False if the stream has no ICY metadata."""
+        with requests.get(self.stream_url, headers=ICY_HEADERS, stream=True, timeout=10) as r:
+            metaint = int(r.headers.get('icy-metaint', -1))
+            if metaint == -1:
+                logging.debug(f"Provider {self.name}: No Icy-MetaInt header; stream has no interleaved metadata.")
+                return False
+
+            blocks = 0
+            last_raw = None
+            while not stop_event.is_set():
+                bytes_to_read = metaint
+                while bytes_to_read > 0:
+                    if stop_event.is_set():
+                        return True
+                    chunk = r.raw.read(min(bytes_to_read, 8192))
+                    if not chunk:
+                        raise Exception("Stream ended")
+                    bytes_to_read -= len(chunk)
+
+                len_byte = r.raw.read(1)
+                if not len_byte:
+                    raise Exception("Stream ended")
+                length = struct.unpack('B', len_byte)[0] * 16
+
+                if length > 0:
+                    meta_str = r.raw.read(length).decode('utf-8', errors='ignore')
+                    if "StreamTitle=" in meta_str:
+                        raw_title = meta_str.split("StreamTitle=")[1].split(';')[0].strip("'")
+                        if raw_title and raw_title != last_raw:
+                            last_raw = raw_title
+                            artist, title = split_stream_title(raw_title)
+                            emit(self._track(title=title, artist=artist))
+
+                blocks += 1
+                if max_blocks and blocks >= max_blocks:
+                    return True
+        return True
+
+
+class ProviderRace:
+    """
+    Runs providers concurrently and reports the first confident change.
+
+    A change is accepted when a provider with confidence >= `min_confidence`
+    reports it, or when two providers agree on it. Later reports of the same
+    track are used to measure how far the winner was ahead.
+    """
+    def __init__(self, providers, on_change, min_confidence=0.75):
+        self.providers = providers
+        self.on_change = on_change
+        self.min_confidence = min_confidence
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.threads = []
+
+        self.current = None          # accepted Track
+        self.changed_at = None       # observed_at of the winning report
+        self.confirmed = set()       # providers that have reported the current track
+        self.recent_keys = []        # guards against flip-flopping between spellings
+        self.candidates = {}         # key -> set of provider names (low-confidence reports)
+
+        self.wins = {p.name: 0 for p in providers}
+        self.leads = {p.name: [] for p in providers}   # winner's lead over each later reporter
+        self.last_seen = {p.name: None for p in providers}
+
+    def seed(self, track):
+        """Marks `track` as already on screen (e.g. the pre-fetched initial metadata)."""
+        with self.lock:
+            self._accept(track, count_win=False)
+
+    def start(self):
+        for provider in self.providers:
+            thread = threading.Thread(target=provider.run, args=(self._observe, self.stop_event),
+                                      name=f"provider-{provider.name}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=2):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def _accept(self, track, count_win=True):
+        self.current = track
+        self.changed_at = track.observed_at
+        self.confirmed = {track.source}
+        self.candidates = {}
+        self.recent_keys = ([track.key] + [k for k in self.recent_keys if k != track.key])[:3]
+        if count_win:
+            self.wins[track.source] = self.wins.get(track.source, 0) + 1
+
+    def _observe(self, track):
+        notify = None
+        with self.lock:
+            self.last_seen[track.source] = track.observed_at
+
+            if self.current and track.key == self.current.key:
+                if track.source not in self.confirmed:
+                    self.confirmed.add(track.source)
+                    lead = track.observed_at - self.changed_at
+                    self.leads.setdefault(self.current.source, []).append(lead)
+                    logging.debug(f"Provider race: {track.source} confirmed '{track.title}' {lead:.1f}s after {self.current.source}")
+                    # Fill in art/album the winner did not have (e.g. ICY won, Amperwave has the image)
+                    if not self.current.image_url and track.image_url:
+                        self.current = replace(self.current, image_url=track.image_url,
+                                               album=self.current.album or track.album,
+                                               time=self.current.time or track.time)
+                        notify = self.current
+            elif track.key in self.recent_keys:
+                # A slower provider still reporting an older track (or a different spelling of it)
+                return
+            else:
+                voters = self.candidates.setdefault(track.key, set())
+                voters.add(track.source)
+                if track.confidence >= self.min_confidence or len(voters) >= 2:
+                    previous = self.current
+                    self._accept(track)
+                    logging.info(f"Provider race: {track.source} won -> {track.artist} - {track.title}"
+                                 f" (was: {previous.title if previous else 'None'})")
+                    notify = track
+
+        if notify:
+            try:
+                self.on_change(notify)
+            except Exception as e:
+                logging.debug(f"Provider race: on_change failed: {e}")
+
+    def stats(self):
+        """Wins per provider and the average/max lead the winner had over each later report."""
+        with self.lock:
+            leads = {}
+            for name, values in self.leads.items():
+                if values:
+                    leads[name] = {"count": len(values), "avg_s": round(sum(values) / len(values), 2), "max_s": round(max(values), 2)}
+            return {"wins": dict(self.wins), "leads": leads,
+                    "current": self.current.source if self.current else None}
+
+
+PROVIDER_NAMES = ("amperwave", "icecast", "icy", "hls")
+
+
+def parse_provider_names(value):
+    """Splits a comma-separated provider list like 'amperwave,icy'; raises ValueError on an unknown name."""
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in PROVIDER_NAMES]
+    if unknown:
+        raise ValueError(f"unknown metadata provider(s) {', '.join(unknown)} (choose from {', '.join(PROVIDER_NAMES)})")
+    if not names:
+        raise ValueError(f"no metadata providers given (choose from {', '.join(PROVIDER_NAMES)})")
+    return names
+
+
+def build_providers(names, stream_url, amperwave_station=DEFAULT_AMPERWAVE_STATION, amperwave=None):
+    """
+    Builds providers from a list like ['amperwave', 'icecast', 'icy', 'hls'] (see parse_provider_names()).
+    `amperwave` is an AmperwaveProvider to use as is (keeps its hedger and session, e.g. for --record/--replay).
+    """
+    providers = []
+    for name in names:
+        name = name.strip().lower()
+        if name == "amperwave":
+            providers.append(amperwave or AmperwaveProvider(amperwave_station))
+        elif name == "icecast":
+            providers.append(IcecastStatusProvider(stream_url))
+        elif name == "icy":
+            providers.append(IcyProvider(stream_url))
+        elif name == "hls":
+            from hls_metadata import HlsProvider   # hls_metadata imports this module
+            providers.append(HlsProvider(stream_url))
+        elif name:
+            raise ValueError(f"Unknown metadata provider: {name}")
+    return providers
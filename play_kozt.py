@@ -6,19 +6,40 @@ import logging
 import requests
 import pychromecast
 from pychromecast.controllers import BaseController
-from pychromecast.discovery import CastBrowser, SimpleCastListener
-import zeroconf
 import threading
 import struct
 import json
 import signal
 import atexit
 import os
-from urllib.parse import quote
+import functools
+import queue
+import profiler
+import memwatch
+from shutdown import Shutdown, DEFAULT_DEADLINE as DEFAULT_SHUTDOWN_DEADLINE
+from art_proxy import ArtProxy, screen_class_for, DEFAULT_PORT as DEFAULT_ART_PORT, DEFAULT_CACHE_DIR as DEFAULT_ART_CACHE
+from now_playing import AmperwaveProvider, ProviderRace, Track, build_providers, parse_provider_names, split_stream_title, DEFAULT_AMPERWAVE_STATION
+from now_playing import fetch_album_art as lookup_album_art
+from icecast_metadata_reader import IcecastStatusPoller
+from hedging import HedgedRequester, DEFAULT_BUDGET as DEFAULT_HEDGE_BUDGET
+from kozt_config import ConfigWatcher, session_settings
+from timeline import Timeline
+from cast_events import LaunchWatcher, wait_until_ready, DEFAULT_DEADLINE as DEFAULT_LAUNCH_DEADLINE
+from control import ControlServer, ControlError, socket_path_for
+from collections import Counter
+from workers import WorkerSupervisor, WorkerLimitError
+from audio_sync import AlignedSender, PlaybackOffset, parse_bitrate
+from feed_replay import FeedRecorder, FeedReplay, IcyReplayServer, RecordingHTTP
+from cast_registry import CastRegistry
+from adts_analyzer import AdtsAnalyzer
+from hls_metadata import HlsProvider, is_hls
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 
 # Default Stream (KOZT) 
 DEFAULT_STREAM_URL = "http://live.amperwave.net/playlist/caradio-koztfmaac-ibc3.m3u"
 DEFAULT_STREAM_TYPE = "video/mp4" # Trick: Use video type to avoid persistent Audio UI
+HLS_STREAM_TYPE = "application/x-mpegURL" # The receiver only picks its HLS player by content type
 DEFAULT_IMAGE_URL = "https://radioparadise.com/graphics/logo_flat_shadow.png" # Keep generic or find a KOZT logo
 DEFAULT_TITLE = "KOZT - The Coast"
 DEFAULT_SUBTITLE = "Mendocino County Public Broadcasting"
@@ -30,13 +51,57 @@ SILENT_STREAM_TYPE = "audio/mp3"
 
 NAMESPACE = 'urn:x-cast:com.example.radio'
 
+# Amperwave now-playing source for KOZT (hedged: a second request fires if the first is slower than p95)
+KOZT_PROVIDER = AmperwaveProvider(hedger=HedgedRequester("amperwave"))
+
+# Time source for the monitor loops (simulate_sender.py swaps in a virtual clock)
+clock = time
+
+# Seconds between Amperwave polls (random in range); live-tunable via --config "polling.kozt_interval"
+KOZT_POLL_INTERVAL = (10, 25)
+
+# Titles waiting between the ICY reader and the art lookup/send worker (oldest dropped when full)
+TRACK_QUEUE_SIZE = 4
+
 # Global state for signal handling
 current_cast = None
-current_browser = None
 current_mc = None
-current_zconf = None
 cleanup_in_progress = False
 
+# Overall teardown budget on SIGINT/SIGTERM (--shutdown-timeout); keep below systemd's TimeoutStopSec
+shutdown_deadline = DEFAULT_SHUTDOWN_DEADLINE
+
+# Background discovery, started with the first session and kept for the life of the process
+registry = None
+DISCOVERY_TIMEOUT = 10
+
+# Connect to this host[:port] instead of discovering the device by name (--host)
+cast_host = None
+
+# How long to wait for the launched receiver to come up and answer a PING (--launch-timeout)
+launch_deadline = DEFAULT_LAUNCH_DEADLINE
+
+# LAN artwork proxy (--art-proxy), shared by every session
+art_proxy = None
+
+# Runtime control of the session (--control), shared by every session
+control = None
+
+# Hold track updates until the receiver plays them (--audio-sync, --sync-offset); the estimate for the current session
+audio_sync = False
+sync_offset = 0.0
+playback_offset = None
+
+# Upstream feed recording (--record) or replay (--replay); feed_http stands in for requests for Amperwave/iTunes
+feed_recorder = None
+feed_http = None
+icy_replay = None
+
+# Watch the stream's ADTS frames for dead air, underruns and bitrate drops (--analyze-stream)
+analyze_stream = False
+# read() waits for the full amount: small reads keep a near-silent (few kbps) stream from looking stalled
+ANALYZER_CHUNK = 1024
+
 def safe_write(msg):
     """Signal-safe write to stdout."""
     try:
@@ -44,6 +109,23 @@ def safe_write(msg):
     except:
         pass
 
+def build_shutdown_plan(log=safe_write):
+    """Teardown for the current session: cast and discovery chains run in parallel (see shutdown.py)."""
+    plan = Shutdown(shutdown_deadline, log=log)
+    plan.chain("cast",
+               ("stop media", lambda t: current_mc.stop(timeout=t)) if current_mc else None,
+               ("quit app", lambda t: current_cast.quit_app(timeout=t)) if current_cast else None,
+               ("disconnect", lambda t: current_cast.disconnect(timeout=t)) if current_cast else None)
+    if registry:
+        plan.chain("discovery", ("stop discovery", lambda t: registry.stop()))
+    if art_proxy:
+        plan.chain("art proxy", ("stop", lambda t: art_proxy.stop()))
+    if control and control.server:
+        plan.chain("control socket", ("close", lambda t: control.server.stop()))
+    if feed_recorder:
+        plan.chain("feed recorder", ("close", lambda t: feed_recorder.close()))
+    return plan
+
 def graceful_exit(signum, frame):
     """Handle kill signals (SIGINT/SIGTERM) robustly."""
     global cleanup_in_progress
@@ -57,31 +139,7 @@ def graceful_exit(signum, frame):
     safe_write("\nSignal received. Stopping playback...")
 
     try:
-        # Stop media playback first
-        if current_mc:
-            safe_write("Stopping media controller...")
-            current_mc.stop()
-            time.sleep(0.5)
-
-        # Quit the app
-        if current_cast:
-            safe_write("Quitting Cast app...")
-            try:
-                current_cast.quit_app()
-                time.sleep(1)  # Wait for quit command to be sent
-            except Exception as e:
-                safe_write(f"Error quitting app: {e}")
-
-        # Stop discovery
-        if current_browser:
-            safe_write("Stopping discovery...")
-            current_browser.stop_discovery()
-
-        # Close zeroconf
-        if current_zconf:
-            safe_write("Closing zeroconf...")
-            current_zconf.close()
-
+        build_shutdown_plan().run()
     except Exception as e:
         safe_write(f"Error during cleanup: {e}")
 
@@ -98,48 +156,10 @@ def cleanup_atexit():
     cleanup_in_progress = True
 
     try:
-        if current_mc:
-            current_mc.stop()
-        if current_cast:
-            current_cast.quit_app()
-        if current_browser:
-            current_browser.stop_discovery()
-        if current_zconf:
-            current_zconf.close()
+        build_shutdown_plan(log=logging.debug).run()
     except:
         pass
 
-def discover_all_chromecasts(timeout=5):
-    """
-    Discover all chromecasts on the network using CastBrowser directly,
-    avoiding the deprecated discover_chromecasts function.
-    """
-    global current_zconf
-
-    found_chromecasts = []
-
-    # Reuse existing zeroconf or create new one
-    if not current_zconf:
-        current_zconf = zeroconf.Zeroconf()
-
-    # SimpleCastListener expects a callback for add (and optionally remove/update)
-    # We just need to start discovery and let the browser populate browser.devices
-    listener = SimpleCastListener(lambda uuid, service: None)
-    browser = CastBrowser(listener, current_zconf)
-    browser.start_discovery()
-
-    print(f"Scanning for devices ({timeout}s)...")
-    time.sleep(timeout)
-
-    for uuid, service in browser.devices.items():
-        try:
-             cc = pychromecast.get_chromecast_from_cast_info(service, current_zconf)
-             found_chromecasts.append(cc)
-        except Exception as e:
-             logging.debug(f"Error creating Chromecast object for {uuid}: {e}")
-
-    return found_chromecasts, browser
-
 class RadioController(BaseController):
     """
     Controller to send custom messages to the receiver.
@@ -148,6 +168,15 @@ class RadioController(BaseController):
         super(RadioController, self).__init__(NAMESPACE)
         self.received_disconnect = False
         self.pong_received = threading.Event()
+        # Track/Icecast updates are held back while paused (control socket); the latest one is resent on resume
+        self.metadata_paused = False
+        self.last_update = None
+        self.counters = Counter()
+        # Set by play_radio when the art proxy is enabled
+        self.art_proxy = None
+        self.screen_class = None
+        self.device_host = None
+        self.receiver_secure = False   # the receiver page is HTTPS (PONG "secure", v5.31+): proxied art would be mixed content
 
     def receive_message(self, message, data):
         """
@@ -160,6 +189,10 @@ class RadioController(BaseController):
             standby = data.get('standbyState', 'unknown')
             version = data.get('version', 'unknown')
             logging.debug(f"PONG received. Version: {version}, Visibility: {visibility}, Standby: {standby}")
+            if data.get('secure') and self.art_proxy and not self.receiver_secure:
+                logging.info("Art Proxy: receiver page is HTTPS, sending original art URLs")
+            self.receiver_secure = bool(data.get('secure'))
+            self.counters["pongs"] += 1
             self.pong_received.set()
             return True
             
@@ -179,22 +212,63 @@ class RadioController(BaseController):
             "time": time,
             "stationName": station_name
         }
+        if self.art_proxy and image_url and not self.receiver_secure:
+            # Serve a copy sized for this device from the LAN, plus a tiny one for the blurred background
+            msg["originalImage"] = image_url
+            msg["image"] = self.art_proxy.url_for(image_url, self.screen_class, self.device_host)
+            msg["backgroundImage"] = self.art_proxy.url_for(image_url, self.screen_class, self.device_host, variant="bg")
+            image_url = msg["image"]
+        self.last_update = msg
+        if self.metadata_paused:
+            logging.debug(f"RadioController: Metadata paused, holding update -> {title} / {artist}")
+            return
         logging.debug(f"RadioController: Sending update -> {title} / {artist}")
         if image_url:
             logging.debug(f"  Image: {image_url}")
         self.send_message(msg)
+        self.counters["updates"] += 1
+
+    def resend_last_update(self):
+        """Sends the most recent track update again (e.g. after metadata was resumed)."""
+        if self.last_update and not self.metadata_paused:
+            self.send_message(self.last_update)
+            self.counters["updates"] += 1
+
+    def send_config(self, **options):
+        """Sends receiver settings, e.g. disableIcecastPolling=True."""
+        logging.debug(f"RadioController: Sending config -> {options}")
+        self.send_message({"type": "CONFIG", **options})
+
+    def send_icecast_status(self, source):
+        """Forwards an Icecast status-json source (polled by the sender) to the receiver."""
+        if self.metadata_paused:
+            return
+        artist, title = split_stream_title(source.get('title', ''))
+        self.send_message({
+            "type": "ICECAST_STATUS",
+            "title": title,
+            "artist": artist,
+            "listeners": source.get('listeners'),
+            "serverName": source.get('server_name')
+        })
+
+    def send_stream_status(self, status):
+        """Tells the receiver the stream's health changed (adts_analyzer.py): dead air, underrun, stalled, bitrate drop or ok."""
+        self.send_message({"type": "STREAM_STATUS", **status})
+        self.counters["stream_status"] += 1
 
-    def send_keepalive(self):
+    def send_keepalive(self, timeout=3.0):
         """
         Sends a PING and waits for a PONG.
         Returns True if PONG received within timeout, False otherwise.
         """
         try:
             self.pong_received.clear()
+            self.counters["pings"] += 1
             self.send_message({"type": "PING"})
             
-            # Wait for PONG (3 seconds timeout)
-            if self.pong_received.wait(timeout=3.0):
+            # Wait for PONG (3 seconds timeout by default)
+            if self.pong_received.wait(timeout=timeout):
                 return True
             else:
                 logging.debug("Keepalive: PING sent but no PONG received (Timeout).")
@@ -248,38 +322,82 @@ def resolve_playlist(url):
     
     return url
 
+# Playlist -> stream URL, so reconnects skip the playlist fetch
+resolved_playlists = {}
+
+def resolve_playlist_cached(url):
+    if url in resolved_playlists:
+        return resolved_playlists[url]
+    resolved = resolve_playlist(url)
+    if resolved != url:
+        resolved_playlists[url] = resolved
+    return resolved
+
 def fetch_album_art(artist, title):
+    """iTunes art lookup (now_playing.fetch_album_art), through the --record/--replay feed when one is set."""
+    return lookup_album_art(artist, title, feed_http)
+
+def queue_latest(tracks, item):
+    """Puts `item` on the bounded track queue; when it is full the oldest (stale) title is dropped. Returns True if one was."""
+    dropped = False
+    while True:
+        try:
+            tracks.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                tracks.get_nowait()
+                dropped = True
+            except queue.Empty:
+                pass
+
+def track_sender(worker, tracks, controller, aligned=None):
     """
-    Fetches album art URL using the iTunes Search API.
-    Returns None if not found or on error.
+    Looks up art for the titles metadata_monitor() (or the provider race) queues
+    and sends the track updates, so the stream reader never waits on iTunes or the receiver.
+    Titles that were superseded while a lookup ran are skipped. An item may carry a
+    fifth element of send_track_update() details (image_url, album, time, station_name);
+    art is only looked up when it has no image.
+    With `aligned` (audio_sync.AlignedSender) updates are held until the receiver plays the change.
     """
-    if not artist or not title:
-        return None
-        
-    search_term = f"{artist} {title}"
-    url = f"https://itunes.apple.com/search?term={quote(search_term)}&media=music&limit=1"
-    
-    try:
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data['resultCount'] > 0:
-                # Get the largest available image (artworkUrl100 is usually 100x100)
-                # We can try to hack the URL to get a higher res version (e.g. 600x600)
-                artwork_url = data['results'][0].get('artworkUrl100')
-                if artwork_url:
-                    # Replace '100x100bb' with '600x600bb' for higher quality
-                    return artwork_url.replace('100x100bb', '600x600bb')
-    except Exception as e:
-        print(f"Error fetching album art: {e}")
-    
-    return None
+    while not worker.stopping:
+        try:
+            item = tracks.get(timeout=1)
+        except queue.Empty:
+            continue
+        # Only the newest title matters
+        while True:
+            try:
+                item = tracks.get_nowait()
+                logging.debug("Metadata Monitor: Skipping a title superseded during the art lookup")
+            except queue.Empty:
+                break
+        raw_title, title, artist, position, *rest = item
+        details = dict(rest[0]) if rest else {}
+        image_url = details.pop("image_url", None)
+        if not image_url:
+            worker.set_state("looking up art")
+            image_url = fetch_album_art(artist, title)
+            worker.set_state("running")
+        send = functools.partial(controller.send_track_update, title, artist, image_url, **details)
+        if aligned:
+            aligned.submit(send, raw_title, position)
+        else:
+            try:
+                send()
+            except Exception as e:
+                logging.debug(f"Metadata Monitor: Send failed: {e}")
 
-def metadata_monitor(stream_url, controller, stop_event):
+def metadata_monitor(worker, stream_url, tracks, aligned=None, analyzer=None):
     """
-    Connects to the stream in a separate thread, reads interleaved metadata,
-    and pushes updates to the Chromecast receiver.
+    Connects to the stream in a separate thread and reads interleaved metadata.
+    New titles go on the bounded `tracks` queue for track_sender(), so this
+    thread does nothing but drain the socket. Runs as a supervised
+    worker (workers.py): stopped via worker.stop_event, bytes counted on the worker.
     """
+    stop_event = worker.stop_event
+    if is_hls(stream_url):
+        return hls_monitor(worker, stream_url, tracks, aligned)
     logging.debug(f"Metadata Monitor: Connecting to {stream_url}")
     headers = {
         'User-Agent': 'Mozilla/5.0 (compatible; IcecastMetadataReader/1.0)',
@@ -290,15 +408,27 @@ def metadata_monitor(stream_url, controller, stop_event):
     
     while not stop_event.is_set():
         try:
+            worker.set_state("connecting")
             with requests.get(stream_url, headers=headers, stream=True, timeout=10) as r:
+                # Closing the response aborts a read blocked on a stalled stream
+                worker.use(r)
                 # Check for Icy-MetaInt
                 metaint = int(r.headers.get('icy-metaint', -1))
                 
+                if metaint == -1 and is_hls(r.url, r.headers.get('Content-Type')):
+                    r.close()
+                    return hls_monitor(worker, stream_url, tracks, aligned)
                 if metaint == -1:
                     logging.debug("Metadata Monitor: No Icy-MetaInt header found. Stream does not support interleaved metadata.")
+                    worker.set_state("no metadata")
                     return
 
                 logging.debug(f"Metadata Monitor: Connected. Interval: {metaint} bytes.")
+                worker.set_state("streaming")
+                if aligned:
+                    aligned.offset.monitor_connected(parse_bitrate(r.headers.get('icy-br')))
+                if analyzer:
+                    analyzer.connected_now()
                 
                 while not stop_event.is_set():
                     # Read audio chunk (discard)
@@ -307,11 +437,16 @@ def metadata_monitor(stream_url, controller, stop_event):
                     while bytes_to_read > 0:
                         if stop_event.is_set(): return
                         # Read small chunks to avoid blocking forever
-                        chunk_size = min(bytes_to_read, 8192) 
+                        chunk_size = min(bytes_to_read, ANALYZER_CHUNK if analyzer else 8192)
                         chunk = r.raw.read(chunk_size) 
                         if not chunk:
                             raise Exception("Stream ended")
                         bytes_to_read -= len(chunk)
+                        worker.add_bytes(len(chunk))
+                        if aligned:
+                            aligned.offset.add_monitor_bytes(len(chunk))
+                        if analyzer:
+                            analyzer.feed(chunk)
                     
                     # Read metadata length
                     len_byte = r.raw.read(1)
@@ -319,10 +454,13 @@ def metadata_monitor(stream_url, controller, stop_event):
                         raise Exception("Stream ended")
                     
                     length = struct.unpack('B', len_byte)[0] * 16
+                    worker.add_bytes(1 + length)
                     
                     if length > 0:
                         meta_data = r.raw.read(length)
                         meta_str = meta_data.decode('utf-8', errors='ignore')
+                        if feed_recorder:
+                            feed_recorder.record("icy", stream_url, meta_str.rstrip("\0"))
                         
                         # Parse StreamTitle='...';
                         if "StreamTitle=" in meta_str:
@@ -332,6 +470,8 @@ def metadata_monitor(stream_url, controller, stop_event):
                                 if raw_title_part != current_raw_title:
                                     logging.debug(f"Metadata Monitor: New Track -> {raw_title_part}")
                                     current_raw_title = raw_title_part
+                                    # Where in the stream the title changed (before the art lookup takes its time)
+                                    position = aligned.offset.live_position() if aligned else None
                                     
                                     # Try to split Artist - Title
                                     artist = ""
@@ -341,13 +481,9 @@ def metadata_monitor(stream_url, controller, stop_event):
                                         artist = parts[0].strip()
                                         title = parts[1].strip()
                                     
-                                    # Fetch Album Art
-                                    image_url = fetch_album_art(artist, title)
-                                    
-                                    try:
-                                        controller.send_track_update(title, artist, image_url)
-                                    except Exception as e:
-                                        logging.debug(f"Metadata Monitor: Send failed: {e}")
+                                    # Art lookup and send happen in track_sender()
+                                    if queue_latest(tracks, (raw_title_part, title, artist, position)):
+                                        logging.debug("Metadata Monitor: Track queue full, dropped a stale title")
                                         
                             except IndexError:
                                 pass
@@ -357,7 +493,56 @@ def metadata_monitor(stream_url, controller, stop_event):
             if not stop_event.is_set():
                 logging.debug(f"Metadata Monitor Connection Lost: {e}")
                 logging.debug("Reconnecting in 5 seconds...")
-                time.sleep(5)
+                worker.set_state("reconnecting")
+                worker.wait(5)
+
+def stream_reader(worker, stream_url, analyzer):
+    """
+    Reads the stream's audio (no ICY metadata) only to feed the ADTS analyzer,
+    for the paths without a metadata monitor connection (Amperwave, provider race, --replay).
+    """
+    while not worker.stopping:
+        try:
+            worker.set_state("connecting")
+            with requests.get(stream_url, headers={'User-Agent': 'Mozilla/5.0 (compatible; IcecastMetadataReader/1.0)'}, stream=True, timeout=10) as r:
+                worker.use(r)
+                r.raise_for_status()
+                worker.set_state("streaming")
+                analyzer.connected_now()
+                while not worker.stopping:
+                    chunk = r.raw.read(ANALYZER_CHUNK)
+                    if not chunk:
+                        raise Exception("Stream ended")
+                    worker.add_bytes(len(chunk))
+                    analyzer.feed(chunk)
+                    if analyzer.adts is False:
+                        worker.set_state("not adts")
+                        return
+        except Exception as e:
+            if not worker.stopping:
+                logging.debug(f"Stream Reader: Connection lost: {e}. Reconnecting in 5 seconds...")
+                worker.set_state("reconnecting")
+                worker.wait(5)
+
+def hls_monitor(worker, playlist_url, tracks, aligned=None):
+    """
+    metadata_monitor() for HLS streams: follows the playlist and reads the ID3
+    timed metadata of new segments (hls_metadata.py). Titles go on the same
+    `tracks` queue, so track_sender() handles art and sends as for ICY.
+    """
+    logging.debug(f"Metadata Monitor: HLS stream, reading timed metadata from {playlist_url}")
+    worker.set_state("hls")
+    provider = HlsProvider(playlist_url, on_bytes=worker.add_bytes)
+
+    def on_track(track):
+        raw_title = f"{track.artist} - {track.title}" if track.artist else track.title
+        logging.debug(f"Metadata Monitor: New Track -> {raw_title}")
+        # The segment was at the live edge; its exact receiver position is not known
+        position = aligned.offset.live_position() if aligned else None
+        if queue_latest(tracks, (raw_title, track.title, track.artist, position)):
+            logging.debug("Metadata Monitor: Track queue full, dropped a stale title")
+
+    provider.run(on_track, worker.stop_event)
 
 def scrape_kozt_now_playing():
     """
@@ -365,94 +550,266 @@ def scrape_kozt_now_playing():
     Returns: title, artist, image_url, album, time
     """
     try:
-        # Discovered API endpoint
-        url = "https://api-nowplaying.amperwave.net/api/v1/prtplus/nowplaying/10/4756/nowplaying.json"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if "performances" in data and isinstance(data["performances"], list) and len(data["performances"]) > 0:
-            current_track = data["performances"][0]
-            
-            song_title = current_track.get("title", "Unknown Song").strip()
-            artist_name = current_track.get("artist", "Unknown Artist").strip()
-            album_name = current_track.get("album", "").strip()
-            track_time = current_track.get("time", "").strip()
-            
-            # Prefer large image, fall back to medium, then small
-            image_url = current_track.get("largeimage") or \
-                        current_track.get("mediumimage") or \
-                        current_track.get("smallimage")
-            
-            return song_title, artist_name, image_url, album_name, track_time
-            
+        track = KOZT_PROVIDER.fetch()
+        if track:
+            return track.as_tuple()
         return None, None, None, None, None
 
     except Exception as e:
         logging.debug(f"Error fetching KOZT now playing JSON: {e}")
         return None, None, None, None, None
 
-def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=None, is_kozt_station=False, no_stream=False):
-    global current_cast, current_browser, current_mc, current_zconf
+def fetch_initial_metadata():
+    """
+    Now-playing plus album art for the first update. Runs on a startup thread
+    while discovery and app launch proceed. Returns (title, artist, image_url, album, time).
+    """
+    kozt_title, kozt_artist, kozt_image, kozt_album, kozt_time = scrape_kozt_now_playing()
+    if kozt_title and kozt_artist and not kozt_image:
+        # If KOZT API has no image, try iTunes
+        kozt_image = fetch_album_art(kozt_artist, kozt_title)
+    return kozt_title, kozt_artist, kozt_image, kozt_album, kozt_time
+
+def queue_race_update(tracks, track, station_name, aligned=None):
+    """
+    Emit callback of the provider race: runs on the provider threads (the ICY one
+    reads a stream), so art lookup and the send are left to track_sender().
+    With `aligned`, the live edge at the win is the target position.
+    """
+    details = {"image_url": track.image_url, "album": track.album or None, "time": track.time or None, "station_name": station_name}
+    position = aligned.offset.live_position() if aligned else None
+    if queue_latest(tracks, (f"{track.artist} - {track.title}", track.title, track.artist, position, details)):
+        logging.debug("Provider race: Track queue full, dropped a stale title")
+
+def apply_tunables(config):
+    """Applies the live-tunable parts of a --config file to the running session (no restart)."""
+    global KOZT_POLL_INTERVAL
+    interval = config.get("polling", {}).get("kozt_interval")
+    if interval:
+        low, high = (interval, interval) if isinstance(interval, (int, float)) else interval
+        KOZT_POLL_INTERVAL = (int(low), int(high))
+        KOZT_PROVIDER.interval = KOZT_POLL_INTERVAL
+    if "hedge_budget" in config and KOZT_PROVIDER.hedger:
+        KOZT_PROVIDER.hedger.budget = float(config["hedge_budget"])
+    if "art_cache_mb" in config and art_proxy:
+        art_proxy.max_cache_bytes = int(config["art_cache_mb"] * 1024 * 1024)
+    logging.info(f"Config: poll interval {KOZT_POLL_INTERVAL}, hedge budget {KOZT_PROVIDER.hedger.budget if KOZT_PROVIDER.hedger else 'off'}")
+
+class SessionControl:
+    """
+    Runtime control of the running cast session (--control socket).
+
+    Station and stream switches reuse the connected device and the running
+    receiver app: one play_media() call, then the monitor loop restarts its
+    metadata source for the new station. No discovery, no start_app().
+    """
+    def __init__(self, device_name, stream_url, title, image_url, is_kozt, no_stream):
+        self.device_name = device_name
+        self.stream_url = stream_url
+        self.title = title
+        self.image_url = image_url
+        self.is_kozt = is_kozt
+        self.no_stream = no_stream
+        self.radio_controller = None   # set by play_radio() once connected
+        self.generation = 0            # bumped on every switch; the monitor loops compare it
+        self.switched = threading.Event()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.connected_at = None
+        self.switches = 0
+        self.server = None
+        self.workers = None            # WorkerSupervisor of the current station
+        self.aligned = None            # AlignedSender of the current station (--audio-sync)
+        self.analyzer = None           # AdtsAnalyzer of the current station (--analyze-stream)
+
+    def methods(self):
+        return {
+            "switch_station": self.switch_station,
+            "set_stream": self.set_stream,
+            "pause_metadata": self.pause_metadata,
+            "resume_metadata": self.resume_metadata,
+            "state": self.state,
+            "stats": self.stats,
+        }
+
+    def start(self, path):
+        self.server = ControlServer(path, self.methods())
+        self.server.start()
+        return self
+
+    def attach(self, radio_controller):
+        """Called by play_radio() for each new cast session."""
+        paused = self.radio_controller.metadata_paused if self.radio_controller else False
+        self.radio_controller = radio_controller
+        radio_controller.metadata_paused = paused
+        self.connected_at = time.time()
+
+    def _require_session(self):
+        if not (current_mc and self.radio_controller and current_cast and current_cast.socket_client.is_connected):
+            raise ControlError("no active cast session (still connecting?)")
+
+    def _play(self, stream_url):
+        """Swaps the media on the running receiver; in --no-stream mode the silent track keeps playing."""
+        if self.no_stream:
+            return
+        metadata = {"metadataType": 1, "title": " ", "subtitle": " ", "images": []}
+        stream_type = HLS_STREAM_TYPE if is_hls(stream_url) else DEFAULT_STREAM_TYPE
+        current_mc.play_media(stream_url, stream_type, stream_type="LIVE", title=" ", thumb=None, metadata=metadata)
+        current_mc.block_until_active(timeout=10)
+        if playback_offset:
+            playback_offset.playback_started()
+
+    def _switched(self):
+        self.generation += 1
+        self.switches += 1
+        self.switched.set()
+
+    def switch_station(self, url, title=None, image=None, kozt=None, amperwave=None):
+        """
+        Plays another station: `url` (playlists are resolved), display `title`/`image`.
+        `kozt` picks Amperwave metadata (default: when `amperwave` is given or the URL says KOZT),
+        `amperwave` switches the Amperwave station ID.
+        """
+        global KOZT_PROVIDER
+        started = time.time()
+        with self.lock:
+            self._require_session()
+            stream_url = resolve_playlist_cached(url)
+            self._play(stream_url)
+            if amperwave:
+                KOZT_PROVIDER = AmperwaveProvider(amperwave, interval=KOZT_PROVIDER.interval, session=KOZT_PROVIDER.http, hedger=KOZT_PROVIDER.hedger)
+            self.stream_url = stream_url
+            self.title = title or urlparse(stream_url).hostname or stream_url
+            self.image_url = image
+            self.is_kozt = kozt if kozt is not None else bool(amperwave) or "kozt" in stream_url.lower()
+            # Station card until the new station's metadata comes in
+            try:
+                self.radio_controller.send_track_update(self.title, "", image, station_name=self.title)
+            except Exception as e:
+                logging.debug(f"Control: station card send failed: {e}")
+            self._switched()
+        print(f"Control: switched to {self.title} ({stream_url})")
+        return {"stream_url": stream_url, "title": self.title, "kozt": self.is_kozt, "seconds": round(time.time() - started, 2)}
+
+    def set_stream(self, url):
+        """Plays a different stream URL for the current station (title and metadata source stay)."""
+        if self.no_stream:
+            raise ControlError("running with --no-stream: there is no stream to change")
+        started = time.time()
+        with self.lock:
+            self._require_session()
+            stream_url = resolve_playlist_cached(url)
+            self._play(stream_url)
+            self.stream_url = stream_url
+            self._switched()
+        return {"stream_url": stream_url, "seconds": round(time.time() - started, 2)}
+
+    def pause_metadata(self, paused=True):
+        """Stops (or with paused=false, restarts) pushing track updates to the receiver."""
+        if not self.radio_controller:
+            raise ControlError("no active cast session (still connecting?)")
+        self.radio_controller.metadata_paused = bool(paused)
+        if not paused:
+            try:
+                self.radio_controller.resend_last_update()
+            except Exception as e:
+                logging.debug(f"Control: resend after resume failed: {e}")
+        return {"metadata_paused": self.radio_controller.metadata_paused}
+
+    def resume_metadata(self):
+        return self.pause_metadata(False)
+
+    def state(self):
+        controller = self.radio_controller
+        last = controller.last_update if controller else None
+        return {
+            "device": self.device_name,
+            "connected": bool(current_cast and current_cast.socket_client.is_connected),
+            "app_id": current_cast.status.app_id if current_cast and current_cast.status else None,
+            "stream_url": self.stream_url,
+            "title": self.title,
+            "image": self.image_url,
+            "metadata_source": "amperwave" if self.is_kozt else "icecast",
+            "amperwave_station": KOZT_PROVIDER.station if self.is_kozt else None,
+            "no_stream": self.no_stream,
+            "metadata_paused": controller.metadata_paused if controller else False,
+            "now_playing": {"title": last["title"], "artist": last["artist"]} if last else None,
+        }
+
+    def stats(self):
+        now = time.time()
+        return {
+            "uptime_s": round(now - self.started),
+            "session_s": round(now - self.connected_at) if self.connected_at else None,
+            "switches": self.switches,
+            "session": dict(self.radio_controller.counters) if self.radio_controller else {},
+            "amperwave_hedging": KOZT_PROVIDER.hedger.report() if KOZT_PROVIDER.hedger else None,
+            "poll_interval_s": list(KOZT_POLL_INTERVAL),
+            "workers": self.workers.snapshot() if self.workers else [],
+            "discovery": registry.snapshot() if registry else None,
+            "audio_sync": self.aligned.stats() if self.aligned else None,
+            "stream": self.analyzer.stats() if self.analyzer else None,
+            "threads": threading.active_count(),
+        }
+
+def wait_or_switch(seconds):
+    """Sleeps between polls; a station switch over the control socket ends the wait early."""
+    if control:
+        control.switched.wait(seconds)
+    else:
+        clock.sleep(seconds)
+
+def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=None, is_kozt_station=False, no_stream=False, providers=None):
+    global current_cast, current_mc, registry, playback_offset
+
+    # Playlist resolution and the first now-playing/art lookup do not need the device:
+    # run them alongside discovery, connection and app launch, joining just before they are used
+    timeline = Timeline("startup", clock)
+    startup = ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+    playlist_future = startup.submit(timeline.timed("resolve playlist", resolve_playlist_cached), stream_url)
+    metadata_future = startup.submit(timeline.timed("now playing + art", fetch_initial_metadata)) if is_kozt_station else None
+    startup.shutdown(wait=False)
 
     print(f"Searching for Chromecast: {device_name}...")
+    discovery_done = timeline.start("discovery")
+
+    if cast_host:
+        # Known address (e.g. a fake_receiver.py instance): no mDNS
+        host, _, port = cast_host.partition(":")
+        cast = pychromecast.get_chromecast_from_host((host, int(port or 8009), None, None, device_name))
+    else:
+        # The registry keeps browsing between sessions: a known device is returned at once
+        if not registry:
+            registry = CastRegistry().start()
+        cast = registry.get_chromecast(device_name, timeout=DISCOVERY_TIMEOUT)
 
-    # Create zeroconf instance if not already created
-    if not current_zconf:
-        current_zconf = zeroconf.Zeroconf()
-
-    chromecasts, browser = pychromecast.get_listed_chromecasts(
-        friendly_names=[device_name],
-        zeroconf_instance=current_zconf
-    )
-    current_browser = browser
-
-    if not chromecasts:
-        # Try discovering all if specific one not found immediately
-        print(f"Device '{device_name}' not found immediately. Scanning all devices...")
-        chromecasts, browser = discover_all_chromecasts()
-        current_browser = browser
-        # Filter manually
-        chromecasts = [cc for cc in chromecasts if cc.name == device_name]
-
-    if not chromecasts:
+    if not cast:
         print(f"Error: Could not find Chromecast named '{device_name}'.")
+        if registry and registry.known():
+            print(f"Devices on the network: {', '.join(registry.known())}")
         sys.exit(1)
 
-    current_cast = chromecasts[0]
-    current_cast.wait()
+    discovery_done()
+
+    current_cast = cast
+    with timeline.step("connect"):
+        current_cast.wait()
     print(f"Connected to {current_cast.name}!")
 
     # Register Custom Controller
     radio_controller = RadioController()
     current_cast.register_handler(radio_controller)
 
+    if art_proxy:
+        radio_controller.art_proxy = art_proxy
+        radio_controller.screen_class = screen_class_for(current_cast.cast_info)
+        radio_controller.device_host = current_cast.cast_info.host
+        logging.info(f"Art Proxy: {current_cast.cast_info.model_name} uses screen class '{radio_controller.screen_class}'")
+
     current_mc = current_cast.media_controller
+    if control:
+        control.attach(radio_controller)
     
-    # If KOZT, try to get initial metadata for play_media call
-    initial_title = title
-    initial_image_url = image_url
-    initial_album = None
-    initial_time = None
-    kozt_artist = "" # Initialize kozt_artist
-    if is_kozt_station:
-        kozt_title, kozt_artist, kozt_image, kozt_album, kozt_time = scrape_kozt_now_playing()
-        if kozt_title and kozt_artist:
-            initial_title = f"{kozt_artist} - {kozt_title}"
-            if kozt_image:
-                initial_image_url = kozt_image
-            else:
-                # If KOZT API has no image, try iTunes
-                initial_image_url = fetch_album_art(kozt_artist, kozt_title)
-            
-            initial_album = kozt_album
-            initial_time = kozt_time
-            
-            print(f"Initial KOZT metadata: {initial_title} / Image: {initial_image_url} / Album: {initial_album} / Time: {initial_time}")
-        else:
-            print("Warning: Failed to get initial KOZT metadata. Using provided defaults.")
-
     # Prepare minimal metadata to suppress Default UI
     # Trick: Use metadataType 1 (MOVIE) to force full-screen video UI on Pixel Tablet
     metadata = {
@@ -466,6 +823,8 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
     # The Custom UI will be populated by the first `send_track_update` message.
 
     # Launch Default Media Receiver and play
+    launch_done = timeline.start("launch app")
+    watcher = None
     if app_id:
         print(f"Launching Custom App ID: {app_id}")
         
@@ -482,15 +841,15 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
         for attempt in range(2):
             try:
                 print(f"Starting app {app_id} (Attempt {attempt + 1})...")
+                watcher = watcher or LaunchWatcher(current_cast, app_id, NAMESPACE)
                 current_cast.start_app(app_id) # Custom Receiver
                 launch_success = True
-                time.sleep(3) # Wait for app to load
                 break
             except Exception as e:
                 print(f"Error launching app (Attempt {attempt + 1}): {e}")
                 if attempt < 1:
                     print("Retrying in 5 seconds...")
-                    time.sleep(5)
+                    clock.sleep(5)
         
         if not launch_success:
             print(f"Error: Failed to launch App ID {app_id} after retries.")
@@ -507,12 +866,51 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
         # But explicitly setting it helps if we want to switch apps
         # cast.start_app("CC1AD845") # Default Media Receiver ID
 
+    if watcher:
+        # Wait for the receiver page itself (app running, namespace announced, first PONG) instead of a fixed sleep
+        with timeline.step("receiver ready"):
+            receiver_ready = "first pong" in wait_until_ready(watcher, radio_controller, current_cast.name, launch_deadline, clock)
+    launch_done()
+
+    # Join the initial now-playing lookup (normally finished during discovery/launch)
+    initial_title = title
+    initial_image_url = image_url
+    initial_album = None
+    initial_time = None
+    kozt_title = None
+    kozt_artist = "" # Initialize kozt_artist
+    if metadata_future:
+        with timeline.step("wait for now playing"):
+            kozt_title, kozt_artist, kozt_image, kozt_album, kozt_time = metadata_future.result()
+        if kozt_title and kozt_artist:
+            initial_title = f"{kozt_artist} - {kozt_title}"
+            initial_image_url = kozt_image
+            initial_album = kozt_album
+            initial_time = kozt_time
+            
+            print(f"Initial KOZT metadata: {initial_title} / Image: {initial_image_url} / Album: {initial_album} / Time: {initial_time}")
+        else:
+            kozt_artist = ""
+            print("Warning: Failed to get initial KOZT metadata. Using provided defaults.")
+
+    with timeline.step("wait for playlist"):
+        stream_url = playlist_future.result()
+    if is_hls(stream_url):
+        stream_type = HLS_STREAM_TYPE
+
+    play_done = timeline.start("play media")
+    if watcher:
+        watcher.expect_status()
     if not no_stream:
         print(f"Playing {initial_title} ({stream_url})...")
         # Use generic title/thumb to avoid Default UI clutter
         current_mc.play_media(stream_url, stream_type, stream_type="LIVE", title=" ", thumb=None, metadata=metadata)
         current_mc.block_until_active()
         print("Playback started!")
+        # The silent track has no song changes to line up with
+        playback_offset = PlaybackOffset(current_mc, sync_offset, clock) if audio_sync else None
+        if playback_offset:
+            playback_offset.playback_started()
     else:
         print("Mode: No-Stream. Playing SILENT track to keep receiver active/visible.")
         # We must play *something* or the Pixel Tablet will revert to the dashboard.
@@ -520,14 +918,26 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
         current_mc.play_media(SILENT_STREAM_URL, SILENT_STREAM_TYPE, stream_type="BUFFERED", title=" ", thumb=None, metadata=metadata)
         current_mc.block_until_active()
         print("Silent Playback started!")
+    play_done()
     
     # Send immediate update with REAL metadata to populate Custom UI
-    time.sleep(1) # Wait for receiver to be ready
-    # Use provided 'title' which defaults to "KOZT - The Coast" as station_name
-    radio_controller.send_track_update(initial_title, kozt_artist, initial_image_url, initial_album, initial_time, station_name=title)
+    with timeline.step("first update"):
+        if watcher and not receiver_ready:
+            clock.sleep(1) # Receiver never answered a PING: give it a moment as before
+        # Use provided 'title' which defaults to "KOZT - The Coast" as station_name
+        radio_controller.send_track_update(initial_title, kozt_artist, initial_image_url, initial_album, initial_time, station_name=title)
+    timeline.report()
+    print(f"Startup took {timeline.total():.2f}s (critical path: {' -> '.join(timeline.critical_path())})")
+
+    # The sender polls Icecast status on the receiver's behalf (one poller per sender instead of a fetch every 10s on each device)
+    try:
+        radio_controller.send_config(disableIcecastPolling=True)
+    except Exception as e:
+        logging.debug(f"Failed to send receiver config: {e}")
     
-    # Verify the correct app is running AFTER playback starts
-    time.sleep(1) # Allow status to update
+    # Verify the correct app is running AFTER playback starts: wait for the status that a fallback to the Default Media Receiver would send
+    if watcher:
+        watcher.wait_for_status()
     if app_id and current_cast.status:
          logging.debug(f"Debug: Active App ID is {current_cast.status.app_id}")
          if current_cast.status.app_id != app_id:
@@ -537,23 +947,69 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
          logging.debug("Debug: Could not determine Active App ID (status is None)")
     
     # MONITOR LOGIC
-    stop_event = threading.Event()
-    browser_discovery_active = True
+    seed = None
+    if is_kozt_station and kozt_artist:
+        seed = Track(title=kozt_title, artist=kozt_artist, source="amperwave", observed_at=clock.time())
+    while monitor_session(radio_controller, stream_url, title, app_id, is_kozt_station, providers, seed):
+        # Switched over the control socket: same device and receiver app, new station
+        stream_url, title, is_kozt_station = control.stream_url, control.title, control.is_kozt
+        seed = None
+
+def monitor_session(radio_controller, stream_url, title, app_id, is_kozt_station, providers=None, seed=None):
+    """
+    Keeps the session alive and pushes metadata for one station. Returns False when
+    the session is over (the caller relaunches), True when the control socket
+    switched stations (the caller continues on the same session).
+    Background workers of the station are stopped and joined on the way out, however it ends.
+    """
+    workers = WorkerSupervisor(f"station {title}")
+    aligned = workers.adopt("audio sync", AlignedSender(playback_offset)) if playback_offset else None
+    analyzer = workers.adopt("stream analyzer", AdtsAnalyzer(radio_controller.send_stream_status, clock)) if analyze_stream else None
+    if control:
+        control.workers = workers
+        control.aligned = aligned
+        control.analyzer = analyzer
+    try:
+        return run_monitor(workers, radio_controller, stream_url, title, app_id, is_kozt_station, providers, seed, aligned, analyzer)
+    finally:
+        workers.stop()
+
+def run_monitor(workers, radio_controller, stream_url, title, app_id, is_kozt_station, providers, seed, aligned=None, analyzer=None):
+    if control:
+        control.switched.clear()
+    generation = control.generation if control else 0
+    switched = lambda: control is not None and control.generation != generation
     
     consecutive_errors = 0
 
-    # KOZT SPECIFIC LOGIC - Check explicit flag first
-    if is_kozt_station or "kozt" in stream_url.lower():
+    # KOZT SPECIFIC LOGIC - Check explicit flag first (unless providers were chosen explicitly)
+    if not providers and (is_kozt_station or "kozt" in stream_url.lower()):
         print("--- Detected KOZT Stream. Using Amperwave JSON API for Metadata ---")
+        if analyzer:
+            # No stream connection of our own on this path: the analyzer gets one
+            workers.spawn("stream reader", stream_reader, stream_url, analyzer)
         last_song_title = None
         last_artist_name = None
-        last_heartbeat_time = time.time()
+        last_heartbeat_time = clock.time()
+        last_poll_time = None
+
+        def send_update(send):
+            # A delivered update proves the connection like a PONG does, whether sent now or by the aligned sender later
+            nonlocal consecutive_errors
+            send()
+            consecutive_errors = 0
         
         while True:
             # Heartbeat Log
-            if time.time() - last_heartbeat_time > 30:
+            if clock.time() - last_heartbeat_time > 30:
                 logging.info(f"Heartbeat: Sender is alive. Current App ID: {current_cast.status.app_id if current_cast.status else 'Unknown'}")
-                last_heartbeat_time = time.time()
+                if KOZT_PROVIDER.hedger:
+                    logging.info(KOZT_PROVIDER.hedger.report())
+                if aligned:
+                    logging.info(aligned.report())
+                if analyzer:
+                    logging.info(analyzer.report())
+                last_heartbeat_time = clock.time()
 
             # 1. Keepalive / Status Check
             try:
@@ -592,6 +1048,13 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
             
             # 3. App Logic (Fetch Data)
             song_title, artist_name, fetched_image_url, album_name, track_time = scrape_kozt_now_playing()
+            # The change aired somewhere since the previous poll: assume halfway
+            aired_ago = (clock.time() - last_poll_time) / 2 if last_poll_time else 0.0
+            last_poll_time = clock.time()
+
+            # Station switched while we were fetching: this track belongs to the old one
+            if switched():
+                break
             
             if song_title and artist_name and (song_title != last_song_title or artist_name != last_artist_name):
                 logging.debug(f"KOZT Monitor: New Track -> {song_title} / {artist_name}")
@@ -607,41 +1070,73 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
                     # For now, we try iTunes if JSON lacks image.
                     final_image_url = fetch_album_art(artist_name, song_title) 
                 
-                try:
-                    # Use provided 'title' which defaults to "KOZT - The Coast" as station_name
-                    radio_controller.send_track_update(song_title, artist_name, final_image_url, album_name, track_time, station_name=title)
-                    consecutive_errors = 0
-                except Exception as e:
-                    logging.debug(f"KOZT Monitor: Send failed: {e}")
-                    # If send fails here, the next loop's keepalive will likely catch it too
+                # Use provided 'title' which defaults to "KOZT - The Coast" as station_name
+                send = functools.partial(send_update, functools.partial(radio_controller.send_track_update, song_title, artist_name, final_image_url, album_name, track_time, station_name=title))
+                if aligned:
+                    aligned.submit(send, f"{artist_name} - {song_title}", aired_ago=aired_ago)
+                else:
+                    try:
+                        send()
+                    except Exception as e:
+                        logging.debug(f"KOZT Monitor: Send failed: {e}")
+                        # If send fails here, the next loop's keepalive will likely catch it too
             
             # Random refresh interval for next poll
-            sleep_delay = random.randint(10, 25)
+            sleep_delay = random.randint(*KOZT_POLL_INTERVAL)
             logging.info(f"KOZT Monitor: Waiting {sleep_delay} seconds until next refresh.")
-            time.sleep(sleep_delay)
+            wait_or_switch(sleep_delay)
     
-    # GENERIC ICECAST LOGIC
+    # GENERIC ICECAST LOGIC (or racing providers)
     else:
-        print("--- Using Generic Icecast Metadata Monitor ---")
-        monitor_thread = threading.Thread(target=metadata_monitor, args=(stream_url, radio_controller, stop_event))
-        monitor_thread.daemon = True
-        monitor_thread.start()
+        race = None
+        if providers:
+            tracks = queue.Queue(TRACK_QUEUE_SIZE)
+            workers.spawn("track sender", track_sender, tracks, radio_controller, aligned)
+            race = ProviderRace(build_providers(providers, stream_url, amperwave=KOZT_PROVIDER),
+                                functools.partial(queue_race_update, tracks, station_name=title, aligned=aligned))
+            print(f"--- Racing Metadata Providers: {', '.join(p.name for p in race.providers)} ---")
+            if seed:
+                race.seed(seed)
+            workers.adopt("provider race", race)
+            if analyzer:
+                workers.spawn("stream reader", stream_reader, stream_url, analyzer)
+        else:
+            print("--- Using Generic Icecast Metadata Monitor ---")
+            # The reader only queues titles; art lookup and sends run in their own worker
+            tracks = queue.Queue(TRACK_QUEUE_SIZE)
+            workers.spawn("track sender", track_sender, tracks, radio_controller, aligned)
+            # With --replay the titles come from the recording; the receiver still plays the real stream
+            if icy_replay:
+                workers.spawn("metadata monitor", metadata_monitor, icy_replay.url, tracks, aligned)
+                if analyzer:
+                    workers.spawn("stream reader", stream_reader, stream_url, analyzer)
+            else:
+                # The monitor reads the audio anyway; it feeds the analyzer too
+                workers.spawn("metadata monitor", metadata_monitor, stream_url, tracks, aligned, analyzer)
+            workers.adopt("icecast status", IcecastStatusPoller(stream_url, radio_controller.send_icecast_status))
         
-        last_ping_time = time.time()
-        last_heartbeat_time = time.time()
+        last_ping_time = clock.time()
+        last_heartbeat_time = clock.time()
 
         while True:
             # Heartbeat Log every 30s
-            if time.time() - last_heartbeat_time > 30:
+            if clock.time() - last_heartbeat_time > 30:
                 logging.info(f"Heartbeat: Sender is alive. Current App ID: {current_cast.status.app_id if current_cast.status else 'Unknown'}")
-                last_heartbeat_time = time.time()
+                if race:
+                    logging.info(f"Provider race stats: {race.stats()}")
+                logging.info(f"Workers: {workers.report()}")
+                if aligned:
+                    logging.info(aligned.report())
+                if analyzer:
+                    logging.info(analyzer.report())
+                last_heartbeat_time = clock.time()
 
             try:
                 # Update status frequently
                 current_cast.socket_client.receiver_controller.update_status()
                 
                 # Send Ping every 10 seconds
-                if time.time() - last_ping_time > 10:
+                if clock.time() - last_ping_time > 10:
                      logging.debug("Sending Ping...")
                      if not radio_controller.send_keepalive():
                          logging.warning("Ping Failed!")
@@ -649,7 +1144,7 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
                      
                      # Only reset consecutive errors if Ping succeeded
                      consecutive_errors = 0 
-                     last_ping_time = time.time()
+                     last_ping_time = clock.time()
                      logging.debug("Ping Successful.")
 
             except Exception as e:
@@ -672,7 +1167,12 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
                 logging.warning(f"App ID changed to {current_cast.status.app_id}. Relaunching...")
                 break
 
-            time.sleep(1)
+            if switched():
+                break
+
+            clock.sleep(1)
+
+    return switched()
 
 
 if __name__ == "__main__":
@@ -695,6 +1195,30 @@ if __name__ == "__main__":
     parser.add_argument("--no-kozt", action="store_false", dest="kozt", help="Disable KOZT metadata scraping")
     parser.set_defaults(kozt=True)
     parser.add_argument("-ns", "--no-stream", action="store_true", help="Launch the app and show song information on your screen, but keep the audio silent.")
+    parser.add_argument("--host", default=None, metavar="HOST[:PORT]", help="Connect to this address instead of discovering the device by name (e.g. a fake_receiver.py instance)")
+    parser.add_argument("--station", default=DEFAULT_AMPERWAVE_STATION, help="Amperwave station path for KOZT-style metadata (e.g. 10/4756)")
+    parser.add_argument("--providers", default=None, help="Race these metadata providers, e.g. 'amperwave,icecast,icy,hls'")
+    parser.add_argument("--hedge-budget", type=float, default=DEFAULT_HEDGE_BUDGET, help="Max fraction of extra hedged now-playing requests (0 disables hedging)")
+    parser.add_argument("--art-proxy", action="store_true", help="Serve album art from this machine, resized for the device's screen (needs a receiver page hosted over http on the LAN)")
+    parser.add_argument("--art-port", type=int, default=DEFAULT_ART_PORT, help="Port for the art proxy")
+    parser.add_argument("--art-cache", default=DEFAULT_ART_CACHE, help="Disk cache directory for the art proxy")
+    parser.add_argument("--config", default=None, help="JSON config (devices, stations, tunables); this device's entry overrides the flags above and tunables apply live")
+    parser.add_argument("--memwatch", action="store_true", help="Sample RSS/threads and log tracemalloc growth sites")
+    parser.add_argument("--mem-interval", type=float, default=memwatch.DEFAULT_INTERVAL, help="Seconds between memory watchdog samples")
+    parser.add_argument("--mem-budget", type=float, default=None, help="RSS budget in MB for the memory watchdog")
+    parser.add_argument("--max-threads", type=int, default=None, help="Thread-count budget for the memory watchdog")
+    parser.add_argument("--mem-restart", action="store_true", help="Restart this process cleanly when a memory/thread budget is exceeded")
+    parser.add_argument("--profile-dir", default=profiler.DEFAULT_DIRECTORY, help="Where SIGUSR1 profiling sessions write their reports")
+    parser.add_argument("--launch-timeout", type=float, default=DEFAULT_LAUNCH_DEADLINE, help="Deadline (s) for the receiver app to start and answer a PING")
+    parser.add_argument("--control", nargs="?", const="", default=None, metavar="SOCKET",
+                        help="Serve the JSON-RPC control socket (switch station, pause metadata, state/stats; see control.py). Default path: $XDG_RUNTIME_DIR/kozt-<device>.sock")
+    parser.add_argument("--audio-sync", action="store_true", help="Hold each track update until the receiver's buffered playback reaches the song change")
+    parser.add_argument("--sync-offset", type=float, default=0.0, help="Extra seconds to add to the estimated receiver delay for --audio-sync (negative: show updates earlier)")
+    parser.add_argument("--analyze-stream", action="store_true", help="Parse the AAC stream's ADTS frames and tell the receiver about dead air, underruns and bitrate drops")
+    parser.add_argument("--record", default=None, metavar="FILE", help="Record Amperwave/iTunes responses and ICY metadata to FILE (.jsonl.gz) for offline replay")
+    parser.add_argument("--replay", default=None, metavar="FILE", help="Serve Amperwave/iTunes/ICY metadata from a --record FILE instead of the network")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="Speed-up for --replay (e.g. 10: ten recorded seconds per second)")
+    parser.add_argument("--shutdown-timeout", type=float, default=DEFAULT_SHUTDOWN_DEADLINE, help="Overall deadline (s) for teardown on SIGINT/SIGTERM")
     
     args = parser.parse_args()
     
@@ -707,15 +1231,86 @@ if __name__ == "__main__":
         log_level = logging.WARNING
         
     logging.basicConfig(level=log_level, format='%(message)s')
+
+    # kill -USR1 <pid> starts/stops a sampling profile (no cost while off)
+    profiler.install(directory=args.profile_dir)
+
+    if args.memwatch:
+        memwatch.MemoryWatchdog(args.mem_interval, budget_mb=args.mem_budget, max_threads=args.max_threads,
+                                restart=args.mem_restart, on_restart=lambda: build_shutdown_plan(log=logging.info).run()).start()
+
+    config_watcher = None
+    if args.config:
+        config_watcher = ConfigWatcher(args.config, apply_tunables)
+        settings = session_settings(config_watcher.config, args.device_name) or {}
+        # Session settings for this device come from the config (kozt_multi.py restarts us when they change)
+        args.url = settings.get("url", args.url)
+        args.title = settings.get("title", args.title)
+        args.image = settings.get("image", args.image)
+        args.app_id = settings.get("app_id", args.app_id)
+        args.station = settings.get("amperwave", args.station)
+        args.no_stream = settings.get("no_stream", args.no_stream)
+        args.host = settings.get("host", args.host)
+
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be combined")
+    if args.providers:
+        # A typo would otherwise surface in run_monitor and be retried as a lost connection forever
+        try:
+            args.providers = parse_provider_names(args.providers)
+        except ValueError as e:
+            parser.error(f"--providers: {e}")
+    if args.record:
+        feed_recorder = FeedRecorder(args.record)
+        feed_http = RecordingHTTP(feed_recorder)
+        print(f"Recording upstream feeds to {args.record}")
+    elif args.replay:
+        feed_http = FeedReplay(args.replay, args.replay_speed)
+        print(feed_http.summary())
+        if feed_http.by_kind.get("icy"):
+            icy_replay = IcyReplayServer(feed_http).start()
+
+    KOZT_PROVIDER = AmperwaveProvider(args.station, interval=KOZT_POLL_INTERVAL, session=feed_http, hedger=HedgedRequester("amperwave", budget=args.hedge_budget))
+    shutdown_deadline = args.shutdown_timeout
+    launch_deadline = args.launch_timeout
+    cast_host = args.host
+    audio_sync = args.audio_sync
+    sync_offset = args.sync_offset
+    analyze_stream = args.analyze_stream
+
+    if args.art_proxy:
+        # The proxy speaks plain http: an HTTPS-hosted receiver (GitHub Pages) treats its URLs as mixed content and uses the originals
+        logging.warning("Art Proxy: only receivers served over http from the LAN can load proxied art; HTTPS-hosted receivers use the original URLs")
+        try:
+            art_proxy = ArtProxy(args.art_port, args.art_cache)
+            art_proxy.start()
+        except OSError as e:
+            logging.warning(f"Art Proxy: could not listen on port {args.art_port} ({e}); sending original art URLs")
+            art_proxy = None
+
+    if config_watcher:
+        apply_tunables(config_watcher.start())
+
+    if args.control is not None:
+        control = SessionControl(args.device_name, args.url, args.title, args.image, args.kozt, args.no_stream)
+        control.start(args.control or socket_path_for(args.device_name))
     
-    # Resolve playlist if necessary
-    final_url = resolve_playlist(args.url)
+    # Playlists are resolved inside play_radio(), in parallel with discovery
+    final_url = args.url
     
     browser = None # Initialize browser here to be accessible in finally
     
     while True:
+        if control:
+            # After a reconnect, come back on the station last chosen over the control socket
+            final_url, args.title, args.image, args.kozt = control.stream_url, control.title, control.image_url, control.is_kozt
         try:
-            play_radio(args.device_name, final_url, DEFAULT_STREAM_TYPE, args.title, args.image, args.app_id, args.kozt, args.no_stream)
+            play_radio(args.device_name, final_url, DEFAULT_STREAM_TYPE, args.title, args.image, args.app_id, args.kozt, args.no_stream,
+                       args.providers)
+        except WorkerLimitError as e:
+            # Too many workers in one session is a bug: relaunching would only hit it again
+            logging.error(f"Stopping: {e}")
+            sys.exit(1)
         except Exception as e:
             if cleanup_in_progress:
                 break
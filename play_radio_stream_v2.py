@@ -11,7 +11,13 @@ import zeroconf
 import threading
 import struct
 import json
-from urllib.parse import quote
+import queue
+from icecast_metadata_reader import IcecastStatusPoller
+import profiler
+import memwatch
+from now_playing import AmperwaveProvider, split_stream_title, fetch_album_art, DEFAULT_AMPERWAVE_STATION
+from cast_events import LaunchWatcher, wait_until_ready
+from workers import WorkerSupervisor, WorkerLimitError
 
 # Default Stream (Radio Paradise Main Mix)
 DEFAULT_STREAM_URL = "http://stream.radioparadise.com/aac-128"
@@ -22,6 +28,12 @@ DEFAULT_SUBTITLE = "Internet Radio"
 
 NAMESPACE = 'urn:x-cast:com.example.radio'
 
+# Amperwave now-playing source (--station picks the station)
+KOZT_PROVIDER = AmperwaveProvider()
+
+# Titles waiting between the ICY reader and the art lookup/send worker (oldest dropped when full)
+TRACK_QUEUE_SIZE = 4
+
 def discover_all_chromecasts(timeout=5):
     """
     Discover all chromecasts on the network using CastBrowser directly,
@@ -90,7 +102,23 @@ class RadioController(BaseController):
             logging.debug(f"  Image: {image_url}")
         self.send_message(msg)
 
-    def send_keepalive(self):
+    def send_config(self, **options):
+        """Sends receiver settings, e.g. disableIcecastPolling=True."""
+        logging.debug(f"RadioController: Sending config -> {options}")
+        self.send_message({"type": "CONFIG", **options})
+
+    def send_icecast_status(self, source):
+        """Forwards an Icecast status-json source (polled by the sender) to the receiver."""
+        artist, title = split_stream_title(source.get('title', ''))
+        self.send_message({
+            "type": "ICECAST_STATUS",
+            "title": title,
+            "artist": artist,
+            "listeners": source.get('listeners'),
+            "serverName": source.get('server_name')
+        })
+
+    def send_keepalive(self, timeout=3.0):
         """
         Sends a PING and waits for a PONG.
         Returns True if PONG received within timeout, False otherwise.
@@ -99,8 +127,8 @@ class RadioController(BaseController):
             self.pong_received.clear()
             self.send_message({"type": "PING"})
             
-            # Wait for PONG (3 seconds timeout)
-            if self.pong_received.wait(timeout=3.0):
+            # Wait for PONG (3 seconds timeout by default)
+            if self.pong_received.wait(timeout=timeout):
                 return True
             else:
                 logging.debug("Keepalive: PING sent but no PONG received (Timeout).")
@@ -154,38 +182,54 @@ def resolve_playlist(url):
     
     return url
 
-def fetch_album_art(artist, title):
+def queue_latest(tracks, item):
+    """Puts `item` on the bounded track queue; when it is full the oldest (stale) title is dropped. Returns True if one was."""
+    dropped = False
+    while True:
+        try:
+            tracks.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                tracks.get_nowait()
+                dropped = True
+            except queue.Empty:
+                pass
+
+def track_sender(worker, tracks, controller):
     """
-    Fetches album art URL using the iTunes Search API.
-    Returns None if not found or on error.
+    Looks up art for the titles metadata_monitor() queues and sends the track
+    updates, so the stream reader never waits on iTunes or the receiver.
+    Titles that were superseded while a lookup ran are skipped.
     """
-    if not artist or not title:
-        return None
-        
-    search_term = f"{artist} {title}"
-    url = f"https://itunes.apple.com/search?term={quote(search_term)}&media=music&limit=1"
-    
-    try:
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if data['resultCount'] > 0:
-                # Get the largest available image (artworkUrl100 is usually 100x100)
-                # We can try to hack the URL to get a higher res version (e.g. 600x600)
-                artwork_url = data['results'][0].get('artworkUrl100')
-                if artwork_url:
-                    # Replace '100x100bb' with '600x600bb' for higher quality
-                    return artwork_url.replace('100x100bb', '600x600bb')
-    except Exception as e:
-        print(f"Error fetching album art: {e}")
-    
-    return None
+    while not worker.stopping:
+        try:
+            title, artist = tracks.get(timeout=1)
+        except queue.Empty:
+            continue
+        # Only the newest title matters
+        while True:
+            try:
+                title, artist = tracks.get_nowait()
+                logging.debug("Metadata Monitor: Skipping a title superseded during the art lookup")
+            except queue.Empty:
+                break
+        worker.set_state("looking up art")
+        image_url = fetch_album_art(artist, title)
+        worker.set_state("running")
+        try:
+            controller.send_track_update(title, artist, image_url)
+        except Exception as e:
+            logging.debug(f"Metadata Monitor: Send failed: {e}")
 
-def metadata_monitor(stream_url, controller, stop_event):
+def metadata_monitor(worker, stream_url, tracks):
     """
-    Connects to the stream in a separate thread, reads interleaved metadata,
-    and pushes updates to the Chromecast receiver.
+    Connects to the stream in a separate thread and reads interleaved metadata.
+    New titles go on the bounded `tracks` queue for track_sender(), so this
+    thread does nothing but drain the socket. Runs as a supervised
+    worker (workers.py): stopped via worker.stop_event, bytes counted on the worker.
     """
+    stop_event = worker.stop_event
     logging.debug(f"Metadata Monitor: Connecting to {stream_url}")
     headers = {
         'User-Agent': 'Mozilla/5.0 (compatible; IcecastMetadataReader/1.0)',
@@ -196,15 +240,20 @@ def metadata_monitor(stream_url, controller, stop_event):
     
     while not stop_event.is_set():
         try:
+            worker.set_state("connecting")
             with requests.get(stream_url, headers=headers, stream=True, timeout=10) as r:
+                # Closing the response aborts a read blocked on a stalled stream
+                worker.use(r)
                 # Check for Icy-MetaInt
                 metaint = int(r.headers.get('icy-metaint', -1))
                 
                 if metaint == -1:
                     logging.debug("Metadata Monitor: No Icy-MetaInt header found. Stream does not support interleaved metadata.")
+                    worker.set_state("no metadata")
                     return
 
                 logging.debug(f"Metadata Monitor: Connected. Interval: {metaint} bytes.")
+                worker.set_state("streaming")
                 
                 while not stop_event.is_set():
                     # Read audio chunk (discard)
@@ -218,6 +267,7 @@ def metadata_monitor(stream_url, controller, stop_event):
                         if not chunk:
                             raise Exception("Stream ended")
                         bytes_to_read -= len(chunk)
+                        worker.add_bytes(len(chunk))
                     
                     # Read metadata length
                     len_byte = r.raw.read(1)
@@ -225,6 +275,7 @@ def metadata_monitor(stream_url, controller, stop_event):
                         raise Exception("Stream ended")
                     
                     length = struct.unpack('B', len_byte)[0] * 16
+                    worker.add_bytes(1 + length)
                     
                     if length > 0:
                         meta_data = r.raw.read(length)
@@ -247,13 +298,9 @@ def metadata_monitor(stream_url, controller, stop_event):
                                         artist = parts[0].strip()
                                         title = parts[1].strip()
                                     
-                                    # Fetch Album Art
-                                    image_url = fetch_album_art(artist, title)
-                                    
-                                    try:
-                                        controller.send_track_update(title, artist, image_url)
-                                    except Exception as e:
-                                        logging.debug(f"Metadata Monitor: Send failed: {e}")
+                                    # Art lookup and send happen in track_sender()
+                                    if queue_latest(tracks, (title, artist)):
+                                        logging.debug("Metadata Monitor: Track queue full, dropped a stale title")
                                         
                             except IndexError:
                                 pass
@@ -263,36 +310,18 @@ def metadata_monitor(stream_url, controller, stop_event):
             if not stop_event.is_set():
                 logging.debug(f"Metadata Monitor Connection Lost: {e}")
                 logging.debug("Reconnecting in 5 seconds...")
-                time.sleep(5)
+                worker.set_state("reconnecting")
+                worker.wait(5)
 
 def scrape_kozt_now_playing():
     """
-    Fetches KOZT now playing data from the Amperwave JSON API.
+    Fetches now playing data for the --station from the Amperwave JSON API.
     Returns: title, artist, image_url, album, time
     """
     try:
-        # Discovered API endpoint
-        url = "https://api-nowplaying.amperwave.net/api/v1/prtplus/nowplaying/10/4756/nowplaying.json"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if "performances" in data and isinstance(data["performances"], list) and len(data["performances"]) > 0:
-            current_track = data["performances"][0]
-            
-            song_title = current_track.get("title", "Unknown Song").strip()
-            artist_name = current_track.get("artist", "Unknown Artist").strip()
-            album_name = current_track.get("album", "").strip()
-            track_time = current_track.get("time", "").strip()
-            
-            # Prefer large image, fall back to medium, then small
-            image_url = current_track.get("largeimage") or \
-                        current_track.get("mediumimage") or \
-                        current_track.get("smallimage")
-            
-            return song_title, artist_name, image_url, album_name, track_time
-            
+        track = KOZT_PROVIDER.fetch()
+        if track:
+            return track.as_tuple()
         return None, None, None, None, None
 
     except Exception as e:
@@ -358,11 +387,15 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
     # The Custom UI will be populated by the first `send_track_update` message.
 
     # Launch Default Media Receiver and play
+    watcher = None
+    receiver_ready = False
     if app_id:
         print(f"Launching Custom App ID: {app_id}")
         try:
+            watcher = LaunchWatcher(cast, app_id, NAMESPACE)
             cast.start_app(app_id) # Custom Receiver
-            time.sleep(2) # Wait for app to load
+            # Wait for the receiver page (app running, namespace announced, first PONG) instead of a fixed sleep
+            receiver_ready = "first pong" in wait_until_ready(watcher, radio_controller, cast.name)
         except pychromecast.error.RequestFailed:
             print(f"Error: Failed to launch App ID {app_id}.")
             print("Possible causes:")
@@ -377,6 +410,8 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
         # But explicitly setting it helps if we want to switch apps
         # cast.start_app("CC1AD845") # Default Media Receiver ID
 
+    if watcher:
+        watcher.expect_status()
     if not no_stream:
         print(f"Playing {initial_title} ({stream_url})...")
         # Use generic title/thumb to avoid Default UI clutter
@@ -391,11 +426,19 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
             # if the user just wants to see logs or an app is launched manually.
     
     # Send immediate update with REAL metadata to populate Custom UI
-    time.sleep(1) # Wait for receiver to be ready
+    if not receiver_ready:
+        time.sleep(1) # Wait for receiver to be ready
     radio_controller.send_track_update(initial_title, kozt_artist if is_kozt_station else "", initial_image_url, initial_album, initial_time)
+
+    # The sender polls Icecast status on the receiver's behalf
+    try:
+        radio_controller.send_config(disableIcecastPolling=True)
+    except Exception as e:
+        logging.debug(f"Failed to send receiver config: {e}")
     
-    # Verify the correct app is running AFTER playback starts
-    time.sleep(1) # Allow status to update
+    # Verify the correct app is running AFTER playback starts: wait for the status that a fallback to the Default Media Receiver would send
+    if watcher:
+        watcher.wait_for_status()
     if app_id and cast.status:
          logging.debug(f"Debug: Active App ID is {cast.status.app_id}")
          if cast.status.app_id != app_id:
@@ -405,7 +448,8 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
          logging.debug("Debug: Could not determine Active App ID (status is None)")
     
     # MONITOR LOGIC
-    stop_event = threading.Event()
+    # Owns the background threads of this session; stopped and joined however the loop ends
+    workers = WorkerSupervisor(f"session {title}")
     browser_discovery_active = True
     
     consecutive_errors = 0
@@ -493,9 +537,11 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
         # GENERIC ICECAST LOGIC
         else:
             print("--- Using Generic Icecast Metadata Monitor ---")
-            monitor_thread = threading.Thread(target=metadata_monitor, args=(stream_url, radio_controller, stop_event))
-            monitor_thread.daemon = True
-            monitor_thread.start()
+            # The reader only queues titles; art lookup and sends run in their own worker
+            tracks = queue.Queue(TRACK_QUEUE_SIZE)
+            workers.spawn("track sender", track_sender, tracks, radio_controller)
+            workers.spawn("metadata monitor", metadata_monitor, stream_url, tracks)
+            workers.adopt("icecast status", IcecastStatusPoller(stream_url, radio_controller.send_icecast_status))
             
             last_ping_time = time.time()
             last_heartbeat_time = time.time()
@@ -504,6 +550,7 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
                 # Heartbeat Log every 30s
                 if time.time() - last_heartbeat_time > 30:
                     logging.info(f"Heartbeat: Sender is alive. Current App ID: {cast.status.app_id if cast.status else 'Unknown'}")
+                    logging.info(f"Workers: {workers.report()}")
                     last_heartbeat_time = time.time()
 
                 try:
@@ -546,12 +593,13 @@ def play_radio(device_name, stream_url, stream_type, title, image_url, app_id=No
 
     except KeyboardInterrupt:
         print("Stopping...")
-        stop_event.set()
         # mc.stop() # Uncomment if you want to stop playback on exit
         if app_id:
              cast.quit_app()
         browser.stop_discovery()
         raise # Re-raise to stop the outer loop
+    finally:
+        workers.stop()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play an internet radio stream on Chromecast.")
@@ -562,12 +610,28 @@ if __name__ == "__main__":
     parser.add_argument("--app_id", default=None, help="Custom Receiver App ID (Register at cast.google.com/publish)")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
     parser.add_argument("--kozt", action="store_true", help="Force KOZT metadata scraping, even if URL doesn't contain 'kozt'")
+    parser.add_argument("--station", default=DEFAULT_AMPERWAVE_STATION, help="Amperwave station path for KOZT-style metadata (e.g. 10/4756)")
     parser.add_argument("-ns", "--no-stream", action="store_true", help="Launch the app and show song information on your screen, but keep the audio silent.")
+    parser.add_argument("--memwatch", action="store_true", help="Sample RSS/threads and log tracemalloc growth sites")
+    parser.add_argument("--mem-interval", type=float, default=memwatch.DEFAULT_INTERVAL, help="Seconds between memory watchdog samples")
+    parser.add_argument("--mem-budget", type=float, default=None, help="RSS budget in MB for the memory watchdog")
+    parser.add_argument("--max-threads", type=int, default=None, help="Thread-count budget for the memory watchdog")
+    parser.add_argument("--mem-restart", action="store_true", help="Restart this process cleanly when a memory/thread budget is exceeded")
+    parser.add_argument("--profile-dir", default=profiler.DEFAULT_DIRECTORY, help="Where SIGUSR1 profiling sessions write their reports")
     
     args = parser.parse_args()
+
+    KOZT_PROVIDER = AmperwaveProvider(args.station)
     
     # Configure logging: DEBUG if requested, otherwise INFO
     logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='%(message)s')
+
+    # kill -USR1 <pid> starts/stops a sampling profile (no cost while off)
+    profiler.install(directory=args.profile_dir)
+
+    if args.memwatch:
+        memwatch.MemoryWatchdog(args.mem_interval, budget_mb=args.mem_budget, max_threads=args.max_threads,
+                                restart=args.mem_restart).start()
     
     # Resolve playlist if necessary
     final_url = resolve_playlist(args.url)
@@ -578,6 +642,10 @@ if __name__ == "__main__":
         while True:
             try:
                 play_radio(args.device_name, final_url, DEFAULT_STREAM_TYPE, args.title, args.image, args.app_id, args.kozt, args.no_stream)
+            except WorkerLimitError as e:
+                # Too many workers in one session is a bug: relaunching would only hit it again
+                logging.error(f"Stopping: {e}")
+                sys.exit(1)
             except Exception as e:
                 logging.error(f"Connection lost or error occurred: {e}")
                 logging.info("Attempting to reconnect in 5 seconds...")
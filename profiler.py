@@ -0,0 +1,147 @@
+"""
+On-demand sampling profiler, toggled by a signal.
+
+    kill -USR1 <pid>    # start sampling
+    kill -USR1 <pid>    # stop and write the report
+
+While off, the only cost is the installed signal handler. While on, a
+daemon thread samples the stacks of *every* thread (`sys._current_frames()`)
+at `interval` seconds. That catches work cProfile would miss, because
+cProfile only sees the thread that enabled it: the ICY read loop in
+metadata_monitor, pychromecast's socket thread, the main loop's
+update_status() polling, and logging.
+
+Each session writes two files to `directory`:
+- profile-<pid>-<time>.txt: top functions by self and inclusive samples,
+  plus samples per thread.
+- profile-<pid>-<time>.folded: collapsed stacks for flamegraph.pl / speedscope.
+"""
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.01
+DEFAULT_DIRECTORY = os.path.expanduser("~/.cache/kozt_profiles")
+TOP_N = 40
+
+
+class SamplingProfiler:
+    """Samples all thread stacks in a background thread between start() and stop()."""
+    def __init__(self, interval=DEFAULT_INTERVAL, directory=DEFAULT_DIRECTORY):
+        self.interval = interval
+        self.directory = directory
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.stacks = Counter()      # (thread name, frame, frame, ...) root first -> samples
+        self.samples = 0
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def toggle(self):
+        """Starts a session, or stops the running one and returns the report path."""
+        with self.lock:
+            if self.running:
+                return self._stop()
+            self._start()
+            return None
+
+    def _start(self):
+        self._reset()
+        self.stop_event.clear()
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self.thread.start()
+        logging.warning(f"Profiler: sampling every {self.interval * 1000:.0f}ms (send the signal again to stop)")
+
+    def _stop(self):
+        self.stop_event.set()
+        self.thread.join(2)
+        self.thread = None
+        path = self.write_report()
+        logging.warning(f"Profiler: {self.samples} samples written to {path}")
+        return path
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_report(self):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}")
+        duration = time.time() - self.started_at
+
+        self_counts = Counter()
+        inclusive = Counter()
+        per_thread = Counter()
+        for stack, count in self.stacks.items():
+            per_thread[stack[0]] += count
+            if len(stack) > 1:
+                self_counts[stack[-1]] += count
+            for frame in set(stack[1:]):
+                inclusive[frame] += count
+        total = sum(self.stacks.values()) or 1
+
+        with open(base + ".txt", "w") as f:
+            f.write(f"pid {os.getpid()}, {duration:.1f}s, {self.samples} sampling rounds, {total} thread samples\n")
+            f.write("Idle threads (sleep/wait/select) show up too: read 'self' as where each thread spends its time.\n\n")
+            f.write("Samples per thread:\n")
+            for name, count in per_thread.most_common():
+                f.write(f"  {count:8d} {100.0 * count / total:6.1f}%  {name}\n")
+            f.write(f"\nTop {TOP_N} by self samples:\n")
+            for frame, count in self_counts.most_common(TOP_N):
+                f.write(f"  {count:8d} {100.0 * count / total:6.1f}%  {frame}\n")
+            f.write(f"\nTop {TOP_N} by inclusive samples:\n")
+            for frame, count in inclusive.most_common(TOP_N):
+                f.write(f"  {count:8d} {100.0 * count / total:6.1f}%  {frame}\n")
+
+        with open(base + ".folded", "w") as f:
+            for stack, count in self.stacks.items():
+                f.write(";".join(part.replace(";", ",") for part in stack) + f" {count}\n")
+        return base + ".txt"
+
+
+_profiler = None
+
+
+def install(signum=None, interval=DEFAULT_INTERVAL, directory=DEFAULT_DIRECTORY):
+    """
+    Installs the toggle handler (main thread only, default SIGUSR1). Returns the profiler,
+    or None where the signal does not exist (Windows builds).
+    Report writing runs on a helper thread so the signal handler returns immediately.
+    """
+    global _profiler
+    signum = signum or getattr(signal, "SIGUSR1", None)
+    if signum is None:
+        logging.debug("Profiler: no SIGUSR1 on this platform, sampling profiler not installed")
+        return None
+    _profiler = SamplingProfiler(interval, directory)
+
+    def handler(signum, frame):
+        threading.Thread(target=_profiler.toggle, name="profiler-toggle", daemon=True).start()
+
+    signal.signal(signum, handler)
+    logging.info(f"Profiler: send {signal.Signals(signum).name} to pid {os.getpid()} to start/stop sampling")
+    return _profiler
@@ -0,0 +1,197 @@
+"""
+Local server-sent-events (SSE) push feed for webapp.html and dashboards.
+
+Every open webapp.html used to poll the Amperwave API itself and call the
+iTunes API directly, so N wall displays meant N x upstream polling. This
+service sits next to the senders and:
+
+- polls upstream once per station (via amperwave_daemon.AmperwaveDaemon),
+- looks up missing art once (iTunes, rate limited) and caches it locally
+  (via art_proxy.ArtProxy), and
+- streams each change to all connected browsers over SSE as soon as it is seen.
+
+Upstream load no longer depends on the number of screens.
+
+Endpoints:
+    GET /               webapp.html, wired to this server's /events
+    GET /events         SSE stream ("nowplaying" events, JSON data)
+    GET /now.json       snapshot of every station
+    GET /art/...        locally cached, resized art
+
+Usage:
+    python3 push_server.py --station kozt=10/4756 --port 8080
+    open http://<this-machine>:8080/?station=kozt
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+from http.server import ThreadingHTTPServer
+
+from amperwave_daemon import AmperwaveDaemon, parse_station
+from art_proxy import ArtProxy, ArtRequestHandler, DEFAULT_CACHE_DIR
+from now_playing import fetch_album_art
+
+DEFAULT_PORT = 8080
+KEEPALIVE_INTERVAL = 15      # seconds between SSE comment lines (keeps proxies from closing idle streams)
+BROWSER_SCREEN_CLASS = "tv"  # wall displays are typically 1080p
+WEBAPP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "webapp.html")
+
+
+
+class PushHub:
+    """Holds the latest event per station and fans changes out to SSE clients."""
+    def __init__(self, daemon, art_proxy):
+        self.daemon = daemon
+        self.art_proxy = art_proxy
+        self.latest = {}      # station -> event dict
+        self.clients = []     # queue.Queue per connected browser
+        self.lock = threading.Lock()
+        self.stats = {"events": 0, "clients_peak": 0}
+        daemon.subscribe(self.on_track)
+
+    def on_track(self, station, track):
+        original = track.image_url or fetch_album_art(track.artist, track.title)
+        event = {
+            "station": station,
+            "title": track.title,
+            "artist": track.artist,
+            "album": track.album,
+            "time": track.time,
+            "originalImage": original,
+            "image": self.art_proxy.path_for(original, BROWSER_SCREEN_CLASS) if original else None,
+            "backgroundImage": self.art_proxy.path_for(original, BROWSER_SCREEN_CLASS, "bg") if original else None,
+            "observedAt": track.observed_at,
+        }
+        with self.lock:
+            self.latest[station] = event
+            self.stats["events"] += 1
+            clients = list(self.clients)
+        for q in clients:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # A stuck browser only loses events; it never slows the others down
+                pass
+
+    def add_client(self):
+        q = queue.Queue(maxsize=32)
+        with self.lock:
+            self.clients.append(q)
+            self.stats["clients_peak"] = max(self.stats["clients_peak"], len(self.clients))
+            for event in self.latest.values():
+                q.put_nowait(event)
+        return q
+
+    def remove_client(self, q):
+        with self.lock:
+            if q in self.clients:
+                self.clients.remove(q)
+
+    def snapshot(self):
+        with self.lock:
+            return {"stations": dict(self.latest), "clients": len(self.clients), **self.stats}
+
+
+class PushRequestHandler(ArtRequestHandler):
+    hub = None
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/art/"):
+            return super(PushRequestHandler, self).do_GET()
+        if path == "/events":
+            return self.serve_events()
+        if path == "/now.json":
+            return self.send_body(json.dumps(self.hub.snapshot()).encode(), "application/json")
+        if path in ("/", "/webapp.html"):
+            return self.serve_webapp()
+        self.send_error(404)
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def serve_webapp(self):
+        with open(WEBAPP_PATH, "rb") as f:
+            html = f.read()
+        # Tell the page it is being served by the push server (same-origin /events) and which stations it polls
+        stations = json.dumps({name: poller.station for name, poller in self.hub.daemon.pollers.items()})
+        html = html.replace(b"<script>", f"<script>window.PUSH_SERVER = true; window.AMPERWAVE_STATIONS = {stations};</script>\n    <script>".encode(), 1)
+        self.send_body(html, "text/html; charset=utf-8")
+
+    def serve_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "keep-alive")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+        q = self.hub.add_client()
+        logging.info(f"Push server: client connected ({self.address_string()})")
+        try:
+            self.wfile.write(b"retry: 3000\n\n")
+            self.wfile.flush()
+            while True:
+                try:
+                    event = q.get(timeout=KEEPALIVE_INTERVAL)
+                    self.wfile.write(f"event: nowplaying\ndata: {json.dumps(event)}\n\n".encode())
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            self.hub.remove_client(q)
+            logging.info(f"Push server: client disconnected ({self.address_string()})")
+
+    def log_message(self, format, *args):
+        logging.debug(f"Push server: {self.address_string()} {format % args}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll once, push now-playing changes to browsers over SSE.")
+    parser.add_argument("--station", action="append", default=None, help="Station as NAME=GROUP/ID (repeatable, default kozt=10/4756)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="HTTP port")
+    parser.add_argument("--art-cache", default=DEFAULT_CACHE_DIR, help="Disk cache directory for art")
+    parser.add_argument("--debug", action="store_true", help="Enable info-level logging")
+    parser.add_argument("--verbose", action="store_true", help="Enable debug logging")
+    args = parser.parse_args()
+
+    if args.verbose:
+        log_level = logging.DEBUG
+    elif args.debug:
+        log_level = logging.INFO
+    else:
+        log_level = logging.WARNING
+    logging.basicConfig(level=log_level, format='%(message)s')
+
+    stations = [parse_station(s) for s in (args.station or ["kozt=10/4756"])]
+    daemon = AmperwaveDaemon(stations)
+    art_proxy = ArtProxy(port=None, cache_dir=args.art_cache)
+    hub = PushHub(daemon, art_proxy)
+
+    class Handler(PushRequestHandler):
+        pass
+    Handler.proxy = art_proxy
+    Handler.hub = hub
+
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), Handler)
+    server.daemon_threads = True
+    daemon.start()
+    print(f"Push server on http://0.0.0.0:{args.port}/ (stations: {', '.join(name for name, _ in stations)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+        server.server_close()
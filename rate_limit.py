@@ -0,0 +1,162 @@
+"""
+Per-host rate limiting and circuit breaking for third-party lookups.
+
+`fetch_album_art()` calls itunes.apple.com on every track change. When Apple
+throttles us, each call used to wait out its timeout before falling back. A
+`HostGuard` combines:
+
+- a token bucket, so we never send more than `rate` requests/second (with a
+  small burst) to one host, and
+- a circuit breaker. It opens after consecutive failures (or an explicit 429
+  with Retry-After) and fails fast while open. After a cooldown it lets one
+  half-open probe through. Each failed probe doubles the cooldown, up to a cap.
+
+Callers ask `guard.allow()` first and skip the request when it returns False,
+so a degraded lookup costs nothing instead of a timeout.
+"""
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second, at most `burst` stored."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold consecutive failures) -> open
+    open -> (cooldown elapsed) -> half-open (one probe)
+    half-open -> success -> closed, failure -> open with doubled cooldown
+    """
+    def __init__(self, name, failure_threshold=3, cooldown=30, max_cooldown=600):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self.probe_in_flight = False
+                logging.debug(f"Circuit {self.name}: half-open, probing")
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != CLOSED:
+                logging.info(f"Circuit {self.name}: closed (service healthy again)")
+            self.state = CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self.probe_in_flight = False
+
+    def record_failure(self, retry_after=None):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.failures < self.failure_threshold and retry_after is None:
+                return
+            if retry_after is not None:
+                self.cooldown = min(self.max_cooldown, max(self.cooldown, retry_after))
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+            logging.warning(f"Circuit {self.name}: open for {self.cooldown:.0f}s after {self.failures} failure(s)")
+
+
+class HostGuard:
+    """Token bucket + circuit breaker for one host."""
+    def __init__(self, host, rate=0.5, burst=3, failure_threshold=3, cooldown=30, max_cooldown=600):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(host, failure_threshold, cooldown, max_cooldown)
+        self.stats = {"allowed": 0, "rate_limited": 0, "circuit_open": 0, "failures": 0}
+
+    def allow(self):
+        """True if a request may be sent right now. Never blocks."""
+        if not self.breaker.allow():
+            self.stats["circuit_open"] += 1
+            return False
+        if not self.bucket.try_acquire():
+            self.stats["rate_limited"] += 1
+            # Give back a half-open probe slot we could not use
+            with self.breaker.lock:
+                self.breaker.probe_in_flight = False
+            return False
+        self.stats["allowed"] += 1
+        return True
+
+    def record(self, response=None, error=None):
+        """
+        Feeds the outcome of a request back into the breaker. Throttling (429/403)
+        and server errors count as failures; 429 honours Retry-After.
+        """
+        if error is not None:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            return
+
+        status = response.status_code
+        if status in (403, 429) or status >= 500:
+            self.stats["failures"] += 1
+            retry_after = None
+            if status == 429:
+                try:
+                    retry_after = float(response.headers.get("Retry-After", ""))
+                except ValueError:
+                    retry_after = None
+            self.breaker.record_failure(retry_after)
+        else:
+            self.breaker.record_success()
+
+    @property
+    def state(self):
+        return self.breaker.state
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def guard_for(url_or_host, **kwargs):
+    """Returns the shared HostGuard for a host (created with `kwargs` on first use)."""
+    host = urlparse(url_or_host).hostname if "://" in url_or_host else url_or_host
+    with _guards_lock:
+        if host not in _guards:
+            _guards[host] = HostGuard(host, **kwargs)
+        return _guards[host]
@@ -0,0 +1,97 @@
+"""
+Bounded-deadline parallel teardown.
+
+Used by `graceful_exit()` in play_kozt.py and kozt_lite.py. Independent
+teardown chains (cast: stop media -> quit app -> disconnect; discovery: stop
+browser -> close zeroconf) run concurrently, and every step gets the time
+left in one overall deadline as its timeout. Steps that talk to the device
+already wait for the receiver's response, so fixed sleeps are unnecessary.
+Once the deadline passes we stop waiting: a dead socket can no longer push
+a restart past systemd's stop timeout into SIGKILL.
+
+Every step's duration and outcome is reported through `log` (a signal-safe
+writer by default), and the total appears in one final line.
+
+Usage:
+    plan = Shutdown(deadline=5)
+    plan.chain("cast", ("stop media", lambda t: mc.stop(timeout=t)), ("quit app", lambda t: cast.quit_app(timeout=t)))
+    plan.chain("discovery", ("stop browser", lambda t: browser.stop_discovery()), ("close zeroconf", lambda t: zconf.close()))
+    plan.run()
+"""
+import os
+import sys
+import threading
+import time
+
+DEFAULT_DEADLINE = 5.0
+MIN_STEP_TIMEOUT = 0.1
+
+
+def _write(msg):
+    """Signal-safe write to stdout."""
+    try:
+        os.write(sys.stdout.fileno(), f"{msg}\n".encode())
+    except Exception:
+        pass
+
+
+class Shutdown:
+    """A set of teardown chains that run in parallel under one deadline."""
+    def __init__(self, deadline=DEFAULT_DEADLINE, log=_write):
+        self.deadline = deadline
+        self.log = log
+        self.chains = []
+        self.results = {}     # "chain/step" -> (seconds, error or None)
+        self.started = None
+
+    def remaining(self):
+        """Seconds left before the overall deadline (never below MIN_STEP_TIMEOUT)."""
+        return max(MIN_STEP_TIMEOUT, self.deadline - (time.monotonic() - self.started))
+
+    def chain(self, name, *steps):
+        """
+        Adds a chain of `(label, fn)` steps that run in order. `fn(timeout)` gets
+        the remaining budget. A failed step is logged and the chain continues.
+        """
+        steps = [step for step in steps if step]
+        if steps:
+            self.chains.append((name, steps))
+
+    def _run_chain(self, name, steps, done):
+        try:
+            for label, fn in steps:
+                step_start = time.monotonic()
+                error = None
+                try:
+                    fn(self.remaining())
+                except Exception as e:
+                    error = e
+                elapsed = time.monotonic() - step_start
+                self.results[f"{name}/{label}"] = (elapsed, error)
+                if error:
+                    self.log(f"Shutdown: {name}: {label} failed after {elapsed:.2f}s ({error})")
+                else:
+                    self.log(f"Shutdown: {name}: {label} done in {elapsed:.2f}s")
+        finally:
+            done.set()
+
+    def run(self):
+        """Runs every chain and waits until all finish or the deadline passes. Returns True if all finished."""
+        self.started = time.monotonic()
+        pending = []
+        for name, steps in self.chains:
+            done = threading.Event()
+            threading.Thread(target=self._run_chain, args=(name, steps, done), name=f"shutdown-{name}", daemon=True).start()
+            pending.append((name, done))
+
+        unfinished = []
+        for name, done in pending:
+            if not done.wait(max(0, self.deadline - (time.monotonic() - self.started))):
+                unfinished.append(name)
+
+        total = time.monotonic() - self.started
+        if unfinished:
+            self.log(f"Shutdown: deadline of {self.deadline:.1f}s reached after {total:.2f}s; abandoning: {', '.join(unfinished)}")
+        else:
+            self.log(f"Shutdown: completed in {total:.2f}s ({len(self.chains)} parallel chain(s))")
+        return not unfinished
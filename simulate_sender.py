@@ -0,0 +1,484 @@
+"""
+Virtual-clock simulation of play_kozt.py's monitor loop.
+
+play_radio() is driven against fake cast, socket and HTTP layers. All
+waiting goes through `play_kozt.clock`, and here that is a VirtualClock.
+A sleep() only advances virtual time and runs whatever scenario events
+fall due in between, so hours of sender behaviour (keepalives,
+reconnects, polling) run in well under a second.
+
+Scenarios:
+    steady                 nothing goes wrong; baseline request/ping counts
+    flapping-wifi          the device drops off the network for 20-90s every few minutes
+    api-outage             the Amperwave API fails for 15 minutes twice an hour
+    receiver-disconnect    the receiver sends DISCONNECT (e.g. user closed it) every 40 minutes
+    app-switch             someone casts another app over ours every 45 minutes
+
+Reported per scenario:
+- request counts (Amperwave, iTunes), status polls, pings/pongs
+- session starts, relaunches and process exits
+- update latency: seconds from an upstream track change until the
+  receiver got it (p50/p95/max)
+- how long it took to notice a lost device
+
+With --replay FILE (a play_kozt.py --record recording) the Amperwave and
+iTunes responses, their latencies and errors, and the track changes come
+from the recording instead of the synthetic schedule. The scenarios still
+apply on top of it.
+
+Usage:
+    python3 simulate_sender.py --hours 24
+    python3 simulate_sender.py --scenario flapping-wifi --hours 6 --seed 3 --verbose
+    python3 simulate_sender.py --scenario steady --replay kozt-monday.jsonl.gz
+"""
+import argparse
+import contextlib
+import heapq
+import io
+import json
+import logging
+import random
+import time
+from types import SimpleNamespace
+
+import play_kozt
+import cast_events
+from feed_replay import FeedReplay
+from now_playing import AmperwaveProvider
+
+APP_ID = play_kozt.DEFAULT_APP_ID
+RESTART_SEC = 10          # systemd RestartSec for a sender that exited
+START_TIME = 1_700_000_000.0
+PAGE_LOAD_SEC = (0.5, 6.0)  # start_app() returns -> receiver page announces the namespace and answers PINGs
+PLAYLIST_STREAM_URL = "http://live.amperwave.net/direct/caradio-koztfmaac-ibc3"
+
+
+class SimulationOver(BaseException):
+    """Raised from VirtualClock.sleep() at the end of the run (BaseException so `except Exception` in the loops cannot swallow it)."""
+
+
+class VirtualClock:
+    """Drop-in for the `time` module's time()/sleep() with a scheduled event queue."""
+    def __init__(self, duration, start=START_TIME):
+        self.now = start
+        self.end = start + duration
+        self.events = []
+        self.seq = 0
+
+    def time(self):
+        return self.now
+
+    def at(self, when, action):
+        heapq.heappush(self.events, (when, self.seq, action))
+        self.seq += 1
+
+    def sleep(self, seconds, until=None):
+        """Advances virtual time by `seconds`, or only up to the event after which `until()` holds."""
+        target = self.now + max(0, seconds)
+        while self.events and self.events[0][0] <= target:
+            when, _, action = heapq.heappop(self.events)
+            self.now = max(self.now, when)
+            action()
+            if until and until():
+                return
+        self.now = target
+        if self.now >= self.end:
+            raise SimulationOver()
+
+
+class VirtualEvent:
+    """threading.Event stand-in whose wait() runs in virtual time (e.g. the 3s PONG wait), returning once a scheduled event sets it."""
+    def __init__(self, clock):
+        self.clock = clock
+        self.flag = False
+
+    def set(self):
+        self.flag = True
+
+    def clear(self):
+        self.flag = False
+
+    def is_set(self):
+        return self.flag
+
+    def wait(self, timeout=None):
+        if not self.flag and timeout:
+            self.clock.sleep(timeout, until=lambda: self.flag)
+        return self.flag
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))], 1)
+
+
+class World:
+    """Shared state of the simulated network, API and receiver, plus counters."""
+    def __init__(self, clock, rng):
+        self.clock = clock
+        self.rng = rng
+        self.wifi_up = True
+        self.api_up = True
+        self.app_id = None
+        self.page_ready_at = None
+        self.track = None
+        self.track_changed_at = None
+        self.track_number = 0
+        self.shown = set()
+        self.wifi_down_at = None
+        self.counters = {k: 0 for k in ("amperwave_requests", "amperwave_errors", "itunes_requests", "status_polls",
+                                        "pings", "pongs", "updates", "app_launches", "sessions", "relaunches",
+                                        "process_exits", "wifi_drops", "api_outages", "disconnects_sent")}
+        self.latencies = []
+        self.detect_delays = []
+        self.launch_latencies = []
+        self.replay = None
+
+    # Upstream track changes
+    def replay_tracks(self, replay):
+        """Schedules the recorded Amperwave track changes instead of the synthetic ones."""
+        self.replay = replay
+        for t, body in replay.changes("amperwave"):
+            try:
+                performance = json.loads(body)["performances"][0]
+            except (ValueError, KeyError, IndexError, TypeError):
+                continue
+            track = (performance.get("title", "").strip(), performance.get("artist", "").strip())
+            self.clock.at(replay.started + t, lambda track=track: self.set_track(track))
+
+    def set_track(self, track):
+        if track != self.track:
+            self.track_number += 1
+            self.track = track
+            self.track_changed_at = self.clock.now
+
+    def next_track(self):
+        self.track_number += 1
+        self.track = (f"Song {self.track_number}", f"Artist {self.track_number % 17}")
+        self.track_changed_at = self.clock.now
+        self.clock.at(self.clock.now + self.rng.uniform(150, 330), self.next_track)
+
+    def on_update(self, msg):
+        self.counters["updates"] += 1
+        key = (msg.get("title"), msg.get("artist"))
+        if key == self.track and key not in self.shown:
+            self.shown.add(key)
+            self.latencies.append(self.clock.now - self.track_changed_at)
+
+    def session_lost(self):
+        if self.wifi_down_at is not None:
+            self.detect_delays.append(self.clock.now - self.wifi_down_at)
+            self.wifi_down_at = None
+
+
+class FakeResponse:
+    def __init__(self, status_code, data, text=""):
+        self.status_code = status_code
+        self.data = data
+        self.text = text
+        self.headers = {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f"HTTP {self.status_code}")
+
+
+class FakeHTTP:
+    """Stands in for requests / requests.Session for the stream playlist, Amperwave and iTunes."""
+    def __init__(self, world):
+        self.world = world
+
+    def get(self, url, timeout=None, **kwargs):
+        world = self.world
+        if url.lower().endswith(".m3u"):
+            return FakeResponse(200, None, text=f"{PLAYLIST_STREAM_URL}\n")
+        if "itunes.apple.com" in url:
+            world.counters["itunes_requests"] += 1
+            if world.replay:
+                return world.replay.get(url, timeout)
+            return FakeResponse(200, {"resultCount": 0, "results": []})
+        world.counters["amperwave_requests"] += 1
+        if not world.api_up:
+            world.counters["amperwave_errors"] += 1
+            return FakeResponse(503, {})
+        if world.replay:
+            try:
+                response = world.replay.get(url, timeout)
+            except Exception:
+                world.counters["amperwave_errors"] += 1
+                raise
+            if response.status_code >= 400:
+                world.counters["amperwave_errors"] += 1
+            return response
+        title, artist = world.track
+        return FakeResponse(200, {"performances": [{"title": title, "artist": artist, "album": "", "time": "",
+                                                    "largeimage": f"https://example.invalid/{world.track_number}.jpg"}]})
+
+
+class FakeMediaController:
+    def __init__(self, world):
+        self.world = world
+
+    def play_media(self, *args, **kwargs):
+        if not self.world.wifi_up:
+            raise ConnectionError("media: not connected")
+
+    def block_until_active(self, timeout=None):
+        pass
+
+    def stop(self, timeout=None):
+        pass
+
+
+class FakeSocketClient:
+    def __init__(self, world):
+        self.world = world
+        self.receiver_controller = SimpleNamespace(update_status=self.update_status)
+
+    @property
+    def is_connected(self):
+        return self.world.wifi_up
+
+    def update_status(self):
+        self.world.counters["status_polls"] += 1
+        if not self.world.wifi_up:
+            raise ConnectionError("status: not connected")
+
+
+class FakeCast:
+    """Just enough of pychromecast.Chromecast for play_radio()."""
+    def __init__(self, world, name):
+        self.world = world
+        self.name = name
+        self.cast_info = SimpleNamespace(model_name="Google Nest Hub", host="192.0.2.10", cast_type="cast")
+        self.media_controller = FakeMediaController(world)
+        self.socket_client = FakeSocketClient(world)
+        self.controller = None
+
+        self.status_listeners = []
+
+    def page_ready(self):
+        world = self.world
+        return world.app_id == APP_ID and world.page_ready_at is not None and world.clock.now >= world.page_ready_at
+
+    @property
+    def status(self):
+        return SimpleNamespace(app_id=self.world.app_id, namespaces=[play_kozt.NAMESPACE] if self.page_ready() else [])
+
+    def register_status_listener(self, listener):
+        listener.app_running = VirtualEvent(self.world.clock)
+        listener.namespace_ready = VirtualEvent(self.world.clock)
+        listener.status_changed = VirtualEvent(self.world.clock)
+        self.status_listeners.append(listener)
+
+    def notify_status(self):
+        for listener in self.status_listeners:
+            listener.new_cast_status(self.status)
+
+    def wait(self, timeout=None):
+        if not self.world.wifi_up:
+            raise ConnectionError("cast: not connected")
+
+    def register_handler(self, controller):
+        self.controller = controller
+        controller.send_message = self.send_message
+        controller.pong_received = VirtualEvent(self.world.clock)
+
+    def start_app(self, app_id, timeout=None):
+        if not self.world.wifi_up:
+            raise ConnectionError("launch: not connected")
+        world = self.world
+        world.counters["app_launches"] += 1
+        world.app_id = app_id
+        world.page_ready_at = world.clock.now + world.rng.uniform(*PAGE_LOAD_SEC)
+        world.clock.at(world.page_ready_at, self.notify_status)
+        self.notify_status()
+
+    def quit_app(self, timeout=None):
+        self.world.app_id = None
+        self.notify_status()
+
+    def send_message(self, msg, **kwargs):
+        world = self.world
+        if not world.wifi_up:
+            raise ConnectionError("send: not connected")
+        if msg.get("type") == "PING":
+            world.counters["pings"] += 1
+            if self.page_ready():
+                world.counters["pongs"] += 1
+                self.controller.receive_message(None, {"type": "PONG", "version": "sim"})
+        elif "type" not in msg and self.page_ready():
+            world.on_update(msg)
+
+    def receiver_disconnect(self):
+        if self.controller and self.world.wifi_up and self.world.app_id == APP_ID:
+            self.world.counters["disconnects_sent"] += 1
+            self.controller.receive_message(None, {"type": "DISCONNECT"})
+
+
+# --- Scenarios: schedule events on the clock -------------------------------------------------
+
+def every(clock, first, period, action):
+    def fire():
+        action()
+        clock.at(clock.now + period, fire)
+    clock.at(clock.now + first, fire)
+
+
+def scenario_flapping_wifi(world, cast):
+    def drop():
+        if world.wifi_up:
+            world.wifi_up = False
+            world.wifi_down_at = world.clock.now
+            world.counters["wifi_drops"] += 1
+            world.clock.at(world.clock.now + world.rng.uniform(20, 90), restore)
+
+    def restore():
+        world.wifi_up = True
+
+    every(world.clock, 120, 300, drop)
+
+
+def scenario_api_outage(world, cast):
+    def outage():
+        world.api_up = False
+        world.counters["api_outages"] += 1
+        world.clock.at(world.clock.now + 900, lambda: setattr(world, "api_up", True))
+
+    every(world.clock, 600, 1800, outage)
+
+
+def scenario_receiver_disconnect(world, cast):
+    def disconnect():
+        cast.receiver_disconnect()
+        world.app_id = None
+
+    every(world.clock, 600, 2400, disconnect)
+
+
+def scenario_app_switch(world, cast):
+    every(world.clock, 900, 2700, lambda: setattr(world, "app_id", "CC1AD845"))
+
+
+SCENARIOS = {
+    "steady": lambda world, cast: None,
+    "flapping-wifi": scenario_flapping_wifi,
+    "api-outage": scenario_api_outage,
+    "receiver-disconnect": scenario_receiver_disconnect,
+    "app-switch": scenario_app_switch,
+}
+
+
+def simulate(scenario, hours, seed=1, verbose=False, replay_path=None):
+    """
+    Runs play_radio() under `scenario` for `hours` of virtual time and returns the counters.
+    With `replay_path` the upstream feeds come from a recording (`hours` None: its whole length).
+    """
+    rng = random.Random(seed)
+    random.seed(seed)  # play_kozt's poll jitter
+    if replay_path:
+        replay = FeedReplay(replay_path)
+        hours = hours or replay.duration / 3600
+    clock = VirtualClock(hours * 3600)
+    world = World(clock, rng)
+    cast = FakeCast(world, "Simulated Hub")
+    http = FakeHTTP(world)
+
+    # Wire the fakes into play_kozt's module namespace
+    play_kozt.clock = clock
+    play_kozt.requests = http
+    play_kozt.KOZT_PROVIDER = AmperwaveProvider(session=http)
+    # The registry knows the device while it is on the network, and waits up to `timeout` for it to come back
+    def get_chromecast(name, timeout=0):
+        if not world.wifi_up:
+            clock.sleep(timeout, until=lambda: world.wifi_up)
+        return cast if world.wifi_up else None
+
+    play_kozt.registry = SimpleNamespace(get_chromecast=get_chromecast, known=lambda: [], stop=lambda: None, snapshot=lambda: {})
+    cast_events.record_latency = lambda device_name, stages: world.launch_latencies.append(stages.get("first pong"))
+
+    if replay_path:
+        replay.clock, replay.started = clock, clock.now
+        world.replay_tracks(replay)
+    else:
+        world.next_track()
+    SCENARIOS[scenario](world, cast)
+
+    started = time.perf_counter()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        try:
+            while True:
+                world.counters["sessions"] += 1
+                try:
+                    play_kozt.play_radio(cast.name, play_kozt.DEFAULT_STREAM_URL, play_kozt.DEFAULT_STREAM_TYPE,
+                                         play_kozt.DEFAULT_TITLE, play_kozt.DEFAULT_IMAGE_URL, APP_ID, True)
+                    # Loop exited: the sender relaunches (same as the __main__ loop)
+                    world.counters["relaunches"] += 1
+                    world.session_lost()
+                except SystemExit:
+                    world.counters["process_exits"] += 1
+                    world.session_lost()
+                    clock.sleep(RESTART_SEC)
+                except Exception as e:
+                    logging.debug(f"Simulation: session error: {e}")
+                    world.session_lost()
+                    clock.sleep(5)
+        except SimulationOver:
+            pass
+
+    result = dict(world.counters)
+    result["scenario"] = scenario
+    result["virtual_hours"] = hours
+    result["wall_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    result["tracks"] = world.track_number
+    result["update_latency_s"] = {"count": len(world.latencies), "p50": percentile(world.latencies, 50),
+                                  "p95": percentile(world.latencies, 95), "max": percentile(world.latencies, 100)}
+    ready = [seconds for seconds in world.launch_latencies if seconds is not None]
+    result["launch_to_pong_s"] = {"count": len(ready), "timeouts": len(world.launch_latencies) - len(ready),
+                                  "p50": percentile(ready, 50), "max": percentile(ready, 100)}
+    result["loss_detection_s"] = {"count": len(world.detect_delays), "p50": percentile(world.detect_delays, 50),
+                                  "max": percentile(world.detect_delays, 100)}
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate hours of play_kozt.py monitor-loop behaviour in milliseconds.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS) + ["all"], default="all", help="Scenario to run")
+    parser.add_argument("--hours", type=float, default=None, help="Virtual hours to simulate (default: 24, or the length of --replay)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (track lengths, poll jitter, outage lengths)")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per scenario")
+    parser.add_argument("--verbose", action="store_true", help="Show the sender's own output and debug logs")
+    parser.add_argument("--replay", default=None, metavar="FILE", help="Take the upstream feeds from a play_kozt.py --record recording")
+    args = parser.parse_args()
+    if args.hours is None and not args.replay:
+        args.hours = 24
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL, format='%(message)s')
+
+    for name in (sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]):
+        result = simulate(name, args.hours, args.seed, args.verbose, args.replay)
+        if args.json:
+            print(json.dumps(result))
+            continue
+        c = result
+        print(f"--- {name}: {c['virtual_hours']:.3g}h simulated in {c['wall_ms']}ms ---")
+        print(f"  Amperwave requests: {c['amperwave_requests']} ({c['amperwave_errors']} failed), iTunes: {c['itunes_requests']}")
+        print(f"  Pings: {c['pings']} ({c['pongs']} answered), status polls: {c['status_polls']}")
+        print(f"  Sessions: {c['sessions']} (relaunches {c['relaunches']}, process exits {c['process_exits']}, app launches {c['app_launches']})")
+        print(f"  Tracks: {c['tracks']}, shown: {c['update_latency_s']['count']}, update latency p50/p95/max: "
+              f"{c['update_latency_s']['p50']}/{c['update_latency_s']['p95']}/{c['update_latency_s']['max']}s")
+        launch = c["launch_to_pong_s"]
+        print(f"  Launch -> first PONG p50/max: {launch['p50']}/{launch['max']}s"
+              f"{' (%d timed out)' % launch['timeouts'] if launch['timeouts'] else ''}")
+        if c["wifi_drops"]:
+            print(f"  Wi-Fi drops: {c['wifi_drops']}, loss detected after p50 {c['loss_detection_s']['p50']}s (max {c['loss_detection_s']['max']}s)")
+        if c["api_outages"]:
+            print(f"  API outages: {c['api_outages']}")
+        if c["disconnects_sent"]:
+            print(f"  Receiver DISCONNECTs: {c['disconnects_sent']}")
@@ -0,0 +1,86 @@
+"""
+Step timeline for startup (and other multi-threaded sequences).
+
+Steps can run on any thread. Each is recorded as (name, start, end,
+thread) relative to the timeline's creation. `report()` draws one bar per
+step, so it is easy to see which steps overlapped and which chain of
+steps was the critical path (what the total actually waited on).
+
+    timeline = Timeline("startup")
+    future = executor.submit(timeline.timed("resolve playlist", resolve_playlist), url)
+    with timeline.step("discovery"):
+        ...
+    timeline.report()
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+BAR_WIDTH = 40
+
+
+class Timeline:
+    def __init__(self, name, clock=time):
+        self.name = name
+        self.clock = clock
+        self.t0 = clock.time()
+        self.steps = []       # (name, start, end, thread name)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        start = self.clock.time()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.steps.append((name, start - self.t0, self.clock.time() - self.t0, threading.current_thread().name))
+
+    def start(self, name):
+        """Starts step `name` without a with-block; call the returned function to end it."""
+        manager = self.step(name)
+        manager.__enter__()
+        return lambda: manager.__exit__(None, None, None)
+
+    def timed(self, name, fn):
+        """Wraps `fn` so its run is recorded as step `name` (for executor.submit)."""
+        def run(*args, **kwargs):
+            with self.step(name):
+                return fn(*args, **kwargs)
+        return run
+
+    def total(self):
+        with self.lock:
+            return max((end for _, _, end, _ in self.steps), default=0.0)
+
+    def critical_path(self):
+        """
+        Walks back from the step that finished last, each time picking the step
+        that ended most recently before the current one started (the longest one
+        on a tie, so a "wait for X" step gives way to X itself).
+        """
+        with self.lock:
+            steps = sorted(self.steps, key=lambda s: s[2])
+        if not steps:
+            return []
+        path = [steps[-1]]
+        while True:
+            start = path[-1][1]
+            earlier = [s for s in steps if s[2] <= start + 0.005 and s[1] < start]
+            if not earlier:
+                break
+            path.append(max(earlier, key=lambda s: (round(s[2], 3), -s[1])))
+        return [s[0] for s in reversed(path)]
+
+    def report(self, log=logging.info):
+        total = self.total() or 1e-9
+        with self.lock:
+            steps = sorted(self.steps, key=lambda s: s[1])
+        log(f"{self.name.capitalize()} timeline ({total:.2f}s total):")
+        for name, start, end, thread in steps:
+            left = int(start / total * BAR_WIDTH)
+            width = max(1, int((end - start) / total * BAR_WIDTH))
+            bar = " " * left + "#" * min(width, BAR_WIDTH - left)
+            log(f"  {start:6.2f}s {end - start:6.2f}s |{bar:<{BAR_WIDTH}}| {name} [{thread}]")
+        log(f"  Critical path: {' -> '.join(self.critical_path())}")
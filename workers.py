@@ -0,0 +1,219 @@
+"""
+Per-session supervisor for background worker threads.
+
+Each cast session used to start its own daemon threads: the ICY
+metadata_monitor, the Icecast status poller, and the provider race. They
+were never stopped. The monitor's stop_event was not set when the loop
+ended, so every reconnect could leave one more thread downloading the
+stream. A WorkerSupervisor owns every worker of one session:
+
+- `spawn(name, target, *args)` runs `target(worker, *args)` in a thread.
+  The `Worker` handle carries the stop event, a state string and a byte
+  counter.
+- `adopt(name, obj)` starts and later stops an object that manages its own
+  thread (anything with start()/stop(), e.g. IcecastStatusPoller). Its
+  `bytes_received` attribute is read if present.
+- `stop()` signals every worker, closes its current connection (see
+  `Worker.use`) to abort blocking reads, and joins them under one
+  deadline. Workers that do not finish in time are logged.
+- A new supervisor first waits (up to `join_timeout`) for the stragglers
+  of earlier sessions to exit, so reconnects do not pile threads up. Ones
+  that are still running are logged, not held against the new session.
+- A cap per supervisor (`max_workers`) refuses more workers with
+  WorkerLimitError; hitting it is a bug in the caller, not a lost connection.
+
+`snapshot()` returns each worker's name, state, bytes, age and last error.
+"""
+import logging
+import threading
+import time
+
+MAX_WORKERS = 8
+JOIN_TIMEOUT = 3.0
+
+# Every worker that has not exited yet, across all supervisors (for stragglers)
+_live = set()
+_live_lock = threading.Lock()
+
+
+class WorkerLimitError(RuntimeError):
+    pass
+
+
+def live_workers():
+    """Names of all workers (of any session) whose threads are still running."""
+    with _live_lock:
+        return sorted(worker.full_name for worker in _live)
+
+
+class Worker:
+    """Handle for one background worker; passed as the first argument to spawned targets."""
+    def __init__(self, name, supervisor):
+        self.name = name
+        self.full_name = f"{supervisor.name}/{name}"
+        self.stop_event = threading.Event()
+        self.state = "starting"
+        self.bytes = 0
+        self.error = None
+        self.started_at = time.time()
+        self.thread = None
+        self.target = None   # adopted object (own start/stop)
+        self.resource = None # current connection, closed on stop
+        self._on_stop = []
+
+    @property
+    def stopping(self):
+        return self.stop_event.is_set()
+
+    def wait(self, seconds):
+        """Sleeps up to `seconds`; returns True early if the worker is being stopped."""
+        return self.stop_event.wait(seconds)
+
+    def set_state(self, state):
+        self.state = state
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def on_stop(self, fn):
+        """Registers `fn` to run when the worker is stopped."""
+        self._on_stop.append(fn)
+
+    def use(self, resource):
+        """Marks `resource` (e.g. a streaming response) as the current connection: stop() closes it to abort a blocking read."""
+        self.resource = resource
+        return resource
+
+    def _signal_stop(self):
+        self.stop_event.set()
+        for fn in self._on_stop + ([self.resource.close] if self.resource is not None else []):
+            try:
+                fn()
+            except Exception as e:
+                logging.debug(f"Worker {self.full_name}: stopping failed: {e}")
+
+    def alive(self):
+        if self.thread:
+            return self.thread.is_alive()
+        if self.target is None:
+            return False
+        # Adopted objects keep one `thread` (IcecastStatusPoller) or a list of `threads` (ProviderRace)
+        threads = getattr(self.target, "threads", None) or [getattr(self.target, "thread", None)]
+        return any(thread and thread.is_alive() for thread in threads)
+
+    def snapshot(self):
+        if self.target is not None:
+            self.bytes = getattr(self.target, "bytes_received", self.bytes)
+        return {
+            "name": self.name,
+            "state": self.state,
+            "alive": self.alive(),
+            "bytes": self.bytes,
+            "age_s": round(time.time() - self.started_at),
+            "error": self.error,
+        }
+
+
+class WorkerSupervisor:
+    """Owns the background workers of one session."""
+    def __init__(self, name, max_workers=MAX_WORKERS, join_timeout=JOIN_TIMEOUT):
+        self.name = name
+        self.max_workers = max_workers
+        self.join_timeout = join_timeout
+        self.workers = []
+        self.stopped = False
+        self.waited = False
+
+    def _wait_for_stragglers(self):
+        """Gives workers of earlier supervisors that missed their stop deadline up to join_timeout more to exit."""
+        deadline = time.monotonic() + self.join_timeout
+        while True:
+            with _live_lock:
+                _live.intersection_update([w for w in _live if w.alive() or w.state == "starting"])
+                stragglers = sorted(w.full_name for w in _live)
+            if not stragglers or time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        if stragglers:
+            logging.warning(f"Workers: {', '.join(stragglers)} still running as {self.name} starts")
+
+    def _register(self, name):
+        if self.stopped:
+            raise WorkerLimitError(f"{self.name}: supervisor already stopped, not starting '{name}'")
+        if not self.waited:
+            self.waited = True
+            self._wait_for_stragglers()
+        live = [w for w in self.workers if w.alive() or w.state == "starting"]
+        if len(live) >= self.max_workers:
+            raise WorkerLimitError(f"{self.name}: {len(live)} workers running "
+                                   f"({', '.join(w.name for w in live)}), not starting '{name}'")
+        worker = Worker(name, self)
+        with _live_lock:
+            _live.add(worker)
+        self.workers.append(worker)
+        return worker
+
+    def spawn(self, name, target, *args):
+        """Runs `target(worker, *args)` in a daemon thread. Raises WorkerLimitError over the cap."""
+        worker = self._register(name)
+
+        def run():
+            worker.set_state("running")
+            try:
+                target(worker, *args)
+                worker.set_state("stopped" if worker.stopping else "finished")
+            except Exception as e:
+                worker.error = str(e)
+                worker.set_state("failed")
+                logging.warning(f"Worker {worker.full_name} failed: {e}")
+            finally:
+                with _live_lock:
+                    _live.discard(worker)
+
+        worker.thread = threading.Thread(target=run, name=f"{self.name}/{name}", daemon=True)
+        worker.thread.start()
+        return worker
+
+    def adopt(self, name, obj):
+        """Starts `obj` (with start()/stop()) as a worker of this session."""
+        worker = self._register(name)
+        worker.target = obj
+        worker.on_stop(obj.stop)
+        try:
+            obj.start()
+        except Exception:
+            with _live_lock:
+                _live.discard(worker)
+            raise
+        worker.set_state("running")
+        return obj
+
+    def stop(self, timeout=None):
+        """Stops every worker and joins them within one deadline (default join_timeout)."""
+        self.stopped = True
+        deadline = time.monotonic() + (self.join_timeout if timeout is None else timeout)
+        for worker in self.workers:
+            worker._signal_stop()
+        stragglers = []
+        for worker in self.workers:
+            if worker.thread:
+                worker.thread.join(max(0.0, deadline - time.monotonic()))
+            if worker.alive():
+                stragglers.append(worker.full_name)
+            else:
+                if worker.state in ("starting", "running"):
+                    worker.set_state("stopped")
+                with _live_lock:
+                    _live.discard(worker)
+        if stragglers:
+            logging.warning(f"Workers: {', '.join(stragglers)} did not stop within the deadline")
+        else:
+            logging.debug(f"Workers: {self.name} stopped ({len(self.workers)} workers)")
+        return stragglers
+
+    def snapshot(self):
+        return [worker.snapshot() for worker in self.workers]
+
+    def report(self):
+        """One line per worker, for heartbeat logs."""
+        return "; ".join(f"{w['name']} {w['state']} {w['bytes'] / 1024:.0f} KiB" for w in self.snapshot()) or "no workers"